@@ -7,10 +7,15 @@ import traceback
 import argparse
 
 from source.logger import get_logger
-from source.utils import ensure_dir, cleanup_temp_dirs, MASTER_OUTPUT_DIR, get_repo_path
+from source.utils import ensure_dir, cleanup_temp_dirs, MASTER_OUTPUT_DIR, get_repo_path, EXTRACT_PROFILES, DEFAULT_EXTRACT_PROFILE
 from source.project_finder import find_all_projects
 from source.analysis import analyze_organization_repos_enhanced
 from source.file_filters import should_analyze_file
+from source.clone_cache import get_mirror_cache, DEFAULT_MAX_CACHE_GB
+from source.commit_cache import get_commit_cache
+from source.traversal import BACKENDS, DEFAULT_BACKEND
+from source.metrics import recompute_analysis_file
+from source.metrics.aggregator import METRIC_NAMES
 from tqdm import tqdm
 
 logger = get_logger(__name__)
@@ -42,14 +47,15 @@ def save_completed_user(username):
 def analyze_all_projects(folder_filter=None, csv_path=USERS, start_year=None, 
                          start_month=None, end_year=None, end_month=None, limit=None, 
                          workers=4, use_parallel=True, split_large_repos=True, 
-                         file_filter_fn=should_analyze_file, skip_completed=True):
+                         file_filter_fn=should_analyze_file, skip_completed=True, backend=DEFAULT_BACKEND,
+                         extract_profile=DEFAULT_EXTRACT_PROFILE, metrics=None, local_root=None):
     
     start_time = time.time()
     
     logger.info(f"Python recursion limit set to: {sys.getrecursionlimit()}")
 
     completed_users = [] if not skip_completed else load_completed_users()
-    projects_by_username = find_all_projects(folder_filter, csv_path)
+    projects_by_username = find_all_projects(folder_filter, csv_path, local_root=local_root)
     
     if not projects_by_username:
         logger.warning("No projects found to analyze.")
@@ -74,7 +80,7 @@ def analyze_all_projects(folder_filter=None, csv_path=USERS, start_year=None,
     usernames = remaining_users
     total_users = len(usernames)
     logger.info(f"Found {total_users} users to analyze.")
-    logger.info(f"Using {workers} worker processes with parallel={use_parallel}, split_large_repos={split_large_repos}")
+    logger.info(f"Using {workers} worker processes with parallel={use_parallel}, split_large_repos={split_large_repos}, backend={backend}, extract={extract_profile}, metrics={', '.join(metrics) if metrics else 'all'}")
     user_progress = tqdm(total=total_users, desc="Overall Progress", position=0, leave=True)
     
     try:
@@ -120,7 +126,10 @@ def analyze_all_projects(folder_filter=None, csv_path=USERS, start_year=None,
                         use_parallel=use_parallel,
                         max_workers=workers,
                         split_large_repos=split_large_repos,
-                        output_dir_override=user_output_dir
+                        output_dir_override=user_output_dir,
+                        backend=backend,
+                        extract_profile=extract_profile,
+                        metrics=metrics
                     )
                     user_pbar.update(1)
                 
@@ -159,10 +168,29 @@ def analyze_all_projects(folder_filter=None, csv_path=USERS, start_year=None,
     except Exception as e:
         logger.warning(f"Error during final cleanup: {str(e)}")
 
+def recompute_all_metrics(output_dir=MASTER_OUTPUT_DIR):
+    """Recompute the process metrics of every stored analysis file from its commits, without git."""
+    analysis_files = []
+    for root, _, files in os.walk(output_dir):
+        analysis_files.extend(os.path.join(root, name) for name in files if name.endswith('_analysis.json'))
+    
+    logger.info(f"Recomputing metrics for {len(analysis_files)} analysis files")
+    failed = 0
+    for path in tqdm(sorted(analysis_files), desc="Recomputing metrics", unit="file"):
+        try:
+            recompute_analysis_file(path)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Error recomputing metrics for {path}: {str(e)}")
+            logger.debug(traceback.format_exc())
+    
+    logger.info(f"Recomputed metrics for {len(analysis_files) - failed} files, {failed} failed")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Analyze GitHub user repositories')
     parser.add_argument('--folder', type=str, help='Only analyze usernames starting with this letter/character')
     parser.add_argument('--csv', type=str, default=USERS, help='Path to CSV file with repositories')
+    parser.add_argument('--local-root', type=str, help='Analyze the git repositories or bare mirrors under this directory in place, laid out as <root>/<username>/<repo>, instead of cloning the repositories of the CSV')
     parser.add_argument('--start-year', type=int, help='Start year for analysis')
     parser.add_argument('--start-month', type=int, help='Start month for analysis (1-12)')
     parser.add_argument('--end-year', type=int, help='End year for analysis')
@@ -174,6 +202,13 @@ if __name__ == "__main__":
     parser.add_argument('--disable-repo-splitting', action='store_true', help='Disable splitting of large repositories')
     parser.add_argument('--recursion-limit', type=int, default=20000, help='Set Python recursion limit (default: 20000)')
     parser.add_argument('--force-reprocess', action='store_true', help='Process even already completed users')
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND, help=f'Commit ingestion backend: pydriller or a streamed native git log (default: {DEFAULT_BACKEND})')
+    parser.add_argument('--extract', choices=EXTRACT_PROFILES, default=DEFAULT_EXTRACT_PROFILE, help=f'Commit fields to extract: minimal (paths and line counts), standard (adds diffs and source code) or full (adds lizard methods, complexity and DMM) (default: {DEFAULT_EXTRACT_PROFILE})')
+    parser.add_argument('--metrics', nargs='+', choices=METRIC_NAMES, metavar='METRIC', help=f'Only calculate these metrics; commit data no selected metric needs is not fetched (default: all of {", ".join(METRIC_NAMES)})')
+    parser.add_argument('--recompute-metrics', action='store_true', help='Recompute process metrics of existing analysis files from their stored commits and exit')
+    parser.add_argument('--partial-clone', action='store_true', help='Clone mirrors without file contents (blob:none) for runs that only read commit headers; mirrors are completed when a later run needs line counts, diffs or contents')
+    parser.add_argument('--commit-cache', action='store_true', help='Reuse commit records extracted before, by any run, repository or period, from an on-disk store keyed by commit SHA')
+    parser.add_argument('--mirror-cache-gb', type=float, default=DEFAULT_MAX_CACHE_GB, help=f'Disk budget for cached repository mirrors in GB (default: {DEFAULT_MAX_CACHE_GB})')
     
     args = parser.parse_args()
     
@@ -181,9 +216,16 @@ if __name__ == "__main__":
         sys.setrecursionlimit(args.recursion_limit)
         logger.info(f"Setting Python recursion limit to: {args.recursion_limit}")
     
+    if args.recompute_metrics:
+        recompute_all_metrics()
+        sys.exit(0)
+    
     if args.cleanup_temp:
         cleanup_temp_dirs()
     
+    get_mirror_cache(max_size_gb=args.mirror_cache_gb, partial_clone=args.partial_clone)
+    get_commit_cache(enabled=args.commit_cache)
+    
     analyze_all_projects(
         folder_filter=args.folder,
         csv_path=args.csv,
@@ -196,5 +238,9 @@ if __name__ == "__main__":
         use_parallel=not args.disable_parallel,
         split_large_repos=not args.disable_repo_splitting,
         file_filter_fn=should_analyze_file,
-        skip_completed=not args.force_reprocess
+        skip_completed=not args.force_reprocess,
+        backend=args.backend,
+        extract_profile=args.extract,
+        metrics=args.metrics,
+        local_root=args.local_root
     )
\ No newline at end of file
@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from tqdm import tqdm
+
+from .logger import get_logger
+from .utils import CACHE_DIR
+from .repo_metadata import get_head_sha
+from .traversal import is_remote_url
+
+logger = get_logger(__name__)
+
+ACCESS_DB = os.path.join(CACHE_DIR, "access.sqlite")
+
+# How long a check result is trusted; failures are retried sooner as they are often transient
+REACHABLE_TTL_SECONDS = 12 * 3600
+UNREACHABLE_TTL_SECONDS = 3600
+# A HEAD decides whether a repository has new commits, so it is only trusted briefly
+HEAD_TTL_SECONDS = 5 * 60
+DEFAULT_MAX_CONCURRENT = 32
+DEFAULT_TIMEOUT_SECONDS = 5
+
+@dataclass
+class AccessResult:
+    """Outcome of checking a repository: whether it answered and the commit its HEAD pointed to."""
+    repo_url: str
+    reachable: bool
+    head_sha: Optional[str] = None
+    checked_at: float = 0.0
+
+    def is_fresh(self, now=None):
+        ttl = REACHABLE_TTL_SECONDS if self.reachable else UNREACHABLE_TTL_SECONDS
+        return (now or time.time()) - self.checked_at < ttl
+
+class AccessCache:
+    """
+    SQLite store of the last access check of each remote repository.
+
+    Connections are opened per call so the cache can be shared by threads
+    and processes.
+    """
+
+    def __init__(self, path=ACCESS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS repo_access (
+                    repo_url TEXT PRIMARY KEY,
+                    reachable INTEGER NOT NULL,
+                    head_sha TEXT,
+                    checked_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, repo_urls):
+        """Cached results of the given repositories, fresh or not, by URL."""
+        results = {}
+        with self._lock, self._connect() as conn:
+            for repo_url in repo_urls:
+                row = conn.execute(
+                    "SELECT repo_url, reachable, head_sha, checked_at FROM repo_access WHERE repo_url = ?",
+                    (repo_url,)
+                ).fetchone()
+                if row:
+                    results[repo_url] = AccessResult(row[0], bool(row[1]), row[2], row[3])
+        return results
+
+    def put_many(self, results):
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO repo_access VALUES (?, ?, ?, ?)",
+                [(result.repo_url, int(result.reachable), result.head_sha, result.checked_at) for result in results]
+            )
+
+# Global access cache instance
+access_cache = None
+
+def get_access_cache():
+    """Get or create the global access cache."""
+    global access_cache
+
+    if access_cache is None:
+        access_cache = AccessCache()
+
+    return access_cache
+
+async def _ls_remote(repo_url, semaphore, timeout):
+    async with semaphore:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "git", "ls-remote", repo_url, "HEAD",
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                # Never stop at a credential prompt for private or deleted repositories
+                env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+            )
+        except OSError as e:
+            logger.debug(f"Could not run git ls-remote for {repo_url}: {str(e)}")
+            return AccessResult(repo_url, False, checked_at=time.time())
+
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return AccessResult(repo_url, False, checked_at=time.time())
+
+        if process.returncode != 0:
+            return AccessResult(repo_url, False, checked_at=time.time())
+
+        # "<sha>\tHEAD"; nothing for an empty repository
+        head_sha = stdout.decode('utf-8', 'replace').split('\t', 1)[0].strip() or None
+        return AccessResult(repo_url, True, head_sha, time.time())
+
+async def _check_all(repo_urls, max_concurrent, timeout, desc):
+    semaphore = asyncio.Semaphore(max_concurrent)
+    tasks = [asyncio.ensure_future(_ls_remote(repo_url, semaphore, timeout)) for repo_url in repo_urls]
+    results = []
+    with tqdm(total=len(tasks), desc=desc, unit="repo") as pbar:
+        for task in asyncio.as_completed(tasks):
+            results.append(await task)
+            pbar.update(1)
+    return results
+
+def check_repositories(repo_urls, max_concurrent=DEFAULT_MAX_CONCURRENT, timeout=DEFAULT_TIMEOUT_SECONDS,
+                       use_cache=True, desc="Checking repo accessibility"):
+    """
+    Check that repositories can be read, returning an AccessResult per URL.
+
+    Remote repositories are asked for their HEAD with ``git ls-remote``, at
+    most ``max_concurrent`` at a time from one event loop. Results younger
+    than their TTL are answered from the on-disk cache without asking the
+    remote again. Local repositories are read directly and never cached.
+    Cached results older than HEAD_TTL_SECONDS are returned without their
+    HEAD, so a push is noticed within minutes even while the repository's
+    reachability is still answered from the cache.
+    """
+    results = {}
+    remote_urls = []
+    for repo_url in dict.fromkeys(repo_urls):
+        if is_remote_url(repo_url):
+            remote_urls.append(repo_url)
+        elif os.path.isdir(repo_url):
+            results[repo_url] = AccessResult(repo_url, True, get_head_sha(repo_url), time.time())
+        else:
+            results[repo_url] = AccessResult(repo_url, False, checked_at=time.time())
+
+    to_check = remote_urls
+    if use_cache and remote_urls:
+        try:
+            cached = get_access_cache().get_many(remote_urls)
+        except sqlite3.Error as e:
+            logger.warning(f"Error reading access cache: {str(e)}")
+            cached = {}
+        now = time.time()
+        fresh = {url: result for url, result in cached.items() if result.is_fresh(now)}
+        results.update(
+            (url, result if now - result.checked_at < HEAD_TTL_SECONDS else replace(result, head_sha=None))
+            for url, result in fresh.items()
+        )
+        to_check = [url for url in remote_urls if url not in fresh]
+        if fresh:
+            logger.debug(f"Access of {len(fresh)} repositories answered from cache")
+
+    if to_check:
+        checked = asyncio.run(_check_all(to_check, max_concurrent, timeout, desc))
+        results.update((result.repo_url, result) for result in checked)
+        if use_cache:
+            try:
+                get_access_cache().put_many(checked)
+            except sqlite3.Error as e:
+                logger.warning(f"Error writing access cache: {str(e)}")
+
+    return results
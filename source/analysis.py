@@ -4,7 +4,6 @@ import concurrent.futures
 import multiprocessing
 import signal
 from datetime import datetime, timedelta
-from pydriller import Repository
 from tqdm import tqdm
 import time
 import threading
@@ -14,8 +13,7 @@ import subprocess
 import json
 
 from .logger import get_logger
-from .utils import ensure_dir, extract_commit_info, MASTER_OUTPUT_DIR, MASTER_TEMP_DIR, get_repo_date_range
-from .metrics import calculate_metrics, merge_metrics_results
+from .utils import ensure_dir, get_repo_name, MASTER_OUTPUT_DIR, MASTER_TEMP_DIR
 
 logger = get_logger(__name__)
 
@@ -62,7 +60,8 @@ def check_memory_pressure(threshold=85):
 
 def analyze_repo_timeframe_enhanced(project_name, repo_url, start_year=None, start_month=None, end_year=None, end_month=None, 
                                   ecosystem=None, repo_category=None, calculate_weekly=True, split_large_repos=True, 
-                                  max_workers=None, batch_size=1000, memory_limit=85):
+                                  max_workers=None, batch_size=1000, memory_limit=85, backend='pydriller',
+                                  extract_profile='standard', metrics=None):
     if max_workers is None:
         max_workers = max(1, multiprocessing.cpu_count() - 1)
     
@@ -90,7 +89,7 @@ def analyze_repo_timeframe_enhanced(project_name, repo_url, start_year=None, sta
     
     ensure_dir(output_dir)
     
-    repo_name = repo_url.split('/')[-1] if '/' in repo_url else 'unnamed_repo'
+    repo_name = get_repo_name(repo_url)
     
     temp_dir_name = f"{project_name}_{repo_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     temp_dir = os.path.join(MASTER_TEMP_DIR, temp_dir_name)
@@ -100,147 +99,100 @@ def analyze_repo_timeframe_enhanced(project_name, repo_url, start_year=None, sta
     output_path = os.path.join(output_dir, output_filename)
     
     try:
-        if start_date is None or end_date is None:
-            logger.debug(f"Determining date range for full history analysis of {repo_name}")
-            try:
-                extracted_start_date, extracted_end_date = get_repo_date_range(repo_url, temp_dir)
+        from .traversal import RepositoryTraversal
+        from .metrics import MetricsCollector
+        from .repo_processing import plan_commit_chunks, get_chunk_count, iter_chunk_results, CommitRecordWriter, needs_blob_contents
+        from .repo_metadata import SPLIT_THRESHOLD
+        from .lizard_pool import get_lizard_pool
+
+        needs_blobs = needs_blob_contents(extract_profile, metrics)
+        with RepositoryTraversal(repo_url, temp_dir, start_date, end_date, backend=backend, needs_blobs=needs_blobs) as traversal:
+            if start_date is None or end_date is None:
+                logger.debug(f"Determining date range for full history analysis of {repo_name}")
+                extracted_start_date, extracted_end_date = traversal.get_date_range()
                 if start_date is None:
                     start_date = extracted_start_date
                 if end_date is None:
                     end_date = extracted_end_date
                 logger.debug(f"Extracted date range: {start_date} to {end_date}")
-            except Exception as e:
-                logger.error(f"Failed to extract date range for {repo_name}: {str(e)}")
-        
-        repo_args = {
-            'path_to_repo': repo_url,
-            'clone_repo_to': temp_dir
-        }
-        
-        if start_date:
-            repo_args['since'] = start_date
-        if end_date:
-            repo_args['to'] = end_date
             
-        repository = Repository(**repo_args)
-        
-        commit_count = 0
-        logger.debug(f"Counting commits for {repo_name}...")
-        try:
-            for _ in repository.traverse_commits():
-                commit_count += 1
-        except Exception as e:
-            logger.error(f"Error counting commits: {str(e)}")
-            logger.debug(traceback.format_exc())
-        
-        if commit_count == 0:
-            logger.debug(f"No commits found for {project_name}")
-            return
-        
-        logger.debug(f"Found {commit_count} commits in {repo_name}")
-        
-        repository = Repository(**repo_args)
+            commit_count = traversal.commit_count
+            if commit_count == 0:
+                logger.debug(f"No commits found for {project_name}")
+                return
+            
+            logger.debug(f"Found {commit_count} commits in {repo_name}")
+            should_split = commit_count >= SPLIT_THRESHOLD
 
-        from .repo_processing import estimate_repo_size, split_date_range, process_repo_chunk, merge_commit_results
-        estimated_commits, should_split = estimate_repo_size(repo_url, temp_dir, start_date, end_date)
+            with open(output_path, 'w') as f:
+                f.write('{\n')
+                f.write(f'  "project_name": "{project_name}",\n')
+                f.write(f'  "repository_url": "{repo_url}",\n')
+                f.write(f'  "repository_name": "{repo_name}",\n')
+                f.write(f'  "ecosystem": "{ecosystem or ""}",\n')
+                f.write(f'  "repo_category": "{repo_category or ""}",\n')
+                f.write('  "analysis_period": {\n')
+                f.write(f'    "start_date": "{start_date.strftime("%Y-%m-%d") if start_date else None}",\n')
+                f.write(f'    "end_date": "{end_date.strftime("%Y-%m-%d") if end_date else None}",\n')
+                f.write(f'    "full_history": {str(start_date is None and end_date is None).lower()}\n')
+                f.write('  },\n')
+                f.write('  "commits": [\n')
 
-        with open(output_path, 'w') as f:
-            f.write('{\n')
-            f.write(f'  "project_name": "{project_name}",\n')
-            f.write(f'  "repository_url": "{repo_url}",\n')
-            f.write(f'  "repository_name": "{repo_name}",\n')
-            f.write(f'  "ecosystem": "{ecosystem or ""}",\n')
-            f.write(f'  "repo_category": "{repo_category or ""}",\n')
-            f.write('  "analysis_period": {\n')
-            f.write(f'    "start_date": "{start_date.strftime("%Y-%m-%d") if start_date else None}",\n')
-            f.write(f'    "end_date": "{end_date.strftime("%Y-%m-%d") if end_date else None}",\n')
-            f.write(f'    "full_history": {str(start_date is None and end_date is None).lower()}\n')
-            f.write('  },\n')
-            f.write('  "commits": [\n')
-
-        if should_split and estimated_commits > 500 and split_large_repos:
-            chunk_count = min(4, estimated_commits // 200)
-            chunk_count = max(2, chunk_count)
-            date_chunks = split_date_range(start_date, end_date, chunk_count)
+            if should_split and split_large_repos:
+                chunks = plan_commit_chunks(traversal.commits, get_chunk_count(commit_count, max_workers))
 
-            all_chunk_results = []
-            total_commits = 0
-            
-            for i, (chunk_start, chunk_end) in enumerate(date_chunks):
-                if check_memory_pressure(memory_limit):
-                    logger.warning(f"Memory pressure before chunk {i+1}/{len(date_chunks)}, waiting...")
-                    while get_memory_usage() > memory_limit - 5:
-                        time.sleep(2)
-                        gc.collect()
+                collector = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly, metrics=metrics)
+                total_commits = 0
                 
-                chunk_result = process_repo_chunk(
-                    repo_url, chunk_start, chunk_end, temp_dir, output_dir, 
-                    batch_size=batch_size
+                chunk_results = iter_chunk_results(
+                    traversal, repo_url, chunks, temp_dir, output_dir,
+                    workers=max_workers,
+                    memory_limit=memory_limit,
+                    batch_size=batch_size,
+                    backend=backend,
+                    extract_profile=extract_profile,
+                    metrics=metrics,
+                    start_date=start_date,
+                    end_date=end_date,
+                    calculate_weekly=calculate_weekly
                 )
+                for chunk_result in chunk_results:
+                    if 'commit_file_path' in chunk_result and os.path.exists(chunk_result['commit_file_path']):
+                        with open(chunk_result['commit_file_path'], 'r') as chunk_file, open(output_path, 'a') as out_file:
+                            for line in chunk_file:
+                                if total_commits > 0:
+                                    out_file.write(',\n')
+                                out_file.write('    ' + line.strip())
+                                total_commits += 1
+                        os.remove(chunk_result['commit_file_path'])
+                    
+                    collector.merge(chunk_result['collector'])
+                    del chunk_result
+                    gc.collect()
                 
-                if 'commit_file_path' in chunk_result and os.path.exists(chunk_result['commit_file_path']):
-                    with open(chunk_result['commit_file_path'], 'r') as chunk_file, open(output_path, 'a') as out_file:
-                        if i > 0 or total_commits > 0:
-                            out_file.write(',\n')
-                        
-                        first_line = True
-                        for line in chunk_file:
-                            if not first_line:
-                                out_file.write(',\n')
-                            out_file.write('    ' + line.strip())
-                            first_line = False
-                            total_commits += 1
-                
-                all_chunk_results.append(chunk_result)
-                gc.collect()
+                try:
+                    process_metrics = collector.get_results()
+                except Exception as e:
+                    logger.error(f"Could not calculate process metrics for {project_name}: {str(e)}")
+                    process_metrics = {"error": str(e)}
                 
-            process_metrics = merge_metrics_results(all_chunk_results)
-            
-        else:
-            process_metrics = {}
-            commit_batch = []
-            processed_commits = 0
-            
-            with tqdm(total=commit_count, desc=f"Processing {project_name} Commits", unit="commit") as pbar:
-                first_commit = True
+            else:
+                writer = CommitRecordWriter(output_path, batch_size=batch_size, extract_profile=extract_profile)
+                collector = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly, metrics=metrics)
                 
-                for commit in repository.traverse_commits():
-                    try:
-                        if processed_commits % 100 == 0 and check_memory_pressure(memory_limit):
-                            logger.warning(f"Memory pressure during commit processing at {processed_commits}/{commit_count}, waiting...")
-                            while get_memory_usage() > memory_limit - 5:
-                                time.sleep(2)
-                                gc.collect()
-                        
-                        commit_info = extract_commit_info(commit)
-                        commit_batch.append(commit_info)
-                        processed_commits += 1
-                        
-                        if len(commit_batch) >= batch_size or processed_commits == commit_count:
-                            with open(output_path, 'a') as f:
-                                for i, c_info in enumerate(commit_batch):
-                                    if not first_commit or i > 0:
-                                        f.write(',\n')
-                                    f.write('    ' + json.dumps(c_info, default=str))
-                                    first_commit = False
-                            
-                            commit_batch = []
-                            gc.collect()
-                        
-                        pbar.update(1)
-                    except Exception as e:
-                        logger.error(f"Error extracting commit info: {str(e)}")
-                        logger.debug(traceback.format_exc())
-                        pbar.update(1)
-            
-            try:
-                process_metrics = calculate_metrics(
-                    repo_url, temp_dir, start_date, end_date, calculate_weekly=calculate_weekly,
-                    memory_limit=memory_limit
+                traversal.stream(
+                    [writer, collector],
+                    desc=f"Processing {project_name} Commits",
+                    memory_limit=memory_limit,
+                    lizard_pool=get_lizard_pool() if extract_profile == 'full' else None
                 )
-            except Exception as e:
-                logger.error(f"Could not calculate process metrics for {project_name}: {str(e)}")
-                process_metrics = {"error": str(e)}
+                writer.flush()
+                
+                try:
+                    process_metrics = collector.get_results()
+                except Exception as e:
+                    logger.error(f"Could not calculate process metrics for {project_name}: {str(e)}")
+                    process_metrics = {"error": str(e)}
         
         with open(output_path, 'a') as f:
             f.write('\n  ],\n')
@@ -260,7 +212,8 @@ def analyze_repo_timeframe_enhanced(project_name, repo_url, start_year=None, sta
 
 def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_year=None, start_month=None, 
                                        end_year=None, end_month=None, use_parallel=True, max_workers=None,
-                                       split_large_repos=True, batch_size=1000, memory_limit=85, output_dir_override=None):
+                                       split_large_repos=True, batch_size=1000, memory_limit=85, output_dir_override=None,
+                                       backend='pydriller', extract_profile='standard', metrics=None):
 
     if max_workers is None:
         max_workers = max(1, min(multiprocessing.cpu_count() - 1, 4))
@@ -308,7 +261,10 @@ def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_ye
                 split_large_repos, 
                 batch_size, 
                 memory_limit,
-                timeframe
+                timeframe,
+                backend=backend,
+                extract_profile=extract_profile,
+                metrics=metrics
             )
         except Exception as e:
             logger.error(f"Error analyzing {project_name} repositories: {str(e)}")
@@ -372,7 +328,10 @@ def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_ye
                             split_large_repos, 
                             batch_size, 
                             memory_limit,
-                            timeframe
+                            timeframe,
+                            backend=backend,
+                            extract_profile=extract_profile,
+                            metrics=metrics
                         )
                 
                 elif category == 'other':
@@ -406,7 +365,10 @@ def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_ye
                             split_large_repos, 
                             batch_size, 
                             memory_limit,
-                            timeframe
+                            timeframe,
+                            backend=backend,
+                            extract_profile=extract_profile,
+                            metrics=metrics
                         )
                 
                 else:
@@ -425,7 +387,10 @@ def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_ye
                         split_large_repos, 
                         batch_size, 
                         memory_limit,
-                        timeframe
+                        timeframe,
+                        backend=backend,
+                        extract_profile=extract_profile,
+                        metrics=metrics
                     )
             
             except Exception as e:
@@ -438,7 +403,8 @@ def analyze_organization_repos_enhanced(project_name, ecosystem, repos, start_ye
 
 def process_repo_group(project_name, ecosystem, repos, group_name, start_date, end_date, 
                    temp_dir, output_dir, use_parallel, max_workers, use_scheduler, 
-                   split_large_repos, batch_size, memory_limit, timeframe):
+                   split_large_repos, batch_size, memory_limit, timeframe, backend='pydriller',
+                   extract_profile='standard', metrics=None):
 
     combined_metrics = {
         "combined_summary": {
@@ -454,37 +420,38 @@ def process_repo_group(project_name, ecosystem, repos, group_name, start_date, e
     all_repo_results = []
     failed_repos = []
 
-    import subprocess
     import hashlib
-    from concurrent.futures import ThreadPoolExecutor, as_completed
 
-    def check_access(repo):
-        repo_url = repo['repo_url']
-        try:
-            subprocess.run(
-                ["git", "ls-remote", repo_url],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=5,
-                check=True
-            )
-            return (repo, None)
-        except Exception:
-            return (repo, repo_url)
+    from .access_checker import check_repositories
 
+    # HEADs seen by the check let unchanged repositories be kept without fetching them
+    access = check_repositories([repo['repo_url'] for repo in repos], desc=f"Checking {group_name} repo accessibility")
     accessible_repos = []
     failed_repo_urls = []
-    with ThreadPoolExecutor(max_workers=min(32, multiprocessing.cpu_count() * 2)) as executor:
-        futures = [executor.submit(check_access, repo) for repo in repos]
-        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Checking {group_name} repo accessibility", unit="repo"):
-            repo, failed_url = future.result()
-            if failed_url is None:
-                accessible_repos.append(repo)
-            else:
-                logger.warning(f"Skipping inaccessible repo: {failed_url}")
-                failed_repo_urls.append(failed_url)
+    remote_heads = {}
+    for repo in repos:
+        result = access[repo['repo_url']]
+        if result.reachable:
+            accessible_repos.append(repo)
+            remote_heads[repo['repo_url']] = result.head_sha
+        else:
+            logger.warning(f"Skipping inaccessible repo: {repo['repo_url']}")
+            failed_repo_urls.append(repo['repo_url'])
+
+    # Forks start from one analysis of the history they share
+    from .fork_families import seed_fork_families
+    try:
+        seed_fork_families(
+            project_name, ecosystem, group_name, accessible_repos, start_date, end_date, temp_dir, output_dir,
+            batch_size=batch_size, memory_limit=memory_limit, backend=backend,
+            extract_profile=extract_profile, metrics=metrics
+        )
+    except Exception as e:
+        logger.error(f"Error analysing shared fork history of {project_name}: {str(e)}")
+        logger.debug(traceback.format_exc())
 
     from .repo_processing import process_single_repo
+    from .analysis_state import can_continue_analysis
     import glob
 
     if use_scheduler:
@@ -498,61 +465,82 @@ def process_repo_group(project_name, ecosystem, repos, group_name, start_date, e
             temp_dir=temp_dir,
             output_dir=output_dir,
             max_memory_percent=memory_limit,
-            max_workers=max_workers
+            max_workers=max_workers,
+            backend=backend,
+            extract_profile=extract_profile,
+            metrics=metrics,
+            remote_heads=remote_heads
         )
     else:
+        pending_repos = []
         for i, repo in enumerate(accessible_repos):
             repo_url = repo['repo_url']
-            repo_name = repo_url.split('/')[-1] if '/' in repo_url else f"repo_{i}"
-
-            repo_hash = hashlib.md5(repo_name.encode()).hexdigest()[:8]
-            repo_temp_dir = os.path.join(temp_dir, repo_hash)
-            ensure_dir(repo_temp_dir)
+            repo_name = get_repo_name(repo_url, f"repo_{i}")
 
             output_pattern = os.path.join(
                 output_dir, f"{project_name}_{repo_name}_*_analysis"
             )
             existing_files = check_output_exists(output_dir, output_pattern)
-            if existing_files:
+            # Outputs with a saved state or checkpoint are continued, not skipped
+            if existing_files and not any(can_continue_analysis(path) for path in existing_files):
                 logger.info(f"Skipping already completed repo: {repo_name} (output exists: {os.path.basename(existing_files[0])})")
                 continue
+            pending_repos.append((i, repo, repo_name))
 
-            if check_memory_pressure(memory_limit):
-                logger.warning(f"Memory pressure before processing {repo_name}, waiting...")
-                while get_memory_usage() > memory_limit - 5:
-                    time.sleep(2)
-                    gc.collect()
+        from .clone_cache import ClonePrefetcher
+        from .repo_processing import needs_blob_contents
 
-            logger.debug(f"Processing {repo_name}...")
+        # Mirrors of the next repositories are fetched while the current one is analysed
+        with ClonePrefetcher([repo['repo_url'] for _, repo, _ in pending_repos],
+                             blobless=not needs_blob_contents(extract_profile, metrics)) as prefetcher:
+            for position, (i, repo, repo_name) in enumerate(pending_repos):
+                repo_hash = hashlib.md5(repo_name.encode()).hexdigest()[:8]
+                repo_temp_dir = os.path.join(temp_dir, repo_hash)
+                ensure_dir(repo_temp_dir)
 
-            logger.debug(f"Starting process_single_repo for {repo_name}")
-            try:
-                repo_result = process_single_repo(
-                    i,
-                    repo,
-                    project_name,
-                    ecosystem,
-                    group_name,
-                    start_date,
-                    end_date,
-                    repo_temp_dir,
-                    output_dir,
-                    batch_size=batch_size,
-                    memory_limit=memory_limit
-                )
-                logger.debug(f"Finished process_single_repo for {repo_name}")
-                
-                gc.collect()
-            except Exception as e:
-                logger.error(f"Exception in process_single_repo for {repo_name}: {str(e)}")
-                logger.debug(traceback.format_exc())
-                repo_result = {'error': str(e)}
+                if check_memory_pressure(memory_limit):
+                    logger.warning(f"Memory pressure before processing {repo_name}, waiting...")
+                    while get_memory_usage() > memory_limit - 5:
+                        time.sleep(2)
+                        gc.collect()
 
-            if 'error' in repo_result and repo_result['error']:
-                logger.error(f"Repository {repo_name} failed: {repo_result['error']}")
-                failed_repos.append(repo_name)
-            else:
-                all_repo_results.append(repo_result)
+                prefetcher.wait(position)
+                logger.debug(f"Processing {repo_name}...")
+
+                logger.debug(f"Starting process_single_repo for {repo_name}")
+                try:
+                    repo_result = process_single_repo(
+                        i,
+                        repo,
+                        project_name,
+                        ecosystem,
+                        group_name,
+                        start_date,
+                        end_date,
+                        repo_temp_dir,
+                        output_dir,
+                        batch_size=batch_size,
+                        memory_limit=memory_limit,
+                        backend=backend,
+                        extract_profile=extract_profile,
+                        metrics=metrics,
+                        remote_head=remote_heads.get(repo['repo_url'])
+                    )
+                    logger.debug(f"Finished process_single_repo for {repo_name}")
+                    
+                    gc.collect()
+                except Exception as e:
+                    logger.error(f"Exception in process_single_repo for {repo_name}: {str(e)}")
+                    logger.debug(traceback.format_exc())
+                    repo_result = {'error': str(e)}
+                finally:
+                    prefetcher.release(position)
+
+                if 'error' in repo_result and repo_result['error']:
+                    logger.error(f"Repository {repo_name} failed: {repo_result['error']}")
+                    failed_repos.append(repo_name)
+                else:
+                    all_repo_results.append(repo_result)
 
     combined_output_filename = f"{project_name}_{group_name}_combined_{timeframe}_analysis.json"
     combined_output_path = os.path.join(output_dir, combined_output_filename)
@@ -618,7 +606,7 @@ def process_repo_group(project_name, ecosystem, repos, group_name, start_date, e
     
     for i, repo in enumerate(repos):
         repo_url = repo['repo_url']
-        repo_name = repo_url.split('/')[-1] if '/' in repo_url else f"repo_{i}"
+        repo_name = get_repo_name(repo_url, f"repo_{i}")
         
         if repo_name in failed_repos:
             continue
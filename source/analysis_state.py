@@ -0,0 +1,218 @@
+import os
+import pickle
+import shutil
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bumped whenever the pickled calculator classes change incompatibly
+STATE_VERSION = 1
+# Bumped whenever the layout of checkpoints changes, e.g. how chunks are planned
+CHECKPOINT_VERSION = 3
+
+class AnalysisState:
+    """
+    Everything needed to continue a repository analysis from its last commit.
+
+    Holds the MetricsCollector with all calculator state (line histories,
+    session buffers, per-file counters and weekly buckets), the HEAD commit
+    it had consumed, the processing totals written to the analysis file and
+    the settings the analysis ran with. A state only continues an analysis
+    run with the same settings.
+    """
+
+    def __init__(self, head_sha, collector, total_commits=0, total_lines_added=0, total_lines_removed=0, settings=None):
+        self.version = STATE_VERSION
+        self.head_sha = head_sha
+        self.collector = collector
+        self.total_commits = total_commits
+        self.total_lines_added = total_lines_added
+        self.total_lines_removed = total_lines_removed
+        self.settings = settings or {}
+
+    def dumps(self):
+        """
+        Serialize the state.
+
+        Metric results are computed destructively by some calculators, so
+        dump before calling the collector's get_results.
+        """
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+def analysis_settings(start_date=None, end_date=None, extract_profile=None, metrics=None):
+    """Settings an analysis state must match to be continued."""
+    return {
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'extract_profile': extract_profile,
+        'metrics': tuple(metrics) if metrics is not None else None
+    }
+
+class AnalysisCheckpoint:
+    """
+    Progress of an analysis whose file is still being written.
+
+    Saved every few thousand commits or minutes while a repository is
+    processed, so an interrupted run continues from here instead of starting
+    over. ``cursor`` is the number of commits already consumed by the
+    pickled ``writer`` and ``collector``; ``file_sizes`` records how far the
+    files they write had got, and they are cut back to these sizes on
+    resume. While a checkpoint exists its analysis file is incomplete.
+
+    For a split repository ``chunk_index`` is the number of chunks already
+    merged, ``collector`` their merged metric state and the totals theirs;
+    each chunk in progress keeps a checkpoint of its own in the work
+    directory (see save_chunk_checkpoint).
+    """
+
+    def __init__(self, head_sha, settings, start_date, end_date, chunks=None):
+        self.version = CHECKPOINT_VERSION
+        self.head_sha = head_sha
+        self.settings = settings
+        self.start_date = start_date
+        self.end_date = end_date
+        self.chunks = chunks
+        self.chunk_index = 0
+        self.total_commits = 0
+        self.total_lines_added = 0
+        self.total_lines_removed = 0
+        self.cursor = 0
+        self.writer = None
+        self.collector = None
+        self.file_sizes = {}
+
+    @property
+    def split(self):
+        return self.chunks is not None
+
+    def dumps(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore_files(self):
+        """Cut the files back to their checkpointed sizes; False if one is missing."""
+        if not self.file_sizes:
+            return False
+        for path, size in self.file_sizes.items():
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                return False
+        for path, size in self.file_sizes.items():
+            with open(path, 'rb+') as f:
+                f.truncate(size)
+        return True
+
+def get_state_path(output_path):
+    """Path of the state kept next to an analysis file."""
+    base, ext = os.path.splitext(output_path)
+    return base + '.state'
+
+def get_checkpoint_path(output_path):
+    """Path of the checkpoint kept next to an analysis file while it is written."""
+    base, ext = os.path.splitext(output_path)
+    return base + '.checkpoint'
+
+def get_work_dir(output_path):
+    """Directory for the intermediate files of a checkpointed analysis."""
+    base, ext = os.path.splitext(output_path)
+    return base + '.work'
+
+def get_chunk_checkpoint_path(output_path, chunk_id):
+    """Path of the checkpoint of one chunk of a split analysis, in its work directory."""
+    return os.path.join(get_work_dir(output_path), f"{chunk_id}.checkpoint")
+
+def _write_atomically(path, data, kind):
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not save analysis {kind} to {path}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _load_matching(path, settings, kind, version):
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load analysis {kind} from {path}: {str(e)}")
+        return None
+
+    if getattr(saved, 'version', None) != version:
+        logger.debug(f"Ignoring analysis {kind} of another version at {path}")
+        return None
+    if saved.settings != settings:
+        logger.debug(f"Ignoring analysis {kind} with other settings at {path}")
+        return None
+    return saved
+
+def has_analysis_state(output_path):
+    return os.path.exists(get_state_path(output_path))
+
+def save_analysis_state(output_path, data):
+    """Write serialized state (AnalysisState.dumps) next to its analysis file."""
+    _write_atomically(get_state_path(output_path), data, 'state')
+
+def load_analysis_state(output_path, settings):
+    """
+    Return the AnalysisState saved next to an analysis file, or None.
+
+    States written by another version or with other settings are ignored.
+    """
+    state_path = get_state_path(output_path)
+    if not os.path.exists(state_path) or not os.path.exists(output_path):
+        return None
+    return _load_matching(state_path, settings, 'state', STATE_VERSION)
+
+def remove_analysis_state(output_path):
+    state_path = get_state_path(output_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+def has_analysis_checkpoint(output_path):
+    """Whether the analysis file was left incomplete by an interrupted run."""
+    return os.path.exists(get_checkpoint_path(output_path))
+
+def save_analysis_checkpoint(output_path, data):
+    """Write a serialized AnalysisCheckpoint next to its analysis file."""
+    _write_atomically(get_checkpoint_path(output_path), data, 'checkpoint')
+
+def load_analysis_checkpoint(output_path, settings):
+    """
+    Return the AnalysisCheckpoint of an interrupted analysis, or None.
+
+    Checkpoints written by another version or with other settings are
+    ignored; their analysis has to start over.
+    """
+    checkpoint_path = get_checkpoint_path(output_path)
+    if not os.path.exists(checkpoint_path):
+        return None
+    return _load_matching(checkpoint_path, settings, 'checkpoint', CHECKPOINT_VERSION)
+
+def save_chunk_checkpoint(output_path, chunk_id, data):
+    """Write the serialized AnalysisCheckpoint of a chunk in progress."""
+    _write_atomically(get_chunk_checkpoint_path(output_path, chunk_id), data, 'chunk checkpoint')
+
+def load_chunk_checkpoint(output_path, chunk_id, settings):
+    """
+    Return the AnalysisCheckpoint an interrupted run left for a chunk, or None.
+
+    Only valid together with the checkpoint of the whole analysis, which
+    removes the work directory whenever it is dropped.
+    """
+    checkpoint_path = get_chunk_checkpoint_path(output_path, chunk_id)
+    if not os.path.exists(checkpoint_path):
+        return None
+    return _load_matching(checkpoint_path, settings, 'chunk checkpoint', CHECKPOINT_VERSION)
+
+def remove_analysis_checkpoint(output_path):
+    """Drop the checkpoint and intermediate files of a finished analysis."""
+    checkpoint_path = get_checkpoint_path(output_path)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    shutil.rmtree(get_work_dir(output_path), ignore_errors=True)
+
+def can_continue_analysis(output_path):
+    """Whether an existing analysis file is to be updated or resumed rather than skipped."""
+    return has_analysis_state(output_path) or has_analysis_checkpoint(output_path)
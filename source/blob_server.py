@@ -0,0 +1,204 @@
+import threading
+import subprocess
+from collections import OrderedDict
+
+from pydriller.domain.commit import ModifiedFile
+
+from .logger import get_logger
+from .git_log_backend import LazyBlob, StreamedDiff
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_MB = 256
+# Blobs larger than this share of the budget are served but never cached
+MAX_CACHED_BLOB_SHARE = 8
+# Chunk size for the part of a blob a prefix read streams past
+DISCARD_CHUNK_BYTES = 64 * 1024
+
+class BlobServer:
+    """
+    Serves blob contents from one long-lived ``git cat-file --batch`` process.
+
+    Contents are kept in a byte-bounded LRU keyed by blob SHA. A file that is
+    unchanged between commits, such as the "before" side of one commit and
+    the "after" side of the previous one, is answered from memory; every
+    other lookup goes through the same pipe instead of a new git process.
+    Blob sizes are answered from the object headers by a second
+    ``git cat-file --batch-check`` process, without reading any content.
+    """
+
+    def __init__(self, repo_path, max_cache_mb=DEFAULT_CACHE_MB):
+        self.repo_path = str(repo_path)
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self._process = None
+        self._check_process = None
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def _spawn(self, mode):
+        return subprocess.Popen(
+            ["git", "-C", self.repo_path, "cat-file", mode],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def _start(self):
+        self._process = self._spawn("--batch")
+
+    @staticmethod
+    def _stop(process):
+        try:
+            process.stdin.close()
+            process.wait(timeout=10)
+        except Exception:
+            process.kill()
+
+    def close(self):
+        """Stop the cat-file processes and drop the cache."""
+        with self._lock:
+            if self._process is not None:
+                self._stop(self._process)
+                self._process = None
+            if self._check_process is not None:
+                self._stop(self._check_process)
+                self._check_process = None
+            self._cache.clear()
+            self._cache_bytes = 0
+
+        if self.hits or self.misses:
+            logger.debug(f"Blob server for {self.repo_path}: {self.hits} hits, {self.misses} misses")
+
+    def _request(self, hexsha, max_bytes=None):
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+
+        self._process.stdin.write(f"{hexsha}\n".encode())
+        self._process.stdin.flush()
+
+        header = self._process.stdout.readline()
+        if not header:
+            raise IOError(f"git cat-file exited while reading {hexsha}")
+
+        parts = header.split()
+        if len(parts) < 3 or parts[1] == b'missing':
+            raise KeyError(f"Blob {hexsha} not found in {self.repo_path}")
+
+        size = int(parts[2])
+        data = self._process.stdout.read(size if max_bytes is None else min(size, max_bytes))
+        remaining = size - len(data)
+        while remaining > 0:
+            remaining -= len(self._process.stdout.read(min(remaining, DISCARD_CHUNK_BYTES)))
+        self._process.stdout.read(1)  # trailing newline
+        return data
+
+    def _request_size(self, hexsha):
+        if self._check_process is None or self._check_process.poll() is not None:
+            self._check_process = self._spawn("--batch-check")
+
+        self._check_process.stdin.write(f"{hexsha}\n".encode())
+        self._check_process.stdin.flush()
+
+        header = self._check_process.stdout.readline()
+        if not header:
+            raise IOError(f"git cat-file exited while checking {hexsha}")
+
+        parts = header.split()
+        if len(parts) < 3 or parts[1] == b'missing':
+            raise KeyError(f"Blob {hexsha} not found in {self.repo_path}")
+        return int(parts[2])
+
+    def size(self, hexsha):
+        """Return the size of a blob in bytes without reading its content."""
+        with self._lock:
+            data = self._cache.get(hexsha)
+            if data is not None:
+                return len(data)
+
+            try:
+                return self._request_size(hexsha)
+            except (IOError, BrokenPipeError):
+                # Restart a dead process once before giving up
+                self._check_process = None
+                return self._request_size(hexsha)
+
+    def read(self, hexsha):
+        """Return the raw content of a blob."""
+        with self._lock:
+            data = self._cache.get(hexsha)
+            if data is not None:
+                self._cache.move_to_end(hexsha)
+                self.hits += 1
+                return data
+
+            self.misses += 1
+            try:
+                data = self._request(hexsha)
+            except (IOError, BrokenPipeError):
+                # Restart a dead process once before giving up
+                self._process = None
+                data = self._request(hexsha)
+
+            if len(data) <= self.max_cache_bytes // MAX_CACHED_BLOB_SHARE:
+                self._cache[hexsha] = data
+                self._cache_bytes += len(data)
+                while self._cache_bytes > self.max_cache_bytes and self._cache:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= len(evicted)
+
+            return data
+
+    def read_prefix(self, hexsha, max_bytes):
+        """
+        Return at most the first ``max_bytes`` of a blob.
+
+        A cached blob is sliced; any other is streamed past the prefix
+        without being kept, so the cache only holds what consumers read.
+        """
+        with self._lock:
+            data = self._cache.get(hexsha)
+            if data is not None:
+                return data[:max_bytes]
+
+            try:
+                return self._request(hexsha, max_bytes)
+            except (IOError, BrokenPipeError):
+                # Restart a dead process once before giving up
+                self._process = None
+                return self._request(hexsha, max_bytes)
+
+    def bind(self, modified_file):
+        """
+        Return the modified file with its blob contents served by this server.
+
+        Files from the gitlog backend are already bound; pydriller files are
+        rebuilt on the same diff with server-backed blobs, so source_code and
+        the lizard-based properties stop going through GitPython.
+        """
+        diff = getattr(modified_file, '_c_diff', None)
+        if diff is None or isinstance(diff, StreamedDiff):
+            return modified_file
+
+        if diff.new_file:
+            change = 'A'
+        elif diff.deleted_file:
+            change = 'D'
+        elif diff.renamed_file:
+            change = 'R'
+        else:
+            change = 'M'
+
+        a_blob = LazyBlob(diff.a_blob.hexsha, self.read) if diff.a_blob is not None else None
+        b_blob = LazyBlob(diff.b_blob.hexsha, self.read) if diff.b_blob is not None else None
+
+        return ModifiedFile(StreamedDiff(diff.a_path, diff.b_path, change, a_blob, b_blob, diff.diff))
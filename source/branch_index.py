@@ -0,0 +1,117 @@
+import subprocess
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+class BranchIndex:
+    """
+    Branch membership of every commit, computed with one walk of the history.
+
+    Each local branch gets a bit. ``git rev-list --topo-order --parents``
+    from all branch tips lists every commit before its parents, so a
+    commit's bitmap is complete when it is reached and can be ORed into its
+    parents. Lookups then replace one ``git branch --contains`` per commit,
+    and return the same names that command prints, including the detached
+    HEAD entry.
+
+    With ``default_branch_only`` only the branch HEAD points to is indexed.
+    A mirror has every branch of its remote as a local branch, while the
+    fresh clone a remote used to be analysed from only had the default one,
+    so this keeps ``branches`` and ``in_main_branch`` as they were.
+    """
+
+    def __init__(self, repo_path, default_branch_only=False):
+        self.repo_path = str(repo_path)
+        self.default_branch_only = default_branch_only
+        self.main_branch = ''
+        self._names = []
+        self._bitmaps = None
+        self._sets = {}
+
+    def _git(self, *args):
+        return subprocess.run(
+            ["git", "-C", self.repo_path] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        ).stdout.decode('utf-8', 'replace')
+
+    def _list_tips(self):
+        tips = []
+        for line in self._git("for-each-ref", "--format=%(objectname) %(refname:lstrip=2)", "refs/heads").splitlines():
+            sha, _, name = line.partition(' ')
+            if name:
+                tips.append((name, sha))
+
+        try:
+            self.main_branch = self._git("symbolic-ref", "--short", "HEAD").strip()
+        except subprocess.CalledProcessError:
+            # Detached HEAD: git branch lists it as an entry of its own
+            self.main_branch = ''
+            for line in self._git("branch", "--list").splitlines():
+                if line.startswith("* ("):
+                    try:
+                        tips.append((line[2:].strip(), self._git("rev-parse", "HEAD").strip()))
+                    except subprocess.CalledProcessError:
+                        pass
+                    break
+
+        if self.default_branch_only:
+            tips = [(name, sha) for name, sha in tips if name == self.main_branch]
+        return tips
+
+    def build(self):
+        """Walk the history once and assign branch bitmaps to every commit."""
+        tips = self._list_tips()
+        self._names = [name for name, _ in tips]
+        bitmaps = {}
+
+        if tips:
+            for bit, (_, sha) in enumerate(tips):
+                bitmaps[sha] = bitmaps.get(sha, 0) | (1 << bit)
+
+            process = subprocess.Popen(
+                ["git", "-C", self.repo_path, "rev-list", "--topo-order", "--parents", "--stdin"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+            process.stdin.write(''.join(f"{sha}\n" for sha in {sha for _, sha in tips}).encode())
+            process.stdin.close()
+
+            for line in process.stdout:
+                shas = line.split()
+                if not shas:
+                    continue
+                commit = shas[0].decode()
+                bitmap = bitmaps.get(commit, 0)
+                for parent in shas[1:]:
+                    parent = parent.decode()
+                    bitmaps[parent] = bitmaps.get(parent, 0) | bitmap
+
+            process.stdout.close()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, "git rev-list")
+
+        self._bitmaps = bitmaps
+        logger.debug(f"Indexed {len(bitmaps)} commits over {len(self._names)} branches in {self.repo_path}")
+        return self
+
+    def branches(self, commit_hash):
+        """Names of the branches containing a commit."""
+        if self._bitmaps is None:
+            self.build()
+
+        bitmap = self._bitmaps.get(commit_hash, 0)
+        branches = self._sets.get(bitmap)
+        if branches is None:
+            branches = {name for bit, name in enumerate(self._names) if bitmap >> bit & 1}
+            self._sets[bitmap] = branches
+        # Callers may mutate the result, so never hand out the shared set
+        return set(branches)
+
+    def in_main_branch(self, commit_hash):
+        if self._bitmaps is None:
+            self.build()
+        return self.main_branch in self.branches(commit_hash)
@@ -0,0 +1,556 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: leases then only cover the process holding them
+    fcntl = None
+
+from .logger import get_logger
+from .utils import ensure_dir, MIRROR_DIR
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_CACHE_GB = 20
+# Object filter of partial mirrors: commits and trees only, blobs fetched on demand
+PARTIAL_CLONE_FILTER = 'blob:none'
+LOCK_TIMEOUT_SECONDS = 3600
+STALE_LOCK_SECONDS = 6 * 3600
+# A mirror fetched this recently, by any process, is used as it is
+REFRESH_INTERVAL_SECONDS = 10 * 60
+# Repositories whose mirrors are fetched ahead of their analysis, and by how many threads
+DEFAULT_PREFETCH_DEPTH = 2
+DEFAULT_PREFETCH_WORKERS = 2
+# Prefetching pauses above this share of the cache budget or below this much free disk
+PREFETCH_HIGH_WATER = 0.9
+PREFETCH_MIN_FREE_GB = 5
+# Set to False to leave mirrors as git fetched them
+MAINTAIN_MIRRORS = True
+
+class _FileLock:
+    """
+    Cross-process lock based on an exclusively created lock file.
+
+    Used instead of fcntl so the cache also works on Windows. Locks older
+    than STALE_LOCK_SECONDS are assumed to belong to a crashed run.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT_SECONDS):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > STALE_LOCK_SECONDS:
+                        logger.warning(f"Removing stale lock {self.path}")
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(0.5)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
+
+class _MirrorLease:
+    """
+    Shared lock on a mirror's lease file, held from acquire to release.
+
+    flock locks are released by the kernel when their process dies, so a
+    crashed run never leaves a mirror leased. Eviction only removes a
+    mirror once it gets the lock exclusively (see exclusive).
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_CREAT | os.O_RDWR)
+        if fcntl is not None:
+            # Waits while the mirror is being evicted
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+
+    def close(self):
+        os.close(self.fd)
+
+    @contextmanager
+    def upgraded(self):
+        """
+        Hold the lease exclusively if no one else holds it, without waiting; yields whether it does.
+
+        Without fcntl other readers cannot be seen, so it never does.
+        """
+        if fcntl is None:
+            yield False
+            return
+        # flock cannot upgrade in place: a failed attempt could lose the shared lock
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        try:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+            except OSError:
+                locked = False
+            yield locked
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+
+    @staticmethod
+    @contextmanager
+    def exclusive(path):
+        """Try to lock a lease file exclusively without waiting; yields whether it is locked."""
+        fd = os.open(path, os.O_CREAT | os.O_RDWR)
+        try:
+            locked = True
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    locked = False
+            yield locked
+        finally:
+            os.close(fd)
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def pack_fingerprint(repo_path):
+    """
+    Fingerprint of the object storage of a repository.
+
+    Pack names are hashes of their contents, so the fingerprint changes
+    whenever a fetch adds a pack or loose objects, or a repack rewrites them.
+    """
+    objects_dir = os.path.join(repo_path, 'objects')
+    try:
+        packs = sorted(name for name in os.listdir(os.path.join(objects_dir, 'pack')) if name.endswith('.pack'))
+    except OSError:
+        packs = []
+    loose = 0
+    try:
+        for name in os.listdir(objects_dir):
+            if len(name) == 2:
+                loose += len(os.listdir(os.path.join(objects_dir, name)))
+    except OSError:
+        pass
+    return hashlib.md5(f"{','.join(packs)}:{loose}".encode()).hexdigest()
+
+class MirrorCache:
+    """
+    Persistent cache of bare mirror clones keyed by repository URL.
+
+    A mirror is cloned once and refreshed with a fetch on later runs. The
+    time of the last fetch is kept in the index, so a mirror is fetched at
+    most once every REFRESH_INTERVAL_SECONDS by any of the processes
+    sharing the cache. Each acquire holds a shared file lock on the
+    mirror's lease file until its release. Mirrors are evicted
+    least-recently-used when the cache grows past its disk budget, and
+    only while no process holds a lease on them.
+
+    With ``partial_clone``, runs that only read commit headers get a
+    blobless mirror (``--filter=blob:none``). Numstat and diffs compare
+    blobs, which git would fetch from the origin one commit at a time, so a
+    later run that reads them upgrades the mirror to a full one with a
+    single refetch first.
+
+    After a clone or fetch brought in new objects, mirrors are repacked
+    into one pack with a reachability bitmap and get a commit-graph with
+    changed-path Bloom filters, which speed up history walks, commit
+    counts and path-limited logs. Fetches that changed nothing leave the
+    mirror as it is. Repacking deletes the old packs, so it only runs while
+    no other process or thread holds a lease on the mirror; otherwise a
+    later acquire tries again. Partial mirrors are left as git fetched them.
+    """
+
+    def __init__(self, root=MIRROR_DIR, max_size_gb=DEFAULT_MAX_CACHE_GB, partial_clone=False):
+        self.root = ensure_dir(root)
+        self.max_size_bytes = int(max_size_gb * 1024 ** 3)
+        self.partial_clone = partial_clone
+        self.index_path = os.path.join(self.root, 'index.json')
+        self._lock = threading.Lock()
+        self._leases = {}
+
+    @staticmethod
+    def get_key(repo_url):
+        """Cache key of a repository URL."""
+        normalized = repo_url.strip().rstrip('/')
+        if normalized.endswith('.git'):
+            normalized = normalized[:-4]
+        return hashlib.md5(normalized.lower().encode('utf-8')).hexdigest()[:16]
+
+    def get_mirror_path(self, repo_url):
+        """Location of the mirror; the last path component keeps the repository name."""
+        repo_name = repo_url.rstrip('/').split('/')[-1]
+        if repo_name.endswith('.git'):
+            repo_name = repo_name[:-4]
+        return os.path.join(self.root, self.get_key(repo_url), repo_name or 'repo')
+
+    def _lease_path(self, key):
+        # Next to the mirror directory, so removing a mirror keeps its lease file
+        return os.path.join(self.root, f"{key}.lease")
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading mirror cache index: {str(e)}")
+        return {}
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _update_index(self, key, **values):
+        with _FileLock(self.index_path + '.lock'):
+            index = self._load_index()
+            entry = index.setdefault(key, {})
+            entry.update(values)
+            self._save_index(index)
+
+    def _clone(self, repo_url, mirror_path, blobless=False):
+        tmp_path = mirror_path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        ensure_dir(os.path.dirname(mirror_path))
+
+        logger.debug(f"Creating {'blobless ' if blobless else ''}mirror of {repo_url} at {mirror_path}")
+        filter_args = [f"--filter={PARTIAL_CLONE_FILTER}"] if blobless else []
+        subprocess.run(
+            ["git", "clone", "--bare", "--quiet"] + filter_args + [repo_url, tmp_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        # Track branches and tags only; a plain --mirror would also pull
+        # review refs such as refs/pull/* that are never analysed.
+        subprocess.run(
+            ["git", "-C", tmp_path, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"],
+            check=True
+        )
+        os.replace(tmp_path, mirror_path)
+
+    def _refresh(self, repo_url, mirror_path):
+        logger.debug(f"Refreshing mirror of {repo_url}")
+        subprocess.run(
+            ["git", "-C", mirror_path, "fetch", "--quiet", "--prune", "--tags", "origin"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+
+    def _maintain(self, repo_url, mirror_path, key, lease):
+        """Repack with bitmaps and write the commit-graph, unless the packs are as last maintained."""
+        entry = self._load_index().get(key, {})
+        if entry.get('pack_fingerprint') == pack_fingerprint(mirror_path):
+            return
+        if self.is_partial(mirror_path):
+            return
+
+        with lease.upgraded() as exclusive:
+            if not exclusive:
+                logger.debug(f"Mirror of {repo_url} is in use, maintaining it on a later acquire")
+                return
+            self._repack(repo_url, mirror_path, key)
+
+    def _repack(self, repo_url, mirror_path, key):
+        logger.debug(f"Repacking mirror of {repo_url} and writing its commit-graph")
+        try:
+            subprocess.run(
+                ["git", "-C", mirror_path, "repack", "-a", "-d", "-q", "--write-bitmap-index"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+            subprocess.run(
+                ["git", "-C", mirror_path, "commit-graph", "write", "--reachable", "--changed-paths", "--no-progress"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+        except subprocess.CalledProcessError as e:
+            # The mirror is still complete, only slower to read
+            logger.warning(f"Could not maintain mirror of {repo_url}: {e.stderr.decode(errors='replace').strip() if e.stderr else str(e)}")
+            return
+
+        self._update_index(key, pack_fingerprint=pack_fingerprint(mirror_path))
+
+    @staticmethod
+    def is_partial(mirror_path):
+        """Whether a mirror was cloned with an object filter."""
+        result = subprocess.run(
+            ["git", "-C", mirror_path, "config", "--get", "remote.origin.partialclonefilter"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        return result.returncode == 0 and bool(result.stdout.strip())
+
+    def _upgrade(self, repo_url, mirror_path):
+        """Turn a blobless mirror into a full one by refetching without the filter."""
+        logger.debug(f"Fetching all blobs of the mirror of {repo_url}")
+        subprocess.run(
+            ["git", "-C", mirror_path, "config", "--unset", "remote.origin.partialclonefilter"],
+            check=True
+        )
+        subprocess.run(
+            ["git", "-C", mirror_path, "fetch", "--quiet", "--refetch", "--tags", "origin"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+
+    def acquire(self, repo_url, refresh=True, blobless=False):
+        """
+        Return the path of an up-to-date mirror and mark it in use.
+
+        ``blobless`` tells that the caller only reads commit headers; it only
+        takes effect when the cache allows partial clones. Every acquire must
+        be paired with a release.
+        """
+        blobless = blobless and self.partial_clone
+        key = self.get_key(repo_url)
+        mirror_path = self.get_mirror_path(repo_url)
+
+        lease = _MirrorLease(self._lease_path(key))
+        with self._lock:
+            self._leases.setdefault(key, []).append(lease)
+
+        try:
+            with _FileLock(os.path.join(self.root, f"{key}.lock")):
+                refreshed_at = self._load_index().get(key, {}).get('refreshed_at', 0)
+                fetched = False
+                if not os.path.isdir(mirror_path):
+                    self._clone(repo_url, mirror_path, blobless=blobless)
+                    fetched = True
+                elif not blobless and self.is_partial(mirror_path):
+                    try:
+                        self._upgrade(repo_url, mirror_path)
+                    except subprocess.CalledProcessError as e:
+                        # Missing blobs are still fetched one diff at a time
+                        logger.warning(f"Could not fetch all blobs of {repo_url}: {e.stderr.decode(errors='replace').strip() if e.stderr else str(e)}")
+                    fetched = True
+                elif refresh and time.time() - refreshed_at > REFRESH_INTERVAL_SECONDS:
+                    try:
+                        self._refresh(repo_url, mirror_path)
+                    except subprocess.CalledProcessError as e:
+                        # A stale mirror is still usable for the analysis
+                        logger.warning(f"Could not refresh mirror of {repo_url}: {e.stderr.decode(errors='replace').strip() if e.stderr else str(e)}")
+                    fetched = True
+
+                if fetched:
+                    refreshed_at = time.time()
+                if MAINTAIN_MIRRORS:
+                    self._maintain(repo_url, mirror_path, key, lease)
+
+            self._update_index(
+                key,
+                url=repo_url,
+                path=mirror_path,
+                last_used=time.time(),
+                refreshed_at=refreshed_at,
+                size_bytes=_dir_size(mirror_path)
+            )
+        except Exception:
+            self.release(repo_url)
+            raise
+
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"Error evicting mirrors: {str(e)}")
+
+        return mirror_path
+
+    def release(self, repo_url):
+        """Give up the lease taken by one acquire of a mirror."""
+        key = self.get_key(repo_url)
+        with self._lock:
+            leases = self._leases.get(key)
+            if not leases:
+                return
+            lease = leases.pop()
+            if not leases:
+                del self._leases[key]
+        lease.close()
+
+    @contextmanager
+    def mirror(self, repo_url, refresh=True):
+        """Context manager around acquire/release."""
+        mirror_path = self.acquire(repo_url, refresh=refresh)
+        try:
+            yield mirror_path
+        finally:
+            self.release(repo_url)
+
+    def total_size(self):
+        """Disk use of the cached mirrors in bytes, as last recorded in the index."""
+        return sum(entry.get('size_bytes', 0) for entry in self._load_index().values())
+
+    def evict(self):
+        """Remove least-recently-used mirrors no process holds a lease on until the cache fits its disk budget."""
+        with _FileLock(self.index_path + '.lock'):
+            index = self._load_index()
+            total_size = sum(entry.get('size_bytes', 0) for entry in index.values())
+            if total_size <= self.max_size_bytes:
+                return
+
+            with self._lock:
+                leased = set(self._leases)
+
+            for key, entry in sorted(index.items(), key=lambda item: item[1].get('last_used', 0)):
+                if total_size <= self.max_size_bytes:
+                    break
+                if key in leased:
+                    continue
+
+                with _MirrorLease.exclusive(self._lease_path(key)) as locked:
+                    if not locked:
+                        # Read by another process
+                        continue
+                    if os.path.exists(os.path.join(self.root, f"{key}.lock")):
+                        # Cloned or fetched by a process without a lease
+                        continue
+
+                    logger.info(f"Evicting mirror of {entry.get('url')} ({entry.get('size_bytes', 0) / 1024 ** 2:.1f} MB)")
+                    shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                    total_size -= entry.get('size_bytes', 0)
+                    del index[key]
+
+            self._save_index(index)
+
+class ClonePrefetcher:
+    """
+    Clones or refreshes the mirrors of upcoming repositories in the background.
+
+    While the repository at position ``i`` of ``repo_urls`` is analysed, the
+    mirrors of the next ``depth`` remote repositories are acquired by at most
+    ``max_workers`` threads, so network I/O overlaps with analysis. A
+    prefetched mirror stays in use, and safe from eviction, until its
+    repository is released. No prefetch starts while the cache is above
+    ``high_water`` of its budget or less than ``min_free_gb`` of disk is
+    free; such repositories are cloned by their analysis as before.
+    Repositories are still analysed in the order given.
+    """
+
+    def __init__(self, repo_urls, depth=DEFAULT_PREFETCH_DEPTH, max_workers=DEFAULT_PREFETCH_WORKERS, blobless=False,
+                 high_water=PREFETCH_HIGH_WATER, min_free_gb=PREFETCH_MIN_FREE_GB, mirror_cache=None):
+        self.repo_urls = list(repo_urls)
+        self.depth = depth
+        self.blobless = blobless
+        self.high_water = high_water
+        self.min_free_bytes = int(min_free_gb * 1024 ** 3)
+        self.mirror_cache = mirror_cache or get_mirror_cache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch") if depth > 0 else None
+        self._futures = {}
+        self._acquired = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def _has_room(self):
+        if self.mirror_cache.total_size() > self.high_water * self.mirror_cache.max_size_bytes:
+            return False
+        try:
+            return shutil.disk_usage(self.mirror_cache.root).free >= self.min_free_bytes
+        except OSError:
+            return True
+
+    def _acquire(self, position):
+        self.mirror_cache.acquire(self.repo_urls[position], blobless=self.blobless)
+        with self._lock:
+            self._acquired.add(position)
+
+    def _schedule(self, start):
+        from .traversal import is_remote_url
+
+        for position in range(start, min(start + self.depth, len(self.repo_urls))):
+            if position in self._futures or not is_remote_url(self.repo_urls[position]):
+                continue
+            if not self._has_room():
+                logger.debug("Mirror cache above its high-water mark, prefetching paused")
+                return
+            self._futures[position] = self._executor.submit(self._acquire, position)
+
+    def wait(self, position):
+        """Start prefetching the repositories after ``position`` and wait for its own mirror."""
+        if self._executor is None:
+            return
+        self._schedule(position + 1)
+        future = self._futures.get(position)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            # The analysis clones the repository again and reports the error
+            logger.debug(f"Prefetching {self.repo_urls[position]} failed: {str(e)}")
+
+    def release(self, position):
+        """Mark the repository at ``position`` as analysed."""
+        self._futures.pop(position, None)
+        with self._lock:
+            acquired = position in self._acquired
+            self._acquired.discard(position)
+        if acquired:
+            self.mirror_cache.release(self.repo_urls[position])
+
+    def close(self):
+        """Cancel prefetches not yet started and release every prefetched mirror."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            acquired = list(self._acquired)
+        for position in acquired:
+            self.release(position)
+
+# Global mirror cache instance
+mirror_cache = None
+
+def get_mirror_cache(max_size_gb=None, partial_clone=None):
+    """Get or create the global mirror cache."""
+    global mirror_cache
+
+    if mirror_cache is None:
+        mirror_cache = MirrorCache(max_size_gb=max_size_gb or DEFAULT_MAX_CACHE_GB, partial_clone=bool(partial_clone))
+    else:
+        if max_size_gb is not None:
+            mirror_cache.max_size_bytes = int(max_size_gb * 1024 ** 3)
+        if partial_clone is not None:
+            mirror_cache.partial_clone = partial_clone
+
+    return mirror_cache
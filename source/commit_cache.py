@@ -0,0 +1,139 @@
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+from .logger import get_logger
+from .utils import CACHE_DIR
+from .file_filters import IGNORED_FILE_PATTERNS
+from .file_classifier import OVERSIZED_BYTES, SNIFF_BYTES, GENERATED_FILENAMES, GENERATED_MARKERS
+
+logger = get_logger(__name__)
+
+COMMIT_CACHE_DB = os.path.join(CACHE_DIR, "commits.sqlite")
+
+# Bumped whenever extract_commit_info changes the records it produces
+RECORD_VERSION = 3
+
+# Record fields that depend on the repository a commit was read from, not on the commit
+REPOSITORY_FIELDS = ('branches', 'in_main_branch', 'project_name', 'project_path')
+
+def file_selection_key():
+    """Digest of the file filter and classifier settings, which decide the files a record lists."""
+    settings = {
+        'ignored_patterns': IGNORED_FILE_PATTERNS,
+        'oversized_bytes': OVERSIZED_BYTES,
+        'sniff_bytes': SNIFF_BYTES,
+        'generated_filenames': sorted(GENERATED_FILENAMES),
+        'generated_markers': GENERATED_MARKERS.pattern.decode(),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+class CommitCache:
+    """
+    SQLite store of extracted commit records keyed by commit SHA.
+
+    A commit's record only depends on its SHA, the extraction profile and
+    the settings selecting its files (file_selection_key), so it is reused
+    wherever the commit is reached again: from a fork or mirror of the same
+    repository, an overlapping date window or a later run. The
+    repository-dependent fields are left out and filled in from the commit
+    being processed. Each process keeps one connection, shared by its
+    threads under a lock; other processes open their own.
+    """
+
+    def __init__(self, path=COMMIT_CACHE_DB):
+        self.path = path
+        self.file_selection = file_selection_key()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self.hits = 0
+        self.misses = 0
+        with self._lock, self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(commit_records)")]
+            if columns and 'file_selection' not in columns:
+                # Records of unknown file settings can never be matched again
+                conn.execute("DROP TABLE commit_records")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS commit_records (
+                    sha TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    file_selection TEXT NOT NULL,
+                    record BLOB NOT NULL,
+                    PRIMARY KEY (sha, profile, version, file_selection)
+                )
+            """)
+
+    def _connection(self):
+        # A connection inherited through fork belongs to the parent
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        """Close this process's connection; the next call opens a new one."""
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def contains(self, sha, profile):
+        with self._lock, self._connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM commit_records WHERE sha = ? AND profile = ? AND version = ? AND file_selection = ?",
+                (sha, profile, RECORD_VERSION, self.file_selection)
+            ).fetchone()
+        return row is not None
+
+    def get(self, commit, profile):
+        """Record of a commit extracted with ``profile``, or None."""
+        with self._lock, self._connection() as conn:
+            row = conn.execute(
+                "SELECT record FROM commit_records WHERE sha = ? AND profile = ? AND version = ? AND file_selection = ?",
+                (commit.hash, profile, RECORD_VERSION, self.file_selection)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        record = json.loads(zlib.decompress(row[0]))
+        for field in REPOSITORY_FIELDS:
+            record[field] = getattr(commit, field)
+        return record
+
+    def put(self, record, profile):
+        """Store a record; records of failed extractions are not kept."""
+        if 'error' in record or not record.get('hash'):
+            return
+        data = {key: value for key, value in record.items() if key not in REPOSITORY_FIELDS}
+        blob = zlib.compress(json.dumps(data, default=str).encode())
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO commit_records (sha, profile, version, file_selection, record) VALUES (?, ?, ?, ?, ?)",
+                (record['hash'], profile, RECORD_VERSION, self.file_selection, blob)
+            )
+
+# Global commit cache instance, only created once enabled
+commit_cache = None
+commit_cache_enabled = False
+
+def get_commit_cache(enabled=None):
+    """Get the global commit cache, or None while it is disabled."""
+    global commit_cache, commit_cache_enabled
+
+    if enabled is not None:
+        commit_cache_enabled = enabled
+    if not commit_cache_enabled:
+        return None
+
+    if commit_cache is None:
+        commit_cache = CommitCache()
+
+    return commit_cache
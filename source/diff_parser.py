@@ -0,0 +1,125 @@
+import re
+from collections import namedtuple
+
+HUNK_HEADER = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+NO_NEWLINE_MARKER = r"\ No newline at end of file"
+# Line prefixes every line-level metric treats as comments
+COMMENT_PREFIXES = ('#', '//', '/*', '*', '<!--')
+
+class DiffLine(namedtuple('DiffLine', 'old_line new_line added content stripped hash blank comment')):
+    """
+    One added or removed line of a diff.
+
+    ``content`` is the line without its +/- marker and trailing whitespace,
+    as in pydriller's diff_parsed; ``stripped`` also drops the indentation.
+    ``hash`` is ``hash(stripped)``, computed once for the metrics that match
+    lines by content. String hashes differ between processes, so it is
+    never persisted. ``blank`` and ``comment`` are the classifications
+    shared by the metrics.
+    """
+
+    __slots__ = ()
+
+    @property
+    def number(self):
+        """Line number in the new file for added lines, in the old file for removed ones."""
+        return self.new_line if self.added else self.old_line
+
+Hunk = namedtuple('Hunk', 'old_start old_count new_start new_count lines')
+
+class ParsedDiff:
+    """
+    Added and removed lines of a file's diff, split into hunks.
+
+    Built once per modified file by ``parse_diff`` and read by every
+    line-level metric instead of each re-tokenizing the patch text. Line
+    numbers follow pydriller's diff_parsed. ``change_blocks`` counts runs
+    of consecutive added or removed lines, several of which can share a
+    hunk.
+    """
+
+    __slots__ = ('hunks', 'added', 'deleted', 'change_blocks')
+
+    def __init__(self, hunks, added, deleted, change_blocks):
+        self.hunks = hunks
+        self.added = added
+        self.deleted = deleted
+        self.change_blocks = change_blocks
+
+    @property
+    def hunk_count(self):
+        return len(self.hunks)
+
+    def as_diff_parsed(self):
+        """The lines in pydriller's diff_parsed layout."""
+        return {
+            'added': [(line.new_line, line.content) for line in self.added],
+            'deleted': [(line.old_line, line.content) for line in self.deleted]
+        }
+
+def _diff_line(old_line, new_line, added, line):
+    content = line[1:]
+    stripped = content.strip()
+    return DiffLine(old_line, new_line, added, content, stripped, hash(stripped), not stripped, stripped.startswith(COMMENT_PREFIXES))
+
+def parse_diff(diff):
+    """Parse the patch text of one file in a single pass."""
+    hunks = []
+    added = []
+    deleted = []
+    change_blocks = 0
+    in_block = False
+    hunk_lines = None
+    old_line = new_line = 0
+
+    for line in (diff or '').split('\n'):
+        line = line.rstrip()
+        old_line += 1
+        new_line += 1
+
+        if line.startswith('+') or line.startswith('-'):
+            if not in_block:
+                in_block = True
+                change_blocks += 1
+        else:
+            in_block = False
+
+        if line.startswith('@@'):
+            header = HUNK_HEADER.match(line)
+            if header is not None:
+                old_start, old_count, new_start, new_count = header.groups()
+                old_line = int(old_start) - 1
+                new_line = int(new_start) - 1
+                hunk_lines = []
+                hunks.append(Hunk(int(old_start), int(old_count) if old_count else 1,
+                                  int(new_start), int(new_count) if new_count else 1, hunk_lines))
+        elif line.startswith('-'):
+            new_line -= 1
+            diff_line = _diff_line(old_line, new_line, False, line)
+            deleted.append(diff_line)
+            if hunk_lines is not None:
+                hunk_lines.append(diff_line)
+        elif line.startswith('+'):
+            old_line -= 1
+            diff_line = _diff_line(old_line, new_line, True, line)
+            added.append(diff_line)
+            if hunk_lines is not None:
+                hunk_lines.append(diff_line)
+        elif line == NO_NEWLINE_MARKER:
+            old_line -= 1
+            new_line -= 1
+
+    return ParsedDiff(hunks, added, deleted, change_blocks)
+
+def get_parsed_diff(modified_file):
+    """
+    Return the ParsedDiff of a modified file, or None if it has no diff.
+
+    FileSnapshots parse their diff once and share it; other file objects are
+    parsed on every call.
+    """
+    parsed = getattr(modified_file, 'parsed_diff', None)
+    if parsed is not None:
+        return parsed
+    diff = getattr(modified_file, 'diff', None)
+    return parse_diff(diff) if diff is not None else None
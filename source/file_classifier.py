@@ -0,0 +1,107 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+BINARY = 'binary'
+OVERSIZED = 'oversized'
+GENERATED = 'generated'
+
+# Same cap commit extraction applies to source code
+OVERSIZED_BYTES = 5 * 1024 * 1024
+# Generated-code markers are looked for in this many leading bytes
+SNIFF_BYTES = 1024
+# Classifications kept per repository, keyed by blob SHA
+MAX_CACHED_BLOBS = 100000
+
+# Lockfiles and other dependency snapshots written by tools
+GENERATED_FILENAMES = frozenset({
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml',
+    'Cargo.lock', 'Gemfile.lock', 'composer.lock', 'Pipfile.lock', 'poetry.lock',
+    'uv.lock', 'go.sum', 'mix.lock', 'pubspec.lock', 'Podfile.lock',
+    'packages.lock.json', 'flake.lock'
+})
+
+GENERATED_MARKERS = re.compile(
+    rb'Code generated .{0,200}DO NOT EDIT|@generated|<auto-generated|'
+    rb'[Aa]uto-?generated (?:file|code|by)|[Tt]his file (?:is|was) (?:automatically )?generated|'
+    rb'Generated by the protocol buffer compiler'
+)
+
+def _blob_sha(blob):
+    return getattr(blob, 'hexsha', None) if blob is not None else None
+
+class FileClassifier:
+    """
+    Marks modified files as binary, oversized or generated before any blob is loaded.
+
+    Binary files are recognised by git's "-" numstat counts or "Binary
+    files" patch and generated ones by lockfile name. Oversized files are
+    recognised by the blob size in the object header, from ``git cat-file
+    --batch-check``, and only the first SNIFF_BYTES of the remaining blobs
+    are read to search for generated-code markers. Every run classifies
+    files the same way, whichever metrics it computes; only runs reading
+    nothing but commit headers use blobless partial clones, and those never
+    look at files. Results are cached by blob SHA.
+    """
+
+    def __init__(self, blob_server=None, max_bytes=OVERSIZED_BYTES):
+        self.blob_server = blob_server
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.skipped = {BINARY: 0, OVERSIZED: 0, GENERATED: 0}
+
+    def _classify_blob(self, sha):
+        with self._lock:
+            if sha in self._cache:
+                self._cache.move_to_end(sha)
+                return self._cache[sha]
+
+        classification = None
+        try:
+            if self.blob_server.size(sha) > self.max_bytes:
+                classification = OVERSIZED
+            elif GENERATED_MARKERS.search(self.blob_server.read_prefix(sha, SNIFF_BYTES)):
+                classification = GENERATED
+        except Exception as e:
+            logger.debug(f"Could not classify blob {sha}: {str(e)}")
+
+        with self._lock:
+            self._cache[sha] = classification
+            while len(self._cache) > MAX_CACHED_BLOBS:
+                self._cache.popitem(last=False)
+        return classification
+
+    def classify(self, modified_file):
+        """Return BINARY, OVERSIZED, GENERATED or None for a pydriller ModifiedFile."""
+        path = modified_file.new_path or modified_file.old_path
+        if path and os.path.basename(path) in GENERATED_FILENAMES:
+            return GENERATED
+
+        diff = getattr(modified_file, '_c_diff', None)
+        if diff is None:
+            return None
+
+        if getattr(diff, 'binary', None) or (getattr(diff, 'diff', None) or b'').startswith(b'Binary files '):
+            return BINARY
+
+        if self.blob_server is None:
+            return None
+        # The version after the commit, or the removed one for deletions
+        sha = _blob_sha(diff.b_blob) or _blob_sha(diff.a_blob)
+        if sha is None:
+            return None
+        return self._classify_blob(sha)
+
+    def should_analyze(self, modified_file):
+        """File filter of the metrics pipeline: False for files to skip."""
+        classification = self.classify(modified_file)
+        if classification is None:
+            return True
+        self.skipped[classification] += 1
+        return False
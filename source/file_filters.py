@@ -1,5 +1,6 @@
 import os
 import re
+from functools import lru_cache
 from .logger import get_logger
 
 # Set up logger for this module
@@ -46,20 +47,35 @@ IGNORED_FILE_PATTERNS = [
     r'\.dll$',   # Dynamic link libraries
     r'\.exe$',   # Executable files
     r'\.pyc$',   # Python compiled files
-    r'__pycache__', # Python cache directories
-    r'node_modules', # Node.js modules
-    r'vendor/',  # Vendor directories
-    r'dist/',    # Distribution directories
-    r'build/',   # Build directories
-    r'\.git/',   # Git directories
+    # Directories match whole path segments, so e.g. rebuild/ and redist/ are kept
+    r'(?:^|/)__pycache__(?:/|$)', # Python cache directories
+    r'(?:^|/)node_modules(?:/|$)', # Node.js modules
+    r'(?:^|/)vendor/',  # Vendor directories
+    r'(?:^|/)dist/',    # Distribution directories
+    r'(?:^|/)build/',   # Build directories
+    r'(?:^|/)\.git/',   # Git directories
     r'\.7z$',   # 7z archives
 ]
 
-# Compiled regex patterns for faster matching
-IGNORED_PATTERNS = [re.compile(pattern) for pattern in IGNORED_FILE_PATTERNS]
+# All patterns as one alternation, so a path is scanned once
+IGNORED_REGEX = re.compile('|'.join(f'(?:{pattern})' for pattern in IGNORED_FILE_PATTERNS))
 
 # Remove file size limit logic
 
+@lru_cache(maxsize=65536)
+def is_ignored_path(path):
+    """
+    Check a path against the ignore patterns.
+
+    Memoized per path: the same files are modified over and over in a
+    history, and every modified file of every commit goes through here.
+    """
+    return IGNORED_REGEX.search(path) is not None
+
+def should_analyze_path(path):
+    """File filter of the metrics pipeline: False for paths of modified files to leave out."""
+    return not path or not is_ignored_path(path)
+
 def should_analyze_file(file_path):
     # Skip if file doesn't exist (this shouldn't happen normally)
     if not file_path or (os.path.exists(file_path) == False and not isinstance(file_path, str)):
@@ -69,15 +85,5 @@ def should_analyze_file(file_path):
     # Extract filename from path if it's a path
     filename = os.path.basename(file_path) if os.path.isfile(file_path) else file_path
     
-    # Log the file being checked
-    logger.debug(f"Checking file: {filename}")
-    
     # Check if filename matches any ignored patterns
-    for i, pattern in enumerate(IGNORED_PATTERNS):
-        if pattern.search(filename):
-            logger.info(f"Ignoring file matching pattern '{IGNORED_FILE_PATTERNS[i]}': {filename}")
-            return False
-    
-    # If none of the filters above excluded the file, it should be analyzed
-    logger.debug(f"File passed filters: {filename}")
-    return True
+    return not is_ignored_path(filename)
@@ -0,0 +1,245 @@
+import os
+import json
+import shutil
+import hashlib
+import traceback
+import subprocess
+from contextlib import ExitStack
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .logger import get_logger
+from .utils import ensure_dir, get_repo_name, DEFAULT_EXTRACT_PROFILE
+from .traversal import RepositoryTraversal, DEFAULT_BACKEND, is_remote_url
+from .clone_cache import get_mirror_cache
+from .repo_metadata import is_ancestor, get_cached_metadata
+from .analysis_state import get_state_path, has_analysis_checkpoint, has_analysis_state, remove_analysis_checkpoint
+
+logger = get_logger(__name__)
+
+@dataclass
+class ForkFamily:
+    """
+    Repositories sharing history, e.g. forks of the same upstream.
+
+    ``base_sha`` is the newest commit on the first-parent history of the
+    first member that every member contains; the history up to it is
+    analysed once for the whole family.
+    """
+    roots: frozenset
+    members: List[dict] = field(default_factory=list)
+    base_sha: Optional[str] = None
+
+def get_root_commits(path):
+    """Root commits of the history of HEAD."""
+    try:
+        output = subprocess.run(
+            ["git", "-C", str(path), "rev-list", "--max-parents=0", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True
+        ).stdout.decode('utf-8', 'replace')
+    except subprocess.CalledProcessError:
+        return frozenset()
+    return frozenset(output.split())
+
+def known_root_commits(repo_url):
+    """
+    Root commits of a repository found without cloning or fetching it.
+
+    Local repositories are read in place; remote ones use the roots in
+    their cached metadata or, failing that, their mirror if one exists.
+    Empty when neither is available yet.
+    """
+    if not is_remote_url(repo_url):
+        return get_root_commits(repo_url)
+
+    metadata = get_cached_metadata(repo_url)
+    if metadata is not None and metadata.roots:
+        return metadata.roots
+
+    mirror_path = get_mirror_cache().get_mirror_path(repo_url)
+    if os.path.isdir(mirror_path):
+        return get_root_commits(mirror_path)
+    return frozenset()
+
+def find_shared_base(path, other_paths):
+    """
+    Newest first-parent ancestor of HEAD at ``path`` reachable from HEAD in all ``other_paths``.
+
+    Being an ancestor is monotonic along a first-parent chain, so the chain
+    is bisected with ``git merge-base --is-ancestor``.
+    """
+    try:
+        chain = subprocess.run(
+            ["git", "-C", str(path), "rev-list", "--first-parent", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True
+        ).stdout.decode('utf-8', 'replace').split()
+    except subprocess.CalledProcessError:
+        return None
+
+    lo, hi = 0, len(chain)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if all(is_ancestor(other, chain[mid]) for other in other_paths):
+            hi = mid
+        else:
+            lo = mid + 1
+    return chain[lo] if lo < len(chain) else None
+
+def group_by_roots(repos, roots):
+    """Group repositories whose histories have a root commit in common; ``roots`` holds each one's root commits."""
+    families = []
+    for repo, repo_roots in zip(repos, roots):
+        if not repo_roots:
+            continue
+        matching = [family for family in families if family.roots & repo_roots]
+        family = ForkFamily(roots=repo_roots, members=[repo])
+        for other in matching:
+            families.remove(other)
+            family.roots |= other.roots
+            family.members = other.members + family.members
+        families.append(family)
+    return [family for family in families if len(family.members) > 1]
+
+def copy_analysis(src_path, dst_path, repo_url, repo_name, traversal):
+    """
+    Copy an analysis file and its state for another repository of the same family.
+
+    Commit records carry fields of the repository they were read from; the
+    project name and path and the branch membership are rewritten for the
+    repository opened by ``traversal``.
+    """
+    project_path = Path(traversal.local_path)
+    tmp_path = dst_path + '.tmp'
+    with open(src_path, 'r') as src, open(tmp_path, 'w') as dst:
+        in_commits = False
+        for line in src:
+            if not in_commits:
+                if line.startswith('  "repository_url": '):
+                    line = f'  "repository_url": "{repo_url}",\n'
+                elif line.startswith('  "repository_name": '):
+                    line = f'  "repository_name": "{repo_name}",\n'
+                elif line.startswith('  "commits": ['):
+                    in_commits = True
+            elif line.startswith('    {'):
+                record = line.rstrip('\n')
+                separator = ',' if record.endswith(',') else ''
+                c_info = json.loads(record.rstrip(','))
+                c_info['project_name'] = project_path.name
+                c_info['project_path'] = str(project_path)
+                if 'branches' in c_info:
+                    c_info['branches'] = traversal.branch_index.branches(c_info['hash'])
+                    c_info['in_main_branch'] = traversal.branch_index.in_main_branch(c_info['hash'])
+                line = '    ' + json.dumps(c_info, default=str) + separator + '\n'
+            else:
+                in_commits = False
+            dst.write(line)
+    shutil.copyfile(get_state_path(src_path), get_state_path(dst_path))
+    os.replace(tmp_path, dst_path)
+
+def seed_fork_families(project_name, ecosystem, category, repos, start_date, end_date, temp_dir, output_dir,
+                       batch_size=1000, memory_limit=85, backend=DEFAULT_BACKEND, extract_profile=DEFAULT_EXTRACT_PROFILE,
+                       metrics=None):
+    """
+    Analyse the shared history of forks once and start each fork's analysis from it.
+
+    Repositories without an analysis yet are grouped by root commit, as far
+    as their roots are known without cloning (see known_root_commits). For
+    each family the history up to its shared base commit is analysed in the
+    first member's analysis file and copied, with its saved state, to the
+    others. Only the members of one family are opened at a time, and only
+    while their shared base is looked for, so mirrors are fetched and
+    leased as the analysis reaches them. Processing a member afterwards
+    only adds the commits it has on top of the base, as for any analysis
+    continued from its state. Returns the number of repositories seeded.
+    """
+    from .repo_processing import process_repo_directly, get_analysis_path, needs_blob_contents
+
+    def repo_name_of(repo):
+        return get_repo_name(repo['repo_url'])
+
+    pending = []
+    for repo in repos:
+        output_path = get_analysis_path(output_dir, project_name, repo_name_of(repo), start_date, end_date)
+        if os.path.exists(output_path) or os.path.exists(os.path.splitext(output_path)[0] + '.7z'):
+            continue
+        if has_analysis_checkpoint(output_path):
+            continue
+        pending.append(repo)
+
+    if len(pending) < 2:
+        return 0
+
+    needs_blobs = needs_blob_contents(extract_profile, metrics)
+
+    def open_member(stack, repo):
+        repo_hash = hashlib.md5(repo_name_of(repo).encode()).hexdigest()[:8]
+        clone_dir = os.path.join(temp_dir, 'forks', repo_hash)
+        ensure_dir(clone_dir)
+        return stack.enter_context(
+            RepositoryTraversal(repo['repo_url'], clone_dir, backend=backend, classify_files=False, needs_blobs=needs_blobs)
+        )
+
+    seeded = 0
+    for family in group_by_roots(pending, [known_root_commits(repo['repo_url']) for repo in pending]):
+        # Released again before any analysis starts
+        with ExitStack() as stack:
+            paths = []
+            for repo in family.members:
+                try:
+                    paths.append(open_member(stack, repo).local_path)
+                except Exception as e:
+                    logger.debug(f"Could not open {repo['repo_url']} to look for forks: {str(e)}")
+                    break
+            else:
+                family.base_sha = find_shared_base(paths[0], paths[1:])
+        if family.base_sha is None:
+            continue
+
+        base_repo = family.members[0]
+        base_name = repo_name_of(base_repo)
+        base_path = get_analysis_path(output_dir, project_name, base_name, start_date, end_date)
+        logger.info(f"Analysing history shared by {len(family.members)} forks once, up to {family.base_sha[:10]} of {base_name}")
+
+        try:
+            process_repo_directly(
+                project_name, base_repo['repo_url'], start_date, end_date,
+                ecosystem, category, temp_dir, output_dir,
+                batch_size=batch_size,
+                memory_limit=memory_limit,
+                backend=backend,
+                extract_profile=extract_profile,
+                metrics=metrics,
+                head_sha=family.base_sha
+            )
+        except Exception as e:
+            logger.error(f"Error analysing shared history of {base_name}: {str(e)}")
+            logger.debug(traceback.format_exc())
+            continue
+
+        if not (os.path.exists(base_path) and has_analysis_state(base_path)):
+            # E.g. no shared commit in the analysis period; the base repository starts over too
+            logger.info(f"No shared history of {base_name} to continue, forks are analysed separately")
+            if os.path.exists(base_path):
+                os.remove(base_path)
+            remove_analysis_checkpoint(base_path)
+            continue
+        seeded += 1
+
+        for repo in family.members[1:]:
+            repo_name = repo_name_of(repo)
+            try:
+                with ExitStack() as stack:
+                    copy_analysis(base_path, get_analysis_path(output_dir, project_name, repo_name, start_date, end_date),
+                                  repo['repo_url'], repo_name, open_member(stack, repo))
+                seeded += 1
+            except Exception as e:
+                logger.warning(f"Could not seed the analysis of {repo_name} from {base_name}: {str(e)}")
+
+    if seeded:
+        logger.info(f"Seeded {seeded} analyses from shared fork history")
+    return seeded
@@ -0,0 +1,499 @@
+import re
+import io
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+from pydriller.domain.commit import Commit as PydrillerCommit, ModifiedFile
+from pydriller.domain.developer import Developer
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+NULL_SHA = '0' * 40
+EMPTY_BLOB_SHA = 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+COMMIT_MARKER = b'\x1e'
+FIELD_SEPARATOR = '\x1f'
+HEADER_FORMAT = FIELD_SEPARATOR.join(['%H', '%P', '%an', '%ae', '%aI', '%cn', '%ce', '%cI', '%B'])
+NUMSTAT_PATTERN = re.compile(rb'^(\d+|-)\t(\d+|-)\t')
+
+# Options that keep git's output stable whatever the user's git config says
+GIT_CONFIG_ARGS = ["-c", "core.quotepath=off", "-c", "diff.noprefix=false", "-c", "log.showSignature=false"]
+DIFF_ARGS = ["-M", "--raw", "--numstat", "-p", "--no-abbrev", "--full-index",
+             "--no-color", "--no-ext-diff", "--no-textconv", "--src-prefix=a/", "--dst-prefix=b/"]
+# Same file list without the patches, for runs that only need line counts
+NUMSTAT_DIFF_ARGS = [arg for arg in DIFF_ARGS if arg != "-p"]
+
+_ESCAPES = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', '"': '"', '\\': '\\'}
+
+def unquote_path(path):
+    """Undo git's C-style quoting of unusual file names."""
+    if not (len(path) >= 2 and path.startswith('"') and path.endswith('"')):
+        return path
+
+    body = path[1:-1]
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == '\\' and i + 1 < len(body):
+            nxt = body[i + 1]
+            if re.match(r'[0-7]{3}', body[i + 1:i + 4]):
+                out.append(int(body[i + 1:i + 4], 8))
+                i += 4
+                continue
+            out.extend(_ESCAPES.get(nxt, nxt).encode('utf-8'))
+            i += 2
+            continue
+        out.extend(char.encode('utf-8'))
+        i += 1
+    return out.decode('utf-8', errors='replace')
+
+def _decode(raw):
+    return raw.decode('utf-8', errors='replace')
+
+def _timezone_offset(date):
+    """Seconds west of UTC, the convention GitPython and pydriller use."""
+    return -int(date.utcoffset().total_seconds())
+
+def _stats_from_numstat(lines):
+    total = {"insertions": 0, "deletions": 0, "lines": 0, "files": 0}
+    for line in lines:
+        parts = line.split('\t')
+        if len(parts) < 3:
+            continue
+        insertions = int(parts[0]) if parts[0] != '-' else 0
+        deletions = int(parts[1]) if parts[1] != '-' else 0
+        total["insertions"] += insertions
+        total["deletions"] += deletions
+        total["lines"] += insertions + deletions
+        total["files"] += 1
+    return total
+
+class LazyBlob:
+    """Blob stand-in whose content is only read when a metric asks for it."""
+
+    def __init__(self, hexsha, reader):
+        self.hexsha = hexsha
+        self._reader = reader
+        self._data = None
+
+    @property
+    def data_stream(self):
+        # pydriller reads the content several times per property; fetch it once
+        if self._data is None:
+            self._data = self._reader(self.hexsha)
+        return io.BytesIO(self._data)
+
+    def __eq__(self, other):
+        return isinstance(other, LazyBlob) and other.hexsha == self.hexsha
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.hexsha)
+
+class StreamedDiff:
+    """
+    The subset of a GitPython Diff that pydriller's ModifiedFile reads.
+
+    Building real ModifiedFile objects on top of it keeps diff_parsed, the
+    line counts and the lizard-based properties identical to the pydriller
+    backend.
+    """
+
+    def __init__(self, a_path, b_path, change, a_blob, b_blob, diff, binary=None):
+        self.a_path = a_path
+        self.b_path = b_path
+        self.new_file = change == 'A'
+        self.deleted_file = change == 'D'
+        self.renamed_file = change == 'R'
+        self.a_blob = a_blob
+        self.b_blob = b_blob
+        self.diff = diff
+        # Known without a patch when listed from --numstat ("-" counts)
+        self.binary = diff.startswith(b'Binary files ') if binary is None else binary
+
+class NumstatModifiedFile(ModifiedFile):
+    """
+    ModifiedFile listed without its patch.
+
+    The line counts come from ``--numstat``; diff and diff_parsed are empty.
+    Blob contents are still available.
+    """
+
+    def __init__(self, diff, added_lines, deleted_lines):
+        super().__init__(diff)
+        self._added_lines = added_lines
+        self._deleted_lines = deleted_lines
+
+    @property
+    def added_lines(self):
+        return self._added_lines
+
+    @property
+    def deleted_lines(self):
+        return self._deleted_lines
+
+class GitLogCommit:
+    """
+    Commit read from the git log stream, with the attributes of a pydriller Commit.
+
+    Headers are available as soon as the commit is listed; modified files and
+    stats are attached when the commit passes through the diff stream.
+    """
+
+    def __init__(self, repository, fields):
+        (self.hash, parents, author_name, author_email, author_date,
+         committer_name, committer_email, committer_date, message) = fields
+
+        self._repository = repository
+        self.parents = parents.split() if parents else []
+        self.author = Developer(author_name, author_email)
+        self.committer = Developer(committer_name, committer_email)
+        self.author_date = datetime.fromisoformat(author_date)
+        self.committer_date = datetime.fromisoformat(committer_date)
+        self.author_timezone = _timezone_offset(self.author_date)
+        self.committer_timezone = _timezone_offset(self.committer_date)
+        self.msg = message.strip()
+        self._modified_files = None
+        self._stats_cache = None
+        self._branches = None
+
+    @property
+    def merge(self):
+        return len(self.parents) > 1
+
+    @property
+    def project_name(self):
+        return Path(self._repository.path).name
+
+    @property
+    def project_path(self):
+        return str(Path(self._repository.path))
+
+    @property
+    def modified_files(self):
+        # Merge commits have no modified files, as in pydriller
+        if self.merge:
+            return []
+        if self._modified_files is None:
+            self._repository.load_changes([self])
+        return self._modified_files
+
+    def _stats(self):
+        if self._stats_cache is None:
+            if self.merge:
+                self._stats_cache = _stats_from_numstat(self._repository.numstat(self.parents[0], self.hash))
+            else:
+                self._repository.load_changes([self])
+        return self._stats_cache
+
+    @property
+    def insertions(self):
+        return self._stats()["insertions"]
+
+    @property
+    def deletions(self):
+        return self._stats()["deletions"]
+
+    @property
+    def lines(self):
+        return self._stats()["lines"]
+
+    @property
+    def files(self):
+        return self._stats()["files"]
+
+    @property
+    def branches(self):
+        if self._branches is None:
+            self._branches = self._repository.branches_containing(self.hash)
+        return self._branches
+
+    @property
+    def in_main_branch(self):
+        return self._repository.main_branch in self.branches
+
+    def release_changes(self):
+        """Drop the attached diffs once every consumer has seen the commit."""
+        self._modified_files = None
+
+    # The Delta Maintainability Model only needs modified_files, so reuse pydriller's implementation
+    dmm_unit_size = PydrillerCommit.dmm_unit_size
+    dmm_unit_complexity = PydrillerCommit.dmm_unit_complexity
+    dmm_unit_interfacing = PydrillerCommit.dmm_unit_interfacing
+    _delta_maintainability = PydrillerCommit._delta_maintainability
+    _delta_risk_profile = PydrillerCommit._delta_risk_profile
+    _good_change_proportion = PydrillerCommit.__dict__['_good_change_proportion']
+
+class GitLogRepository:
+    """
+    Ingestion backend that reads history straight from ``git log``.
+
+    Commit headers come from one ``git log`` call. Diffs for a run of commits
+    come from a single ``git log --raw --numstat -p`` subprocess whose output
+    is parsed incrementally, so only the commit being processed is held in
+    memory as Python objects. Blob contents are read through ``blob_server``
+    when one is given.
+    """
+
+    def __init__(self, path, blob_server=None):
+        self.path = str(path)
+        self.blob_server = blob_server
+        self._main_branch = None
+
+    def _git(self, *args, **kwargs):
+        return subprocess.run(
+            ["git", "-C", self.path] + GIT_CONFIG_ARGS + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            **kwargs
+        ).stdout
+
+    @property
+    def main_branch(self):
+        if self._main_branch is None:
+            try:
+                self._main_branch = _decode(self._git("symbolic-ref", "--short", "HEAD")).strip()
+            except subprocess.CalledProcessError:
+                # Detached HEAD, same behaviour as pydriller
+                self._main_branch = ''
+        return self._main_branch
+
+    def list_commits(self, rev='HEAD', since=None, until=None):
+        """List commits oldest first, with headers only."""
+        args = ["log", "-z", "--reverse", f"--format={HEADER_FORMAT}"]
+        if since is not None:
+            args.append(f"--since={since}")
+        if until is not None:
+            args.append(f"--until={until}")
+        args.append(rev)
+
+        try:
+            output = self._git(*args)
+        except subprocess.CalledProcessError as e:
+            stderr = _decode(e.stderr or b'')
+            if "does not have any commits" in stderr or "bad revision" in stderr or "unknown revision" in stderr:
+                logger.debug(f"Could not find commits in {self.path}")
+                return []
+            raise Exception(f"Error while getting commits: {stderr.strip()}")
+
+        commits = []
+        for record in output.split(b'\x00'):
+            if not record:
+                continue
+            fields = _decode(record).split(FIELD_SEPARATOR, 8)
+            if len(fields) == 9:
+                commits.append(GitLogCommit(self, fields))
+        return commits
+
+    def numstat(self, base, commit_hash):
+        output = self._git("diff", "--numstat", "-M", base, commit_hash, "--")
+        return [_decode(line) for line in output.splitlines() if line]
+
+    def branches_containing(self, commit_hash):
+        output = _decode(self._git("branch", "--contains", commit_hash))
+        return {line.strip().replace("* ", "") for line in output.split("\n") if line.strip()}
+
+    def read_blob(self, hexsha):
+        if self.blob_server is not None:
+            return self.blob_server.read(hexsha)
+        return self._git("cat-file", "blob", hexsha)
+
+    def stream_changes(self, commit_hashes, patches=True):
+        """
+        Yield ``(hash, modified_files, numstat_lines)`` for each commit, in order.
+
+        One git subprocess lists the changes of all given commits. Without
+        ``patches`` no diff text is produced and the files are
+        NumstatModifiedFiles carrying only line counts.
+        """
+        if not commit_hashes:
+            return
+
+        process = subprocess.Popen(
+            ["git", "-C", self.path] + GIT_CONFIG_ARGS +
+            ["log", "--stdin", "--no-walk=unsorted", "--format=%x1e%H"] + (DIFF_ARGS if patches else NUMSTAT_DIFF_ARGS),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+        try:
+            # git reads the whole revision list before it writes anything
+            process.stdin.write(''.join(f"{commit_hash}\n" for commit_hash in commit_hashes).encode())
+            process.stdin.close()
+
+            yield from _LogStreamParser(self, patches=patches).parse(process.stdout)
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    def iter_changes(self, commits, patches=True):
+        """
+        Yield each commit with its modified files and stats attached.
+
+        One git subprocess streams the diffs of all given commits in order.
+        Merge commits are passed through without a diff, as pydriller does.
+        """
+        by_hash = {commit.hash: commit for commit in commits}
+        if not by_hash:
+            return
+
+        for commit_hash, files, numstat_lines in self.stream_changes([commit.hash for commit in commits], patches=patches):
+            commit = by_hash.get(commit_hash)
+            if commit is None:
+                continue
+            if not commit.merge:
+                commit._modified_files = files
+                commit._stats_cache = _stats_from_numstat(numstat_lines)
+            yield commit
+
+    def load_changes(self, commits):
+        """Attach modified files and stats to commits outside of a stream."""
+        for _ in self.iter_changes(commits):
+            pass
+        for commit in commits:
+            if commit._modified_files is None:
+                commit._modified_files = []
+            if commit._stats_cache is None and not commit.merge:
+                commit._stats_cache = _stats_from_numstat([])
+
+class _LogStreamParser:
+    """Incremental parser for ``git log --raw --numstat [-p]`` output."""
+
+    def __init__(self, repository, patches=True):
+        self.repository = repository
+        self.patches = patches
+
+    def parse(self, stream):
+        commit_hash = None
+        raw_entries = []
+        numstat_lines = []
+        patches = []
+        patch = None
+
+        for line in stream:
+            if line.startswith(COMMIT_MARKER):
+                if commit_hash is not None:
+                    if patch is not None:
+                        patches.append(patch)
+                    yield commit_hash, self._build_files(raw_entries, patches, numstat_lines), numstat_lines
+                commit_hash = _decode(line[1:].strip())
+                raw_entries, numstat_lines, patches, patch = [], [], [], None
+            elif patch is not None or line.startswith(b'diff --git '):
+                if line.startswith(b'diff --git '):
+                    if patch is not None:
+                        patches.append(patch)
+                    patch = []
+                else:
+                    patch.append(line)
+            elif line.startswith(b':'):
+                raw_entries.append(_decode(line.rstrip(b'\n')))
+            elif NUMSTAT_PATTERN.match(line):
+                numstat_lines.append(_decode(line.rstrip(b'\n')))
+
+        if commit_hash is not None:
+            if patch is not None:
+                patches.append(patch)
+            yield commit_hash, self._build_files(raw_entries, patches, numstat_lines), numstat_lines
+
+    def _build_files(self, raw_entries, patches, numstat_lines):
+        files = []
+        for i, entry in enumerate(raw_entries):
+            try:
+                if self.patches:
+                    files.append(self._build_file(entry, patches[i] if i < len(patches) else []))
+                else:
+                    # --raw and --numstat list the files in the same order
+                    files.append(self._build_numstat_file(entry, numstat_lines[i] if i < len(numstat_lines) else ''))
+            except Exception as e:
+                logger.debug(f"Could not parse diff entry {entry!r}: {str(e)}")
+        return files
+
+    def _build_numstat_file(self, entry, numstat_line):
+        meta, _, paths = entry.partition('\t')
+        _, _, old_sha, new_sha, status = meta[1:].split(' ')
+        change = status[0]
+        path_parts = [unquote_path(p) for p in paths.split('\t')]
+
+        counts = numstat_line.split('\t')
+        is_binary = len(counts) > 2 and counts[0] == '-'
+        added_lines = int(counts[0]) if len(counts) > 2 and not is_binary else 0
+        deleted_lines = int(counts[1]) if len(counts) > 2 and not is_binary else 0
+
+        # Paths as _build_file sets them: patches of binary and empty files keep both names
+        a_path = path_parts[0]
+        b_path = path_parts[-1]
+        if not is_binary and EMPTY_BLOB_SHA not in (old_sha, new_sha):
+            if change == 'A':
+                a_path = None
+            elif change == 'D':
+                b_path = None
+
+        # Pure renames and mode changes keep the blob and have no index line, hence no blobs
+        a_blob = None
+        b_blob = None
+        if old_sha != new_sha:
+            reader = self.repository.read_blob
+            if old_sha != NULL_SHA:
+                a_blob = LazyBlob(old_sha, reader)
+            if new_sha != NULL_SHA:
+                b_blob = LazyBlob(new_sha, reader)
+
+        return NumstatModifiedFile(StreamedDiff(a_path, b_path, change, a_blob, b_blob, b'', binary=is_binary), added_lines, deleted_lines)
+
+    def _build_file(self, entry, patch_lines):
+        meta, _, paths = entry.partition('\t')
+        _, _, old_sha, new_sha, status = meta[1:].split(' ')
+        change = status[0]
+        path_parts = [unquote_path(p) for p in paths.split('\t')]
+
+        old_path = path_parts[0]
+        new_path = path_parts[-1]
+
+        # Split the patch into its header and body the way GitPython does
+        has_index = False
+        has_file_lines = False
+        is_binary = False
+        body = []
+        in_body = False
+        for line in patch_lines:
+            if in_body:
+                body.append(line)
+            elif line.startswith(b'@@'):
+                in_body = True
+                body.append(line)
+            elif line.startswith(b'index '):
+                has_index = True
+            elif line.startswith(b'--- '):
+                has_file_lines = True
+            elif line.startswith(b'Binary files '):
+                is_binary = True
+                body.append(line)
+
+        a_path = old_path
+        b_path = new_path
+        if has_file_lines:
+            # The ---/+++ lines name the missing side /dev/null; binary and
+            # empty files have none, and keep both names of the diff header
+            if change == 'A':
+                a_path = None
+            elif change == 'D':
+                b_path = None
+
+        a_blob = None
+        b_blob = None
+        # Without an index line (pure renames, mode changes) GitPython has no blobs
+        if has_index:
+            reader = self.repository.read_blob
+            if old_sha != NULL_SHA:
+                a_blob = LazyBlob(old_sha, reader)
+            if new_sha != NULL_SHA:
+                b_blob = LazyBlob(new_sha, reader)
+
+        return ModifiedFile(StreamedDiff(a_path, b_path, change, a_blob, b_blob, b''.join(body)))
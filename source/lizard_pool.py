@@ -0,0 +1,118 @@
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import lizard
+from pydriller.domain.commit import Method
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Commits kept in flight per worker so the pool stays busy while consumers run
+COMMITS_PER_WORKER = 4
+
+def analyze_source(filename, source_code):
+    """Run lizard over one file version. Executed in a worker process."""
+    analysis = lizard.analyze_file.analyze_source_code(filename, source_code)
+    return analysis.nloc, analysis.CCN, analysis.token_count, [Method(func) for func in analysis.function_list]
+
+class LizardPool:
+    """
+    Worker processes running the lizard analyses of full extraction.
+
+    ``submit`` fans the analysis of every supported file version of a commit
+    out to the pool; ``resolve`` waits for them and stores the results on the
+    FileSnapshots exactly as pydriller would compute them, so the extractor
+    and the DMM properties read them without running lizard in the main
+    process. A file whose analysis fails is left untouched and falls back to
+    the in-process computation, which reports the error as before.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._executor = None
+
+    @property
+    def window(self):
+        """Number of commits to keep submitted ahead of the consumers."""
+        return self.max_workers * COMMITS_PER_WORKER
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Spawned rather than forked: a forked worker would keep copies of the
+            # pipes of git subprocesses open at that moment (blob server, git log
+            # --stdin) and stop them from ever seeing EOF.
+            # Workers need the raised recursion limit of the main process for deeply nested sources.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=sys.setrecursionlimit,
+                initargs=(sys.getrecursionlimit(),)
+            )
+        return self._executor
+
+    def submit(self, commit):
+        """Start the analyses of a CommitSnapshot's modified files."""
+        executor = self._get_executor()
+        pending = []
+
+        for modified_file in commit.modified_files:
+            try:
+                if not modified_file.language_supported:
+                    continue
+                source_code = modified_file.source_code
+                source_code_before = modified_file.source_code_before
+            except Exception as e:
+                logger.debug(f"Could not read sources of {modified_file.filename}: {str(e)}")
+                continue
+
+            after = executor.submit(analyze_source, modified_file.filename, source_code) if source_code else None
+            before = executor.submit(analyze_source, modified_file.filename, source_code_before) if source_code_before else None
+            pending.append((modified_file, after, before))
+
+        return pending
+
+    def resolve(self, pending):
+        """Wait for the analyses of one commit and attach them to its files."""
+        for modified_file, after, before in pending:
+            try:
+                if after is not None:
+                    nloc, complexity, token_count, methods = after.result()
+                else:
+                    nloc, complexity, token_count, methods = None, None, None, []
+                methods_before = before.result()[3] if before is not None else []
+            except Exception as e:
+                logger.debug(f"Lizard analysis of {modified_file.filename} failed in worker: {str(e)}")
+                continue
+
+            modified_file.nloc = nloc
+            modified_file.complexity = complexity
+            modified_file.token_count = token_count
+            modified_file.methods = methods
+            modified_file.methods_before = methods_before
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# Global lizard pool instance
+lizard_pool = None
+
+def get_lizard_pool(max_workers=None):
+    """
+    Get or create the global lizard pool.
+
+    Returns None on single-CPU machines, where offloading only adds overhead.
+    """
+    global lizard_pool
+
+    if (os.cpu_count() or 1) < 2 and max_workers is None:
+        return None
+
+    if lizard_pool is None:
+        lizard_pool = LizardPool(max_workers=max_workers)
+
+    return lizard_pool
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 import sys
 from datetime import datetime
@@ -20,11 +21,21 @@ def get_logger(name, level=logging.DEBUG):
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     
+    # Spawned worker processes (e.g. the lizard pool) log to the console only,
+    # instead of each opening a log file of its own. Their modules are often
+    # imported before parent_process() is set, while the pool's initializer
+    # is unpickled, but the spawn command line is already there.
+    if multiprocessing.parent_process() is not None or '--multiprocessing-fork' in sys.argv:
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logger.addHandler(console_handler)
+        return logger
+    
     # Get timestamp for log file
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_file = os.path.join(LOGS_DIR, f'gitin_{timestamp}.log')
     
-    file_handler = logging.FileHandler(log_file)
+    # Opened on the first record, so importing the package creates no file
+    file_handler = logging.FileHandler(log_file, delay=True)
     file_handler.setLevel(logging.DEBUG)
     
     # Create formatter
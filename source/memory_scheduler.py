@@ -361,8 +361,10 @@ def get_scheduler(max_memory_percent=75, min_free_memory_mb=1000, max_workers=No
     return memory_scheduler
 
 def process_repos_with_scheduler(project_name, ecosystem, repos, start_date=None, end_date=None, 
-                               temp_dir=None, output_dir=None, max_memory_percent=75, max_workers=None):
+                               temp_dir=None, output_dir=None, max_memory_percent=75, max_workers=None,
+                               backend='pydriller', extract_profile='standard', metrics=None, remote_heads=None):
     """Process repositories using the memory-aware scheduler."""
+    remote_heads = remote_heads or {}
     scheduler = get_scheduler(
         max_memory_percent=max_memory_percent,
         min_free_memory_mb=1000,
@@ -372,11 +374,13 @@ def process_repos_with_scheduler(project_name, ecosystem, repos, start_date=None
     
     # Fix import statement
     from .repo_processing import process_single_repo
+    from .repo_metadata import estimate_memory_mb
+    from .utils import get_repo_name
     
     job_ids = []
     for i, repo in enumerate(repos):
         repo_url = repo['repo_url']
-        repo_name = repo_url.split('/')[-1] if '/' in repo_url else f"repo_{i}"
+        repo_name = get_repo_name(repo_url, f"repo_{i}")
 
         # Skip if output already exists
         output_pattern = f"{project_name}_{repo_name}_*_analysis"
@@ -385,8 +389,10 @@ def process_repos_with_scheduler(project_name, ecosystem, repos, start_date=None
 
         # Fix import statement
         from .analysis import check_output_exists
+        from .analysis_state import can_continue_analysis
         existing_files = check_output_exists(output_dir, output_pattern)
-        if existing_files:
+        # Outputs with a saved state or checkpoint are continued, not skipped
+        if existing_files and not any(can_continue_analysis(path) for path in existing_files):
             logger.info(f"Skipping already completed repo: {repo_name}")
             continue
         
@@ -395,7 +401,11 @@ def process_repos_with_scheduler(project_name, ecosystem, repos, start_date=None
             process_single_repo,
             i, repo, project_name, ecosystem, repo['repo_category'],
             start_date, end_date, temp_dir, output_dir,
-            estimated_memory=250,  # Base estimate in MB
+            backend=backend,
+            extract_profile=extract_profile,
+            metrics=metrics,
+            remote_head=remote_heads.get(repo_url),
+            estimated_memory=estimate_memory_mb(repo_url),
             priority=i,  # Lower index = higher priority
             job_id=f"repo_{repo_name}"
         )
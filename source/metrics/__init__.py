@@ -1,4 +1,5 @@
-from .aggregator import calculate_metrics, merge_metrics_results
+from .aggregator import calculate_metrics, merge_metrics_results, MetricsCollector
+from .replay import ReplayedCommit, iter_commit_records, replay_metrics, recompute_analysis_file
 from .quality import QualityCornerstonesMetric, MeaningfulCodeMetric
 from .timings import (
     DiffDeltaMetric,
@@ -12,6 +13,11 @@ from .timings import (
 __all__ = [
     'calculate_metrics',
     'merge_metrics_results',
+    'MetricsCollector',
+    'ReplayedCommit',
+    'iter_commit_records',
+    'replay_metrics',
+    'recompute_analysis_file',
     'QualityCornerstonesMetric',
     'MeaningfulCodeMetric',
     'DiffDeltaMetric',
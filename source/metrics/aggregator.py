@@ -1,11 +1,10 @@
 import traceback
 import os
-from tqdm import tqdm
-from pydriller import Repository
 
 # Fix import paths to use relative imports
 from ..logger import get_logger
-from ..memory_scheduler import check_memory_pressure, wait_for_memory_availability
+from ..snapshot import CommitSnapshot
+from .base import BLOBLESS_REQUIREMENTS, REQUIRES_HEADER, union_requirements
 from .utils import generate_weekly_ranges
 # Updated imports with new folder structure
 from .productivity import (
@@ -29,40 +28,16 @@ from .timings import (
     CodeDomainMetric, DeveloperStatsAggregator, ComprehensiveTimeAnalysisMetric
 )
 
-from ..utils import get_repo_date_range
-
 logger = get_logger(__name__)
 
-def calculate_metrics(repo_url, repo_path, since=None, to=None, calculate_weekly=True, memory_limit=95):
+def create_metric_calculators(metrics=None):
     """
-    Calculate process metrics using the class-based approach.
-    Now includes timings metrics per developer.
+    Create one instance of every metric calculator, organized by category.
+
+    ``metrics`` optionally restricts the calculators to the given names (see
+    METRIC_NAMES); categories left without calculators are omitted.
     """
-    if calculate_weekly and (since is None or to is None):
-        logger.info("No date range provided. Determining repository date range for weekly metrics...")
-        start_date, end_date = get_repo_date_range(repo_url, repo_path)
-        
-        if start_date and end_date:
-            since = start_date
-            to = end_date
-            logger.debug(f"Using repository date range: {since.strftime('%Y-%m-%d')} to {to.strftime('%Y-%m-%d')}")
-        else:
-            logger.info("Could not determine repository date range. Falling back to overall metrics.")
-            calculate_weekly = False
-    
-    if since and since.tzinfo:
-        since = since.replace(tzinfo=None)
-    if to and to.tzinfo:
-        to = to.replace(tzinfo=None)
-
-    repo_args = {'path_to_repo': repo_url}
-    if since is not None:
-        repo_args['since'] = since
-    if to is not None:
-        repo_args['to'] = to
-    
-    # Initialize all metric calculators, organized by category
-    overall_metrics = {
+    calculators = {
         "productivity": {
             "change_set": ChangeSetMetric(),
             "commits_count": CommitsMetric(),
@@ -85,154 +60,281 @@ def calculate_metrics(repo_url, repo_path, since=None, to=None, calculate_weekly
             "comprehensive_time_analysis": ComprehensiveTimeAnalysisMetric()
         }
     }
-    
-    weekly_metrics = {}
-    
-    if calculate_weekly:
-        weekly_ranges = generate_weekly_ranges(since, to)
-        for _, _, week_label in weekly_ranges:
-            weekly_metrics[week_label] = {
-                "productivity": {
-                    "change_set": ChangeSetMetric(),
-                    "commits_count": CommitsMetric(),
-                    "contributors": ContributorsMetric(),
-                    "hunks_count": HunksMetric(),
-                    "lines_count": LinesMetric()
-                },
-                "quality": {
-                    "code_churn": EnhancedCodeChurn(),
-                    "bugs": BugsMetric(),
-                    "code_movement": CodeMovementMetric(),
-                    "test_doc_pct": QualityCornerstonesMetric(),
-                    "meaningful_code": MeaningfulCodeMetric()
-                },
-                "timings": {
-                    "diff_delta": DiffDeltaMetric(),
-                    "code_provenance": CodeProvenanceMetric(),
-                    "developer_hours": DeveloperHoursMetric(),
-                    "code_domain": CodeDomainMetric(),
-                    "comprehensive_time_analysis": ComprehensiveTimeAnalysisMetric()
-                }
-            }
-    
-    logger.info("Traversing repository to collect metrics...")
-    
-    try:
-        total_commits = 0
-        repository = Repository(**repo_args)
-        for _ in repository.traverse_commits():
-            total_commits += 1
-        
-        if total_commits == 0:
-            logger.info("No commits found in the repository for the given time period.")
-            return {}
-            
-        repository = Repository(**repo_args)
-        
-        processed_commits = 0
-        with tqdm(total=total_commits, desc="Processing commits for metrics", unit="commit") as pbar:
-            for commit in repository.traverse_commits():
-                if processed_commits % 100 == 0 and check_memory_pressure(memory_limit):
-                    logger.warning(f"Memory pressure during metrics calculation at {processed_commits}/{total_commits}, waiting...")
-                    wait_for_memory_availability(memory_limit)
-                
-                week_label = None
-                if calculate_weekly:
-                    commit_date = commit.author_date
-                    if commit_date.tzinfo:
-                        commit_date_naive = commit_date.replace(tzinfo=None)
-                    else:
-                        commit_date_naive = commit_date
-                    
-                    for start_date, end_date, label in weekly_ranges:
-                        if start_date <= commit_date_naive <= end_date:
-                            week_label = label
-                            break
-                
-                # Process this commit with all metric calculators (updated for nested structure)
-                for category in overall_metrics:
-                    for metric_calculator in overall_metrics[category].values():
-                        metric_calculator.process_commit(commit)
-                
-                if calculate_weekly and week_label:
-                    for category in weekly_metrics[week_label]:
-                        for metric_calculator in weekly_metrics[week_label][category].values():
-                            metric_calculator.process_commit(commit)
-                
-                processed_commits += 1
-                if processed_commits % 100 == 0 or processed_commits == total_commits:
-                    logger.debug(f"Processed {processed_commits}/{total_commits} commits")
-                
-                pbar.update(1)
-                
-                if processed_commits % 1000 == 0:
-                    import gc
-                    gc.collect()
-    except Exception as e:
-        logger.debug(f"Error traversing repository: {str(e)}")
-        traceback.print_exc()
-    
-    # Collect metrics from calculators with new structure
-    result = {}
-    
-    if not calculate_weekly:
-        # Return format compatible with existing code
-        for category, metrics in overall_metrics.items():
-            if category == "timings":
-                # Add timings metrics to a separate section
-                if "developer_timings" not in result:
-                    result["developer_timings"] = {}
-                
-                for metric_name, calculator in metrics.items():
-                    result["developer_timings"][metric_name] = calculator.get_metrics()
-            else:
-                if category not in result:
-                    result[category] = {}
-                    
-                for metric_name, calculator in metrics.items():
-                    if metric_name == "contributors":
-                        result[category]["contributors_count"] = calculator.get_metrics()
-                        result[category]["contributors_experience"] = calculator.get_experience_metrics()
-                    else:
-                        result[category][metric_name] = calculator.get_metrics()
-        return result
-    else:
+    if metrics is None:
+        return calculators
+
+    selected = {}
+    for category, category_calculators in calculators.items():
+        kept = {name: calculator for name, calculator in category_calculators.items() if name in metrics}
+        if kept:
+            selected[category] = kept
+    return selected
+
+METRIC_NAMES = tuple(name for category in create_metric_calculators().values() for name in category)
+
+def validate_metric_names(metrics):
+    """Return the selected metric names, raising ValueError for unknown ones."""
+    if metrics is None:
+        return None
+    unknown = [name for name in metrics if name not in METRIC_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Expected some of {', '.join(METRIC_NAMES)}")
+    return tuple(metrics)
+
+def metric_requirements(metrics=None):
+    """Union of the data requirements of the named calculators (all by default)."""
+    return union_requirements(
+        calculator for category in create_metric_calculators(metrics).values() for calculator in category.values()
+    )
+
+class MetricsCollector:
+    """
+    Feeds commits to the overall and weekly metric calculators.
+
+    Exposes ``process_commit`` so it can be one of the consumers of a
+    RepositoryTraversal, next to commit extraction. With ``metrics`` only
+    the named calculators run, and ``requires`` tells the traversal which
+    commit data they read. ``active_weeks`` holds the labels of the weeks
+    that received commits.
+
+    A ``detached`` collector starts in the middle of a history, e.g. at a
+    chunk of a split repository, and is merged into the collector of the
+    commits before it with ``merge`` (see BaseMetric.detach).
+    """
+
+    def __init__(self, since=None, to=None, calculate_weekly=True, metrics=None, detached=False):
+        if since and since.tzinfo:
+            since = since.replace(tzinfo=None)
+        if to and to.tzinfo:
+            to = to.replace(tzinfo=None)
+
+        if calculate_weekly and (since is None or to is None):
+            logger.info("No date range provided. Falling back to overall metrics.")
+            calculate_weekly = False
+
+        self.since = since
+        self.to = to
+        self.calculate_weekly = calculate_weekly
+        self.metrics = validate_metric_names(metrics)
+        self.detached = detached
+        self.processed_commits = 0
+
+        self.overall_metrics = self._create_calculators()
+        self.weekly_metrics = {}
+        self.weekly_ranges = []
+        self.active_weeks = set()
+
+        if calculate_weekly:
+            self.weekly_ranges = generate_weekly_ranges(since, to)
+            for _, _, week_label in self.weekly_ranges:
+                self.weekly_metrics[week_label] = self._create_calculators()
+
+    def __setstate__(self, state):
+        # Collectors pickled into analysis states before weeks were tracked or chunks merged
+        state.setdefault('active_weeks', set())
+        state.setdefault('detached', False)
+        self.__dict__.update(state)
+
+    def _create_calculators(self):
+        calculators = create_metric_calculators(self.metrics)
+        if self.detached:
+            for category in calculators.values():
+                for calculator in category.values():
+                    calculator.detach()
+        return calculators
+
+    @property
+    def requires(self):
+        """Union of the data requirements of the enabled calculators, and the header weeks are found by."""
+        requires = union_requirements(
+            calculator for category in self.overall_metrics.values() for calculator in category.values()
+        )
+        return requires | {REQUIRES_HEADER} if self.calculate_weekly else requires
+
+    def extend_to(self, to):
+        """
+        Move the end of the weekly range to a later date.
+
+        Used when a saved collector continues with newer commits; the weeks
+        already filled keep their calculators and labels.
+        """
+        if to is not None and to.tzinfo:
+            to = to.replace(tzinfo=None)
+        if not self.calculate_weekly or to is None or to <= self.to:
+            return
+
+        self.to = to
+        self.weekly_ranges = generate_weekly_ranges(self.since, to)
+        for _, _, week_label in self.weekly_ranges:
+            if week_label not in self.weekly_metrics:
+                self.weekly_metrics[week_label] = self._create_calculators()
+
+    def _find_week_label(self, commit):
+        commit_date = commit.author_date
+        if commit_date.tzinfo:
+            commit_date = commit_date.replace(tzinfo=None)
+
+        for start_date, end_date, label in self.weekly_ranges:
+            if start_date <= commit_date <= end_date:
+                return label
+        return None
+
+    def process_commit(self, commit):
+        """Process a commit with every overall calculator and its week's calculators."""
+        commit = CommitSnapshot.from_commit(commit)
+        week_label = self._find_week_label(commit) if self.calculate_weekly else None
+
+        for category in self.overall_metrics:
+            for metric_calculator in self.overall_metrics[category].values():
+                metric_calculator.process_commit(commit)
+
+        if week_label:
+            self.active_weeks.add(week_label)
+            for category in self.weekly_metrics[week_label]:
+                for metric_calculator in self.weekly_metrics[week_label][category].values():
+                    metric_calculator.process_commit(commit)
+
+        self.processed_commits += 1
+        if self.processed_commits % 100 == 0:
+            logger.debug(f"Processed {self.processed_commits} commits for metrics")
+
+        return self
+
+    def merge(self, later):
+        """
+        Absorb a detached collector of the commits following this one's.
+
+        ``later`` covers the same period and metrics. Afterwards this
+        collector holds what a single collector fed both runs of commits in
+        order would, with the decisions depending on earlier commits settled
+        by the calculators' merge_state. Weeks without commits in ``later``
+        are left as they are. Merge before calling get_results.
+        """
+        if not later.detached:
+            raise ValueError("Only a detached collector can be merged into another")
+
+        for category, calculators in later.overall_metrics.items():
+            for metric_name, calculator in calculators.items():
+                self.overall_metrics[category][metric_name].merge_state(calculator)
+
+        for week_label in self.weekly_metrics:
+            if week_label not in later.active_weeks:
+                continue
+            for category, calculators in later.weekly_metrics[week_label].items():
+                for metric_name, calculator in calculators.items():
+                    self.weekly_metrics[week_label][category][metric_name].merge_state(calculator)
+
+        self.active_weeks |= later.active_weeks
+        self.processed_commits += later.processed_commits
+        return self
+
+    def get_results(self):
+        """Collect metrics from all calculators."""
+        result = {}
+
+        if not self.calculate_weekly:
+            # Return format compatible with existing code
+            for category, metrics in self.overall_metrics.items():
+                if category == "timings":
+                    # Add timings metrics to a separate section
+                    if "developer_timings" not in result:
+                        result["developer_timings"] = {}
+
+                    for metric_name, calculator in metrics.items():
+                        result["developer_timings"][metric_name] = calculator.get_metrics()
+                else:
+                    if category not in result:
+                        result[category] = {}
+
+                    for metric_name, calculator in metrics.items():
+                        if metric_name == "contributors":
+                            result[category]["contributors_count"] = calculator.get_metrics()
+                            result[category]["contributors_experience"] = calculator.get_experience_metrics()
+                        else:
+                            result[category][metric_name] = calculator.get_metrics()
+            return result
+
         weekly_results = {}
-        for week_label, categories in weekly_metrics.items():
+        for week_label, categories in self.weekly_metrics.items():
             weekly_results[week_label] = {}
-            
+
             for category, metrics in categories.items():
                 weekly_results[week_label][category] = {}
-                
+
                 for metric_name, calculator in metrics.items():
                     if metric_name == "contributors":
                         weekly_results[week_label][category]["contributors_count"] = calculator.get_metrics()
                         weekly_results[week_label][category]["contributors_experience"] = calculator.get_experience_metrics()
                     else:
-                        # For timings metrics, get the metrics and integrate them properly
-                        metric_data = calculator.get_metrics()
-                        weekly_results[week_label][category][metric_name] = metric_data
-        
+                        weekly_results[week_label][category][metric_name] = calculator.get_metrics()
+
         # Create aggregated developer stats from overall metrics (not weekly)
-        if overall_metrics:
-            # Collect all timings data for aggregation
-            all_timings_data = {}
-            
-            for metric_name, calculator in overall_metrics["timings"].items():
-                metric_data = calculator.get_metrics()
-                all_timings_data[metric_name] = metric_data
-            
-            # Create aggregated developer stats
-            if any(all_timings_data.values()):
-                stats_aggregator = DeveloperStatsAggregator()
-                developer_stats = stats_aggregator.aggregate_metrics({"timings": all_timings_data})
-                weekly_results["developer_stats"] = developer_stats
-        
+        all_timings_data = {}
+        for metric_name, calculator in self.overall_metrics.get("timings", {}).items():
+            all_timings_data[metric_name] = calculator.get_metrics()
+
+        if any(all_timings_data.values()):
+            stats_aggregator = DeveloperStatsAggregator()
+            weekly_results["developer_stats"] = stats_aggregator.aggregate_metrics({"timings": all_timings_data})
+
         return weekly_results
 
+def calculate_metrics(repo_url, repo_path, since=None, to=None, calculate_weekly=True, memory_limit=95, backend='pydriller', metrics=None):
+    """
+    Calculate process metrics using the class-based approach.
+    Now includes timings metrics per developer.
+
+    Kept for callers that only need metrics; the repository is opened once
+    and the date range comes from the same commit listing. ``metrics``
+    selects calculators by name; the traversal then only fetches the commit
+    data they declare, so e.g. header and numstat metrics never load file
+    contents.
+    """
+    from ..traversal import RepositoryTraversal
+
+    logger.info("Traversing repository to collect metrics...")
+
+    try:
+        needs_blobs = not metric_requirements(metrics) <= BLOBLESS_REQUIREMENTS
+        with RepositoryTraversal(repo_url, repo_path, since, to, backend=backend, needs_blobs=needs_blobs) as traversal:
+            if traversal.commit_count == 0:
+                logger.info("No commits found in the repository for the given time period.")
+                return {}
+
+            if calculate_weekly and (since is None or to is None):
+                start_date, end_date = traversal.get_date_range()
+                since = since or start_date
+                to = to or end_date
+                if since and to:
+                    logger.debug(f"Using repository date range: {since.strftime('%Y-%m-%d')} to {to.strftime('%Y-%m-%d')}")
+
+            collector = MetricsCollector(since, to, calculate_weekly=calculate_weekly, metrics=metrics)
+            traversal.stream([collector], desc="Processing commits for metrics", memory_limit=memory_limit)
+            return collector.get_results()
+    except Exception as e:
+        logger.debug(f"Error traversing repository: {str(e)}")
+        traceback.print_exc()
+        return {}
+
 def merge_metrics_results(all_chunk_results):
+    """
+    Merge the weekly metrics of the chunks of a repository.
+
+    Chunks reporting ``active_weeks`` share one set of weeks; a week is
+    merged from the chunks with commits in it, and weeks without any commit
+    are taken once, from the first chunk. Results can only be combined
+    approximately; MetricsCollector.merge combines the chunks' states
+    exactly instead.
+    """
     merged_metrics = {}
     metrics_by_week = {}
+    active_weeks = set()
+    week_order = {}
+    for chunk_result in all_chunk_results:
+        active_weeks.update(chunk_result.get('active_weeks', ()))
+        if isinstance(chunk_result.get('metrics'), dict):
+            for week in chunk_result['metrics']:
+                week_order.setdefault(week, len(week_order))
     
     for chunk_result in all_chunk_results:
         if 'metrics' not in chunk_result or not chunk_result['metrics'] or 'error' in chunk_result.get('metrics', {}):
@@ -243,6 +345,10 @@ def merge_metrics_results(all_chunk_results):
             for week, week_metrics in chunk_result['metrics'].items():
                 if week == 'developer_stats':
                     continue  # Skip this special key for now
+                
+                if 'active_weeks' in chunk_result and week not in chunk_result['active_weeks']:
+                    if week in active_weeks or week in metrics_by_week:
+                        continue
                     
                 if week not in metrics_by_week:
                     metrics_by_week[week] = {}
@@ -259,6 +365,9 @@ def merge_metrics_results(all_chunk_results):
                         
                         metrics_by_week[week][category][metric_type].append(metric_value)
     
+    # Weeks in the order the chunks list them, not the order chunks filled them
+    metrics_by_week = dict(sorted(metrics_by_week.items(), key=lambda item: week_order.get(item[0], len(week_order))))
+    
     # Merge metrics for each week and category
     for week, categories in metrics_by_week.items():
         merged_metrics[week] = {}
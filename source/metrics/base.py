@@ -3,18 +3,81 @@ from abc import ABC, abstractmethod
 
 logger = get_logger(__name__)
 
+# Commit data a metric can read, from cheapest to most expensive to fetch:
+#   header  - hash, author, dates and message
+#   numstat - modified file paths, change types and added/deleted line counts
+#   diff    - patch text and parsed diff of each modified file
+#   blobs   - file contents before and after the commit
+REQUIRES_HEADER = 'header'
+REQUIRES_NUMSTAT = 'numstat'
+REQUIRES_DIFF = 'diff'
+REQUIRES_BLOBS = 'blobs'
+DATA_REQUIREMENTS = (REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, REQUIRES_BLOBS)
+# Commit data git produces without blob contents; numstat counts and diffs are
+# computed from the blobs on both sides of a change
+BLOBLESS_REQUIREMENTS = frozenset({REQUIRES_HEADER})
+
+def union_requirements(consumers):
+    """Commit data needed by a set of consumers; undeclared consumers need everything."""
+    requires = set()
+    for consumer in consumers:
+        requires |= set(getattr(consumer, 'requires', DATA_REQUIREMENTS))
+    return frozenset(requires)
+
+def merge_renamed_files(renamed_files, later_renamed_files):
+    """
+    Rename map of a calculator followed by that of one run over the next commits.
+
+    The later calculator resolved paths without knowing the earlier renames,
+    so each of its targets is resolved through them once more.
+    """
+    merged = dict(renamed_files)
+    for old_path, filepath in later_renamed_files.items():
+        merged[old_path] = renamed_files.get(filepath, filepath)
+    return merged
+
+def merge_by_path(by_path, later_by_path, renamed_files, combine):
+    """
+    Fold the per-file values of a later calculator into ``by_path``, in place.
+
+    Paths are resolved through the earlier ``renamed_files``, so a file
+    renamed before the later commits keeps accumulating under its first
+    path, as in a single run. ``combine(value, later_value)`` joins the
+    values of paths that meet.
+    """
+    for path, value in later_by_path.items():
+        filepath = renamed_files.get(path, path)
+        by_path[filepath] = combine(by_path[filepath], value) if filepath in by_path else value
+    return by_path
+
 class BaseMetric(ABC):
     """
     Base class for all metrics.
     Defines the common interface and functionality for all metric types.
+
+    ``requires`` declares the commit data the metric reads (see
+    DATA_REQUIREMENTS), so a traversal can skip fetching what no enabled
+    metric needs. Every level read is declared, the header included,
+    although traversals always read it. A metric reading anything beyond
+    its declaration gets empty patches or triggers blob reads the run meant
+    to avoid.
     """
+
+    requires = frozenset(DATA_REQUIREMENTS)
+    # Set by detach; a class attribute so calculators pickled before still load
+    detached = False
     
     def __init__(self):
         self.logger = get_logger(self.__class__.__name__)
     
     @abstractmethod
     def process_commit(self, commit):
-        """Process a single commit and update metrics"""
+        """Process a single commit and update metrics.
+
+        ``commit`` is a CommitSnapshot: read everything from it rather than
+        going back to the repository, so the work is shared with the other
+        calculators processing the same commit.
+        """
         pass
     
     @abstractmethod
@@ -27,6 +90,31 @@ class BaseMetric(ABC):
         """Get the calculated metrics"""
         pass
         
+    def detach(self):
+        """
+        Mark the calculator as starting in the middle of a history.
+
+        Decisions that depend on commits before its first one (e.g. whether a
+        deleted line was written by the same author) are taken as if there
+        were none, and what is needed to revise them is kept for merge_state.
+        Detach before processing the first commit.
+        """
+        self.detached = True
+        return self
+
+    @abstractmethod
+    def merge_state(self, later):
+        """
+        Absorb a detached calculator that processed the commits following this one's.
+
+        This calculator must have seen every commit before the first one of
+        ``later``. Afterwards it is in the state a single calculator would
+        have after both runs of commits, so its metrics match a sequential
+        run. Merge before calling get_metrics, which some calculators can
+        only run once.
+        """
+        pass
+
     @staticmethod
     @abstractmethod
     def merge_metrics(metrics_list):
@@ -1,10 +1,12 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT
 from collections import defaultdict
 
 logger = get_logger(__name__)
 
 class ChangeSetMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
+
     def __init__(self):
         super().__init__()
         self.file_changes = {}
@@ -28,6 +30,12 @@ class ChangeSetMetric(BaseMetric):
         
         return self
     
+    def merge_state(self, later):
+        for filename, count in later.file_changes.items():
+            self.file_changes[filename] = self.file_changes.get(filename, 0) + count
+        self.commits_file_count.extend(later.commits_file_count)
+        return self
+
     def get_metrics(self):
         """Get the calculated metrics"""
         if not self.commits_file_count:
@@ -1,10 +1,12 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, merge_by_path, merge_renamed_files
 from pydriller import ModificationType
 
 logger = get_logger(__name__)
 
 class CommitsMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
+
     def __init__(self):
         super().__init__()
         self.commits_by_file = {}
@@ -26,6 +28,11 @@ class CommitsMetric(BaseMetric):
         self.commits_by_file[filepath] += 1
         return self
     
+    def merge_state(self, later):
+        merge_by_path(self.commits_by_file, later.commits_by_file, self.renamed_files, lambda count, later_count: count + later_count)
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
+
     def get_metrics(self):
         """Get the calculated metrics"""
         return self.commits_by_file
@@ -1,10 +1,12 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, merge_by_path, merge_renamed_files
 from pydriller import ModificationType
 
 logger = get_logger(__name__)
 
 class ContributorsMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
+
     def __init__(self):
         super().__init__()
         self.contributors_by_file = {}
@@ -41,6 +43,17 @@ class ContributorsMetric(BaseMetric):
         
         return self
     
+    def merge_state(self, later):
+        def add_lines(lines, later_lines):
+            for author_email, count in later_lines.items():
+                lines[author_email] = lines.get(author_email, 0) + count
+            return lines
+
+        merge_by_path(self.contributors_by_file, later.contributors_by_file, self.renamed_files, lambda authors, later_authors: authors | later_authors)
+        merge_by_path(self.lines_by_author, later.lines_by_author, self.renamed_files, add_lines)
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
+
     def get_metrics(self):
         contributors_count = {}
         minor_contributors = {}
@@ -1,11 +1,14 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, merge_by_path, merge_renamed_files
 from pydriller import ModificationType
 from statistics import median
 
 logger = get_logger(__name__)
 
 class HunksMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
+
     def __init__(self):
         super().__init__()
         self.hunks_by_file = {}
@@ -23,16 +26,8 @@ class HunksMetric(BaseMetric):
             self.renamed_files[modified_file.old_path] = filepath
         
         if modified_file.diff:
-            is_hunk = False
-            hunks = 0
-            
-            for line in modified_file.diff.splitlines():
-                if line.startswith('+') or line.startswith('-'):
-                    if not is_hunk:
-                        is_hunk = True
-                        hunks += 1
-                else:
-                    is_hunk = False
+            # Runs of consecutive changed lines, counted while parsing the diff
+            hunks = get_parsed_diff(modified_file).change_blocks
             
             if filepath not in self.hunks_by_file:
                 self.hunks_by_file[filepath] = []
@@ -40,6 +35,11 @@ class HunksMetric(BaseMetric):
             
         return self
     
+    def merge_state(self, later):
+        merge_by_path(self.hunks_by_file, later.hunks_by_file, self.renamed_files, lambda hunks, later_hunks: hunks + later_hunks)
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
+
     def get_metrics(self):
         result = {}
         for filepath, hunks_list in self.hunks_by_file.items():
@@ -1,12 +1,14 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, merge_by_path, merge_renamed_files
 from pydriller import ModificationType
 import statistics
-import re
 
 logger = get_logger(__name__)
 
 class LinesMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
+
     def __init__(self):
         super().__init__()
         self.lines_added_by_file = {}
@@ -49,20 +51,12 @@ class LinesMetric(BaseMetric):
         if modified_file.change_type in [ModificationType.ADD, ModificationType.DELETE, 
                                          ModificationType.MODIFY, ModificationType.RENAME]:
             try:
-                # Get diff_parsed which gives us modified lines
-                diff = modified_file.diff_parsed
-                
-                # Check added lines for no-ops (blank or whitespace only)
-                for line in diff.get('added', []):
-                    content = line[1]
-                    if self._is_noop_line(content):
-                        noop_added += 1
+                parsed = get_parsed_diff(modified_file)
                 
-                # Check removed lines for no-ops
-                for line in diff.get('deleted', []):
-                    content = line[1]
-                    if self._is_noop_line(content):
-                        noop_removed += 1
+                # No-ops are blank or whitespace-only lines
+                if parsed is not None:
+                    noop_added = sum(1 for line in parsed.added if line.blank)
+                    noop_removed = sum(1 for line in parsed.deleted if line.blank)
                 
             except Exception as e:
                 logger.debug(f"Could not analyze diff for no-ops in {filepath}: {str(e)}")
@@ -75,16 +69,12 @@ class LinesMetric(BaseMetric):
         
         return self
     
-    # Simple approach to check if a line is a no-op > In reality, depending on the language, this could be more complex.
-    def _is_noop_line(self, line_content):
-        if not line_content or line_content.strip() == "":
-            return True
+    def merge_state(self, later):
+        for attribute in ('lines_added_by_file', 'lines_removed_by_file', 'noop_added_by_file', 'noop_removed_by_file'):
+            merge_by_path(getattr(self, attribute), getattr(later, attribute), self.renamed_files, lambda lines, later_lines: lines + later_lines)
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
 
-        if re.match(r'^\s+$', line_content):
-            return True
-            
-        return False
-    
     def get_metrics(self):
         added_total = {}
         added_max = {}
@@ -1,11 +1,13 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, merge_by_path, merge_renamed_files
 from pydriller import ModificationType
 import re
 
 logger = get_logger(__name__)
 
 class BugsMetric(BaseMetric):
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
+
     def __init__(self):
         super().__init__()
         self.bug_fixing_changed_lines = {}
@@ -70,6 +72,13 @@ class BugsMetric(BaseMetric):
         
         return self
     
+    def merge_state(self, later):
+        add = lambda lines, later_lines: lines + later_lines
+        merge_by_path(self.total_changed_lines, later.total_changed_lines, self.renamed_files, add)
+        merge_by_path(self.bug_fixing_changed_lines, later.bug_fixing_changed_lines, self.renamed_files, add)
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
+    
     def get_metrics(self):
         """Calculate the metrics according to GitClear"""
         bug_work_percent = {}
@@ -1,13 +1,20 @@
 from ...logger import get_logger
+from ...diff_parser import get_parsed_diff
 from datetime import datetime, timedelta
 from collections import defaultdict
 import statistics
 from pydriller import ModificationType
-import re
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF
 
 logger = get_logger(__name__)
 
+# Module-level factories keep the calculator state picklable
+def _new_week_churn():
+    return {"files": {}, "commits": []}
+
+def _new_true_churn():
+    return {"contribution": 0, "churn": 0}
+
 class EnhancedCodeChurn(BaseMetric):
     """
     Code churn calculator that tracks both types of churn metrics as shown in PyDriller:
@@ -19,24 +26,38 @@ class EnhancedCodeChurn(BaseMetric):
     Also includes a "true code churn" metric based on the approach by
     Francis Laclé and Jonathan Guerne (https://github.com/flacle/truegitcodechurn)
     which defines true churn as "when an engineer rewrites their own code in a short time period"
+
+    True churn follows each line from the commit that wrote it, possibly
+    before a detached calculator's first commit; deletions of lines it has
+    not seen written are kept and counted on merge if the same author wrote
+    them.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
     
     def __init__(self):
         super().__init__()
         self.commit_data = {}
         self.file_data = defaultdict(list)
-        self.weekly_data = defaultdict(lambda: {"files": {}, "commits": []})
+        self.weekly_data = defaultdict(_new_week_churn)
         self.line_history = {}
         self.true_churn_metrics = {
             "total_contribution": 0,
             "total_churn": 0,
-            "per_author": defaultdict(lambda: {"contribution": 0, "churn": 0}),
-            "per_file": defaultdict(lambda: {"contribution": 0, "churn": 0})
+            "per_author": defaultdict(_new_true_churn),
+            "per_file": defaultdict(_new_true_churn)
         }
         self.code_churn_by_file = {}
         self.lines_added_by_file = {}
         self.lines_removed_by_file = {}
 
+    def detach(self):
+        super().detach()
+        # Line numbers deleted or written per file, and the (file, line, author) of deletions of unseen lines
+        self.touched_lines = defaultdict(set)
+        self.unresolved_deletions = []
+        return self
+
     def process_commit(self, commit):
         """Process a single commit and update metrics"""
         commit_hash = commit.hash
@@ -232,59 +253,34 @@ class EnhancedCodeChurn(BaseMetric):
         if filename not in self.line_history:
             self.line_history[filename] = {}
         
-        # Parse the diff to extract line-level changes
-        diff_sections = re.finditer(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', modified_file.diff)
-        
         contribution = 0
         churn = 0
         
-        for section in diff_sections:
-            old_start = int(section.group(1))
-            old_count = int(section.group(2)) if section.group(2) else 1
-            new_start = int(section.group(3))
-            new_count = int(section.group(4)) if section.group(4) else 1
-            
-            section_start = section.end()
-            next_section = modified_file.diff.find("@@", section_start)
-            if next_section == -1:
-                section_content = modified_file.diff[section_start:]
-            else:
-                section_content = modified_file.diff[section_start:next_section]
-            
-            lines = section_content.split('\n')
-            old_line = old_start
-            new_line = new_start
-            
-            for line in lines:
-                if not line:
-                    continue
-                
-                if line.startswith('-'):
-                    line_content = line[1:]
-                    line_key = old_line
+        # Changed lines of each hunk, in diff order, with their line numbers
+        for hunk in get_parsed_diff(modified_file).hunks:
+            for line in hunk.lines:
+                if not line.added:
+                    line_key = line.old_line
                     
                     if line_key in self.line_history[filename]:
                         if self.line_history[filename][line_key]["author"] == author:
                             churn += 1
                         del self.line_history[filename][line_key]
+                    elif self.detached and line_key not in self.touched_lines[filename]:
+                        self.unresolved_deletions.append((filename, line_key, author))
                     
-                    old_line += 1
+                    if self.detached:
+                        self.touched_lines[filename].add(line_key)
                 
-                elif line.startswith('+'):
-                    line_content = line[1:]
-                    line_key = new_line
-                    
-                    self.line_history[filename][line_key] = {
+                else:
+                    if self.detached:
+                        self.touched_lines[filename].add(line.new_line)
+                    self.line_history[filename][line.new_line] = {
                         "author": author,
                         "timestamp": timestamp,
-                        "content": line_content
+                        "content": line.content
                     }
                     contribution += 1
-                    new_line += 1
-                
-                else:
-                    old_line += 1
-                    new_line += 1
         
         # Update the true churn metrics
         self.true_churn_metrics["total_contribution"] += contribution
@@ -294,6 +290,57 @@ class EnhancedCodeChurn(BaseMetric):
         self.true_churn_metrics["per_file"][filename]["contribution"] += contribution
         self.true_churn_metrics["per_file"][filename]["churn"] += churn
 
+    def merge_state(self, later):
+        for filename, churn in later.code_churn_by_file.items():
+            if filename not in self.code_churn_by_file:
+                self.code_churn_by_file[filename] = 0
+                self.lines_added_by_file[filename] = 0
+                self.lines_removed_by_file[filename] = 0
+            self.code_churn_by_file[filename] += churn
+            self.lines_added_by_file[filename] += later.lines_added_by_file[filename]
+            self.lines_removed_by_file[filename] += later.lines_removed_by_file[filename]
+
+        self.commit_data.update(later.commit_data)
+        for filename, changes in later.file_data.items():
+            self.file_data[filename].extend(changes)
+
+        for week_key, data in later.weekly_data.items():
+            week = self.weekly_data[week_key]
+            for filename, file_data in data["files"].items():
+                if filename not in week["files"]:
+                    week["files"][filename] = file_data
+                    continue
+                week["files"][filename]["added"] += file_data["added"]
+                week["files"][filename]["removed"] += file_data["removed"]
+                week["files"][filename]["changes"].extend(file_data["changes"])
+            week["commits"].extend(data["commits"])
+
+        true_churn = self.true_churn_metrics
+        later_true_churn = later.true_churn_metrics
+        true_churn["total_contribution"] += later_true_churn["total_contribution"]
+        true_churn["total_churn"] += later_true_churn["total_churn"]
+        for key in ("per_author", "per_file"):
+            for name, values in later_true_churn[key].items():
+                true_churn[key][name]["contribution"] += values["contribution"]
+                true_churn[key][name]["churn"] += values["churn"]
+
+        # Lines written before the later commits and deleted by them
+        for filename, line_key, author in later.unresolved_deletions:
+            line = self.line_history.get(filename, {}).get(line_key)
+            if line is not None and line["author"] == author:
+                true_churn["total_churn"] += 1
+                true_churn["per_author"][author]["churn"] += 1
+                true_churn["per_file"][filename]["churn"] += 1
+
+        for filename, history in later.line_history.items():
+            if filename in self.line_history:
+                touched = later.touched_lines[filename]
+                merged = {line_key: line for line_key, line in self.line_history[filename].items() if line_key not in touched}
+                merged.update(history)
+                history = merged
+            self.line_history[filename] = history
+        return self
+
     def _get_week_key(self, timestamp):
         start_of_week = timestamp - timedelta(days=timestamp.weekday())
         start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -1,7 +1,9 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, merge_renamed_files
 from pydriller import ModificationType
 import re
+from array import array
 from collections import defaultdict
 import difflib
 
@@ -12,7 +14,16 @@ class CodeMovementMetric(BaseMetric):
     Tracks moved and copy-pasted code percentages similar to GitClear's metrics.
     Moved code: Code that was moved from one file to another without significant changes
     Copy-pasted code: Code that was duplicated from one location to another
+
+    Lines are matched by the hash of their stripped content (DiffLine.hash)
+    and told apart by the file they were removed from or added to, so a
+    detached calculator keeps the line hashes of each commit touching
+    several paths. Paths that turn out to be one file through renames
+    before its first commit are then matched again on merge.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
+    
     def __init__(self):
         super().__init__()
         self.renamed_files = {}
@@ -21,6 +32,12 @@ class CodeMovementMetric(BaseMetric):
         self.copy_pasted_lines = 0
         self.removed_lines_by_commit = {}
         self.added_lines_by_commit = {}
+    
+    def detach(self):
+        super().detach()
+        # (moved, copy-pasted, [(path, removed hashes, added hashes)]) per commit touching several paths
+        self.path_sensitive_commits = []
+        return self
         
     def process_commit(self, commit):
         commit_id = commit.hash
@@ -43,16 +60,10 @@ class CodeMovementMetric(BaseMetric):
             self.renamed_files[modified_file.old_path] = filepath
             return self
 
-        try:
-            _ = modified_file.source_code
-        except ValueError as e:
-            logger.warning(f"Could not retrieve source code for {filepath} in commit {commit_id}: {e}")
-
-        if modified_file.diff_parsed:
-            removed_lines = [line[1].strip() for line in modified_file.diff_parsed.get('deleted', [])]
-            added_lines = [line[1].strip() for line in modified_file.diff_parsed.get('added', [])]
-            removed_lines = [line for line in removed_lines if len(line) > 5]
-            added_lines = [line for line in added_lines if len(line) > 5]
+        parsed = get_parsed_diff(modified_file)
+        if parsed is not None:
+            removed_lines = array('q', (line.hash for line in parsed.deleted if len(line.stripped) > 5))
+            added_lines = array('q', (line.hash for line in parsed.added if len(line.stripped) > 5))
             
             if commit_id not in self.removed_lines_by_commit:
                 self.removed_lines_by_commit[commit_id] = {}
@@ -67,44 +78,74 @@ class CodeMovementMetric(BaseMetric):
         return self
     
     def _detect_moved_and_copy_pasted(self, commit_id):
+        removed_by_file = self.removed_lines_by_commit.pop(commit_id, {})
+        added_by_file = self.added_lines_by_commit.pop(commit_id, {})
+
+        moved, copy_pasted = self._count_moved_and_copy_pasted(removed_by_file, added_by_file)
+        self.moved_lines += moved
+        self.copy_pasted_lines += copy_pasted
+
+        if self.detached and len(removed_by_file) > 1:
+            self.path_sensitive_commits.append((moved, copy_pasted, [
+                (file_path, removed_by_file[file_path], added_by_file[file_path])
+                for file_path in removed_by_file
+            ]))
+
+    @staticmethod
+    def _count_moved_and_copy_pasted(removed_by_file, added_by_file):
         all_removed = []
         all_added = []
         
-        for file_path, lines in self.removed_lines_by_commit.get(commit_id, {}).items():
+        for file_path, lines in removed_by_file.items():
             all_removed.extend([(file_path, line) for line in lines])
         
-        for file_path, lines in self.added_lines_by_commit.get(commit_id, {}).items():
+        for file_path, lines in added_by_file.items():
             all_added.extend([(file_path, line) for line in lines])
 
-        matched_removed_indices = set()
+        # Each removed line matches the first unmatched line with its hash added to another file
+        added_by_hash = defaultdict(list)
+        for a_idx, (a_file, a_line) in enumerate(all_added):
+            added_by_hash[a_line].append((a_idx, a_file))
+
+        moved = 0
         matched_added_indices = set()
         
-        for r_idx, (r_file, r_line) in enumerate(all_removed):
-            if r_idx in matched_removed_indices:
-                continue
-                
-            for a_idx, (a_file, a_line) in enumerate(all_added):
-                if a_idx in matched_added_indices:
-                    continue
-
-                if r_line == a_line and r_file != a_file:
-                    self.moved_lines += 1
-                    matched_removed_indices.add(r_idx)
+        for r_file, r_line in all_removed:
+            for a_idx, a_file in added_by_hash.get(r_line, ()):
+                if a_idx not in matched_added_indices and a_file != r_file:
+                    moved += 1
                     matched_added_indices.add(a_idx)
                     break
 
-        added_line_counts = defaultdict(int)
-        for _, line in all_added:
-            added_line_counts[line] += 1
-            
-        for line, count in added_line_counts.items():
-            if count > 1 and not any(line == r_line for _, r_line in all_removed):
-                self.copy_pasted_lines += (count - 1)
-
-        if commit_id in self.removed_lines_by_commit:
-            del self.removed_lines_by_commit[commit_id]
-        if commit_id in self.added_lines_by_commit:
-            del self.added_lines_by_commit[commit_id]
+        copy_pasted = 0
+        removed_hashes = {r_line for _, r_line in all_removed}
+        for line, candidates in added_by_hash.items():
+            if len(candidates) > 1 and line not in removed_hashes:
+                copy_pasted += (len(candidates) - 1)
+
+        return moved, copy_pasted
+
+    def merge_state(self, later):
+        self.total_changed_lines += later.total_changed_lines
+        self.moved_lines += later.moved_lines
+        self.copy_pasted_lines += later.copy_pasted_lines
+
+        for moved, copy_pasted, files in later.path_sensitive_commits:
+            filepaths = [self.renamed_files.get(file_path, file_path) for file_path, _, _ in files]
+            if len(set(filepaths)) == len(filepaths):
+                continue
+            # Later files of the same path replace earlier ones, as when the commit was processed
+            removed_by_file = {}
+            added_by_file = {}
+            for filepath, (_, removed_lines, added_lines) in zip(filepaths, files):
+                removed_by_file[filepath] = removed_lines
+                added_by_file[filepath] = added_lines
+            merged_moved, merged_copy_pasted = self._count_moved_and_copy_pasted(removed_by_file, added_by_file)
+            self.moved_lines += merged_moved - moved
+            self.copy_pasted_lines += merged_copy_pasted - copy_pasted
+
+        self.renamed_files = merge_renamed_files(self.renamed_files, later.renamed_files)
+        return self
     
     def get_metrics(self):
         moved_percent = 0
@@ -1,5 +1,5 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_BLOBS
 from .test_doc_pct import QualityCornerstonesMetric as BaseQualityMetric
 import re
 from collections import defaultdict
@@ -11,7 +11,13 @@ class MeaningfulCodeMetric(BaseMetric):
     This metric focuses on tracking meaningful lines of code for programming languages.
     It attempts to follow the rough guidelines found at the following GitClear URL: 
     https://www.gitclear.com/help/meaningful_code_line_change_definition
+
+    Whether a large commit came too soon after its author's last one depends
+    on commits before a detached calculator's first, so such commits of
+    authors it has not seen yet are counted aside and settled on merge.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_BLOBS})
     
     def __init__(self):
         super().__init__()
@@ -35,21 +41,36 @@ class MeaningfulCodeMetric(BaseMetric):
             'repetitive_patterns': 0,
             'total': 0
         }
+    
+    def detach(self):
+        super().detach()
+        # (author, committer date, MeaningfulCodeMetric of the commit alone) per unsettled commit
+        self.unresolved_commits = []
+        return self
         
     def process_commit(self, commit):
         commit_hash = commit.hash
         unrealistic_type = self._is_unrealistic_commit(commit)
 
+        if unrealistic_type == "unresolved":
+            counted = MeaningfulCodeMetric()
+            counted._count_commit(commit)
+            self.unresolved_commits.append((commit.author.name, commit.committer_date, counted))
+            return self
+
         if unrealistic_type:
             logger.debug(f"Marking unrealistic commit {commit_hash} of type: {unrealistic_type}")
             return self
         
+        return self._count_commit(commit)
+    
+    def _count_commit(self, commit):
         self.base_metric.process_commit(commit)
         
         for modified_file in commit.modified_files:
             self.process_meaningful_metrics(modified_file.filename, modified_file, 
                                     commit.author.name, commit.committer_date, 
-                                    commit_hash)
+                                    commit.hash)
         return self
     
     def _is_unrealistic_commit(self, commit):
@@ -77,6 +98,8 @@ class MeaningfulCodeMetric(BaseMetric):
                 self.unrealistic_commits['rapid_large_commits'] += 1
                 self.unrealistic_commits['total'] += 1
                 return "rapid_large_commit"
+        elif self.detached and total_changes > 1000:
+            return "unresolved"
         
         self.commit_times[author] = commit_time
         return None
@@ -357,6 +380,33 @@ class MeaningfulCodeMetric(BaseMetric):
             
         return False
     
+    def merge_state(self, later):
+        self._merge_counts(later)
+
+        # Settled in order against the author's last commit before them
+        for author, commit_time, counted in later.unresolved_commits:
+            last_commit_time = self.commit_times.get(author)
+            if last_commit_time is not None and commit_time - last_commit_time < timedelta(minutes=10):
+                self.unrealistic_commits['rapid_large_commits'] += 1
+                self.unrealistic_commits['total'] += 1
+            else:
+                self.commit_times[author] = commit_time
+                self._merge_counts(counted)
+
+        self.commit_times.update(later.commit_times)
+        return self
+    
+    def _merge_counts(self, other):
+        self.base_metric.merge_state(other.base_metric)
+        self.meaningful_total_lines += other.meaningful_total_lines
+        for key, count in other.unrealistic_commits.items():
+            self.unrealistic_commits[key] += count
+        for key, count in other.auto_generated.items():
+            self.auto_generated[key] += count
+        for filename, stats in other.file_stats.items():
+            if filename not in self.file_stats or stats['meaningful_lines']:
+                self.file_stats[filename] = stats
+    
     def get_metrics(self):
         base_metrics = self.base_metric.get_metrics()
         total_lines = base_metrics["total"]["lines"]
@@ -1,5 +1,5 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_BLOBS
 import re
 from collections import defaultdict
 
@@ -10,6 +10,8 @@ class QualityCornerstonesMetric(BaseMetric):
     Track documentation and test coverage
     similar to GitClear's Quality Cornerstones graph.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_BLOBS})
     
     def __init__(self):
         super().__init__()
@@ -448,6 +450,22 @@ class QualityCornerstonesMetric(BaseMetric):
         
         return doc_line_count
     
+    def merge_state(self, later):
+        # Files are counted once, when first seen; their stats are those of their last change
+        for filename, stats in later.file_stats.items():
+            if filename not in self.file_stats:
+                self.total_files += 1
+                if stats['is_test']:
+                    self.test_files += 1
+                if stats['is_doc']:
+                    self.doc_files += 1
+            self.file_stats[filename] = stats
+
+        self.total_lines += later.total_lines
+        self.test_lines += later.test_lines
+        self.doc_lines += later.doc_lines
+        return self
+    
     def get_metrics(self):
         test_percent = (self.test_lines / self.total_lines * 100) if self.total_lines > 0 else 0
         doc_percent = (self.doc_lines / self.total_lines * 100) if self.total_lines > 0 else 0
@@ -0,0 +1,208 @@
+import os
+import ast
+import json
+import traceback
+from datetime import datetime
+
+from pydriller.domain.commit import ModificationType
+
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+def _parse_date(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _parse_branches(value):
+    # Records store the branch set as its repr, e.g. "{'main'}"; json.dumps
+    # falls back to str() for sets
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            # Including "set()", the repr of no branches
+            return set()
+    return set(value or [])
+
+class ReplayedDeveloper:
+    """Author or committer of a replayed commit."""
+
+    def __init__(self, data):
+        data = data or {}
+        self.name = data.get('name', '')
+        self.email = data.get('email', '')
+
+class ReplayedFile:
+    """
+    Modified file rebuilt from an ``extract_file_info`` record.
+
+    Exposes the attributes the metrics read from a pydriller ModifiedFile.
+    Diff and source fields are only present for records extracted with the
+    standard or full profile; reading them from a minimal record raises
+    AttributeError like any other missing attribute.
+    """
+
+    def __init__(self, data):
+        self.old_path = data.get('old_path')
+        self.new_path = data.get('new_path')
+        self.filename = data.get('filename')
+        self.added_lines = data.get('added_lines', 0)
+        self.deleted_lines = data.get('deleted_lines', 0)
+
+        change_type_name = data.get('change_type_name')
+        if change_type_name is None and data.get('change_type'):
+            change_type_name = data['change_type'].split('.')[-1]
+        self.change_type = ModificationType[change_type_name] if change_type_name else ModificationType.UNKNOWN
+
+        if 'diff' in data:
+            self.diff = data['diff']
+        if 'diff_parsed' in data:
+            diff_parsed = data['diff_parsed'] or {}
+            self.diff_parsed = {
+                'added': [tuple(line) for line in diff_parsed.get('added', [])],
+                'deleted': [tuple(line) for line in diff_parsed.get('deleted', [])]
+            }
+        if 'source_code' in data:
+            self.source_code = data['source_code']
+            self.source_code_before = data.get('source_code_before')
+
+        for field in ('nloc', 'complexity', 'token_count'):
+            if field in data:
+                setattr(self, field, data[field])
+
+class ReplayedCommit:
+    """
+    Commit rebuilt from an ``extract_commit_info`` record.
+
+    Lets every metric calculator consume stored commit records instead of a
+    repository. Files the extractor skipped (too large, soljson bundles) are
+    absent and sources over 1MB were stored as None, so metrics replayed
+    from such commits can differ slightly from a live traversal.
+    """
+
+    def __init__(self, data):
+        self.hash = data.get('hash')
+        self.msg = data.get('msg', '')
+        self.author = ReplayedDeveloper(data.get('author'))
+        self.committer = ReplayedDeveloper(data.get('committer'))
+        self.author_date = _parse_date(data.get('author_date'))
+        self.author_timezone = data.get('author_timezone')
+        self.committer_date = _parse_date(data.get('committer_date')) or self.author_date
+        self.committer_timezone = data.get('committer_timezone')
+        self.branches = _parse_branches(data.get('branches'))
+        self.in_main_branch = data.get('in_main_branch')
+        self.merge = data.get('merge', False)
+        self.parents = data.get('parents', [])
+        self.project_name = data.get('project_name')
+        self.project_path = data.get('project_path')
+        self.insertions = data.get('insertions', 0)
+        self.deletions = data.get('deletions', 0)
+        self.lines = data.get('lines', 0)
+        self.files = data.get('files', 0)
+        self.modified_files = [ReplayedFile(file_data) for file_data in data.get('modified_files', [])]
+
+        for field in ('dmm_unit_size', 'dmm_unit_complexity', 'dmm_unit_interfacing'):
+            if field in data:
+                setattr(self, field, data[field])
+
+def iter_commit_records(path):
+    """
+    Yield the commit records stored at ``path``.
+
+    Accepts the JSONL files written for chunks (one record per line) and
+    analysis files in output/data (records under "commits").
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    for record in data.get('commits', []):
+        yield record
+
+def replay_metrics(records, since=None, to=None, calculate_weekly=True):
+    """
+    Compute process metrics from commit records without touching git.
+
+    Records are extracted commit dicts, e.g. from iter_commit_records. When
+    no range is given the weekly range spans the records' author dates, as
+    it does for a full-history traversal. Records with an extraction error
+    are skipped.
+    """
+    from .aggregator import MetricsCollector
+
+    commits = []
+    for record in records:
+        if 'error' in record or not record.get('author_date'):
+            continue
+        commits.append(ReplayedCommit(record))
+
+    if not commits:
+        return {}
+
+    if calculate_weekly and (since is None or to is None):
+        author_dates = [commit.author_date for commit in commits]
+        since = since or min(author_dates)
+        to = to or max(author_dates)
+
+    collector = MetricsCollector(since, to, calculate_weekly=calculate_weekly)
+    for commit in commits:
+        try:
+            collector.process_commit(commit)
+        except Exception as e:
+            logger.error(f"Error replaying commit {commit.hash}: {str(e)}")
+            logger.debug(traceback.format_exc())
+
+    return collector.get_results()
+
+def recompute_analysis_file(path, calculate_weekly=True):
+    """
+    Recompute the process metrics of an analysis file from its stored commits.
+
+    The file is rewritten in place with the same layout; nothing else in it
+    changes.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    # The stored period only keeps days. A bound on the day of the first or
+    # last commit came from the repository's date range, which replay_metrics
+    # derives exactly from the records; any other bound was a requested date.
+    since = to = None
+    period = data.get('analysis_period') or {}
+    author_dates = [_parse_date(record['author_date']) for record in data.get('commits', [])
+                    if 'error' not in record and record.get('author_date')]
+    if author_dates:
+        first_day = min(author_dates).strftime('%Y-%m-%d')
+        last_day = max(author_dates).strftime('%Y-%m-%d')
+        if period.get('start_date') not in (None, 'None', first_day):
+            since = datetime.strptime(period['start_date'], '%Y-%m-%d')
+        if period.get('end_date') not in (None, 'None', last_day):
+            to = datetime.strptime(period['end_date'], '%Y-%m-%d')
+
+    data['process_metrics'] = replay_metrics(data.get('commits', []), since, to, calculate_weekly=calculate_weekly)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('{\n')
+        keys = list(data.keys())
+        for i, key in enumerate(keys):
+            if key == 'commits':
+                f.write('  "commits": [\n')
+                f.write(',\n'.join('    ' + json.dumps(c_info, default=str) for c_info in data['commits']))
+                f.write('\n  ]')
+            else:
+                f.write(f'  {json.dumps(key)}: ' + json.dumps(data[key], default=str, indent=2))
+            f.write(',\n' if i < len(keys) - 1 else '\n')
+        f.write('}\n')
+    os.replace(tmp_path, path)
+
+    logger.debug(f"Recomputed metrics for {path}")
+    return data['process_metrics']
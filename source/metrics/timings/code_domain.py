@@ -1,25 +1,32 @@
 # source/metrics/velocity/code_domain.py
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT
 from collections import defaultdict
+from functools import partial
 from datetime import timedelta
 import re
 import os
 
 logger = get_logger(__name__)
 
+# Module-level factory keeps the calculator state picklable
+def _new_developer_domains():
+    return {
+        'weekly_domains': defaultdict(partial(defaultdict, int)),
+        'total_by_domain': defaultdict(int)
+    }
+
 class CodeDomainMetric(BaseMetric):
     """
     Classifies code changes by domain (frontend, backend, test, docs, etc.)
     to understand where developers spend their time.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
     
     def __init__(self):
         super().__init__()
-        self.developer_stats = defaultdict(lambda: {
-            'weekly_domains': defaultdict(lambda: defaultdict(int)),
-            'total_by_domain': defaultdict(int)
-        })
+        self.developer_stats = defaultdict(_new_developer_domains)
         
         # Comprehensive domain classification rules based on GitClear's supported languages
         self.domain_rules = {
@@ -300,6 +307,16 @@ class CodeDomainMetric(BaseMetric):
         """Not used - processing done at commit level."""
         return self
     
+    def merge_state(self, later):
+        for developer, stats in later.developer_stats.items():
+            merged_stats = self.developer_stats[developer]
+            for week, domains in stats['weekly_domains'].items():
+                for domain, changes in domains.items():
+                    merged_stats['weekly_domains'][week][domain] += changes
+            for domain, changes in stats['total_by_domain'].items():
+                merged_stats['total_by_domain'][domain] += changes
+        return self
+    
     def _classify_file_domain(self, filepath):
         """Classify a file into a domain based on its path and extension."""
         # Normalize path separators
@@ -1,12 +1,26 @@
 # source/metrics/velocity/code_provenance.py
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, REQUIRES_BLOBS
 from collections import defaultdict
 from datetime import datetime, timedelta
 import re
 
 logger = get_logger(__name__)
 
+# Module-level factories keep the calculator state picklable
+def _new_week_provenance():
+    return {
+        'new_code_lines': 0,
+        'recent_code_lines': 0,
+        'old_code_lines': 0,
+        'legacy_code_lines': 0,
+        'total_lines': 0
+    }
+
+def _new_developer_provenance():
+    return {'weekly_provenance': defaultdict(_new_week_provenance)}
+
 class CodeProvenanceMetric(BaseMetric):
     """
     Tracks code provenance - whether developers are working on new code,
@@ -17,22 +31,20 @@ class CodeProvenanceMetric(BaseMetric):
     - Recent code: Modified in the last 30 days
     - Old code: Modified 30-365 days ago
     - Legacy code: Not modified in over a year
+
+    The age of a line comes from the commit that last wrote it, possibly
+    before a detached calculator's first commit; the first lookup of each
+    line it has not touched yet is kept and categorized again on merge.
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, REQUIRES_BLOBS})
     
     def __init__(self):
         super().__init__()
-        self.developer_stats = defaultdict(lambda: {
-            'weekly_provenance': defaultdict(lambda: {
-                'new_code_lines': 0,
-                'recent_code_lines': 0,
-                'old_code_lines': 0,
-                'legacy_code_lines': 0,
-                'total_lines': 0
-            })
-        })
+        self.developer_stats = defaultdict(_new_developer_provenance)
         
         # Track line-level history for provenance
-        self.line_history = defaultdict(lambda: {})  # file -> {line_num: {last_modified, author}}
+        self.line_history = defaultdict(dict)  # file -> {line_num: {last_modified, author}}
         
         # Time thresholds for code age categories
         self.thresholds = {
@@ -40,6 +52,13 @@ class CodeProvenanceMetric(BaseMetric):
             'old': timedelta(days=365)
         }
     
+    def detach(self):
+        super().detach()
+        # Line numbers deleted or written per file, and (file, line, developer, week, date, category) of first lookups
+        self.touched_lines = defaultdict(set)
+        self.unresolved_lines = []
+        return self
+    
     def process_commit(self, commit):
         """Process commit for code provenance tracking."""
         developer_email = commit.author.email.strip().lower()
@@ -70,22 +89,27 @@ class CodeProvenanceMetric(BaseMetric):
             self._initialize_file_history(filename, modified_file, commit_date)
         
         # Process diff to categorize line changes by age
-        if hasattr(modified_file, 'diff_parsed') and modified_file.diff_parsed:
-            added_lines = modified_file.diff_parsed.get('added', [])
-            deleted_lines = modified_file.diff_parsed.get('deleted', [])
-            
+        parsed = get_parsed_diff(modified_file)
+        if parsed is not None:
             # Process deletions first to update line history
-            for line_num, line_content in deleted_lines:
-                if line_num in self.line_history[filename]:
-                    del self.line_history[filename][line_num]
+            for line in parsed.deleted:
+                if line.old_line in self.line_history[filename]:
+                    del self.line_history[filename][line.old_line]
+                if self.detached:
+                    self.touched_lines[filename].add(line.old_line)
             
             # Process additions and categorize by provenance
-            for line_num, line_content in added_lines:
-                if not self._is_meaningful_line(line_content):
+            for line in parsed.added:
+                # _is_meaningful_line, answered from the flags set while parsing
+                if line.blank or len(line.stripped) <= 1 or line.comment:
                     continue
+                line_num = line.new_line
                 
                 # Determine code age category
                 category = self._categorize_line_age(filename, line_num, commit_date)
+                if self.detached and line_num not in self.touched_lines[filename]:
+                    self.unresolved_lines.append((filename, line_num, developer_email, week_key, commit_date, category))
+                    self.touched_lines[filename].add(line_num)
                 
                 # Update stats
                 self.developer_stats[developer_email]['weekly_provenance'][week_key][f'{category}_lines'] += 1
@@ -116,6 +140,32 @@ class CodeProvenanceMetric(BaseMetric):
         else:
             return 'legacy_code'
     
+    def merge_state(self, later):
+        for developer, stats in later.developer_stats.items():
+            for week, week_stats in stats['weekly_provenance'].items():
+                merged_stats = self.developer_stats[developer]['weekly_provenance'][week]
+                for key, count in week_stats.items():
+                    merged_stats[key] += count
+
+        # Histories of files seen before were not initialized from the file contents
+        for filename, line_num, developer, week_key, commit_date, category in later.unresolved_lines:
+            if filename not in self.line_history:
+                continue
+            merged_category = self._categorize_line_age(filename, line_num, commit_date)
+            if merged_category != category:
+                week_stats = self.developer_stats[developer]['weekly_provenance'][week_key]
+                week_stats[f'{category}_lines'] -= 1
+                week_stats[f'{merged_category}_lines'] += 1
+
+        for filename, history in later.line_history.items():
+            if filename in self.line_history:
+                touched = later.touched_lines[filename]
+                merged = {line_num: line for line_num, line in self.line_history[filename].items() if line_num not in touched}
+                merged.update((line_num, line) for line_num, line in history.items() if line_num in touched)
+                history = merged
+            self.line_history[filename] = history
+        return self
+    
     def _initialize_file_history(self, filename, modified_file, current_date):
         """Initialize line history for a file using git blame equivalent."""
         # For new files or files without history, all lines are "new"
@@ -1,5 +1,5 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT
 from collections import defaultdict
 from datetime import datetime, timedelta
 from statistics import mean, median
@@ -19,6 +19,8 @@ class ComprehensiveTimeAnalysisMetric(BaseMetric):
     - Peak productivity hours/days
     - Sustained activity periods
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
     
     def __init__(self):
         super().__init__()
@@ -61,6 +63,16 @@ class ComprehensiveTimeAnalysisMetric(BaseMetric):
         # This metric performs a comprehensive time analysis based on commit-level data (e.g., timestamps, aggregate changes per commit). 
         return self
     
+    def merge_state(self, later):
+        # Activities are sorted by timestamp when the metrics are taken
+        for author_email, activities in later.author_activities.items():
+            self.author_activities[author_email].extend(activities)
+        for author_email, repos in later.author_repos.items():
+            self.author_repos[author_email] |= repos
+        for repo_path, activities in later.repo_activities.items():
+            self.repo_activities[repo_path].extend(activities)
+        return self
+    
     def get_metrics(self, commits=None, start_date=None, end_date=None):
         """Calculate comprehensive time-based metrics for all developers"""
         # If commits are passed directly, process them
@@ -68,15 +80,9 @@ class ComprehensiveTimeAnalysisMetric(BaseMetric):
             for commit in commits:
                 # Handle both dict and object formats
                 if isinstance(commit, dict):
-                    # Convert dict format to activities
-                    activity = {
-                        'timestamp': commit.get('date'),
-                        'author': commit.get('author', {}).get('email', ''),
-                        'lines_changed': commit.get('stats', {}).get('total', 0),
-                        'files_changed': len(commit.get('files', []))
-                    }
-                    author_email = activity['author'].strip().lower()
-                    self.author_activities[author_email].append(activity)
+                    # Stored commit records carry the same fields as commit objects
+                    from ..replay import ReplayedCommit
+                    self.process_commit(ReplayedCommit(commit))
                 else:
                     # Process as commit object
                     self.process_commit(commit)
@@ -1,11 +1,31 @@
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF
 from collections import defaultdict
 from datetime import datetime, timedelta
 import statistics
 
 logger = get_logger(__name__)
 
+# Module-level factories keep the calculator state picklable
+def _new_week_hours():
+    return {
+        'estimated_hours': 0,
+        'sessions': 0,
+        'commits': 0,
+        'avg_session_length': 0,
+        'productive_days': set(),
+        'hours_per_day': 0
+    }
+
+def _new_developer_hours():
+    return {
+        'weekly_hours': defaultdict(_new_week_hours),
+        'total_hours': 0,
+        'total_sessions': 0,
+        'total_estimated_hours': 0
+    }
+
 class DeveloperHoursMetric(BaseMetric):
     """
     Estimates developer hours based on commit patterns.
@@ -16,23 +36,13 @@ class DeveloperHoursMetric(BaseMetric):
     - Accounts for breaks and context switching
     - Provides conservative estimates to avoid overestimation
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
     
     def __init__(self):
         super().__init__()
         self.developer_sessions = defaultdict(list)  # developer -> list of sessions
-        self.developer_stats = defaultdict(lambda: {
-            'weekly_hours': defaultdict(lambda: {
-                'estimated_hours': 0,
-                'sessions': 0,
-                'commits': 0,
-                'avg_session_length': 0,
-                'productive_days': set(),
-                'hours_per_day': 0
-            }),
-            'total_hours': 0,
-            'total_sessions': 0,
-            'total_estimated_hours': 0
-        })
+        self.developer_stats = defaultdict(_new_developer_hours)
         
         # Session parameters (based on GitClear research)
         # Defines the maximum time allowed between two commits for them to be considered part of the same coding session.
@@ -68,6 +78,12 @@ class DeveloperHoursMetric(BaseMetric):
         # This metric calculates developer hours based on commit-level data (timestamps and aggregate changes). Per-file analysis is not required for this estimation approach.
         return self
     
+    def merge_state(self, later):
+        # Sessions are only formed from the sorted commits when the metrics are taken
+        for developer, commits in later.developer_sessions.items():
+            self.developer_sessions[developer].extend(commits)
+        return self
+    
     def get_metrics(self):
         """Calculate and return developer hours metrics."""
         self.calculate_sessions()
@@ -189,14 +205,10 @@ class DeveloperHoursMetric(BaseMetric):
                     continue
                 
                 # Analyze diff deltas for meaningful content
-                if hasattr(modified_file, 'diff_parsed') and modified_file.diff_parsed:
-                    for line_number, line_content in modified_file.diff_parsed['added']:
-                        if self._is_meaningful_line(line_content):
-                            meaningful_count += 1
-                    
-                    for line_number, line_content in modified_file.diff_parsed['deleted']:
-                        if self._is_meaningful_line(line_content):
-                            meaningful_count += 1
+                parsed = get_parsed_diff(modified_file)
+                if parsed is not None:
+                    meaningful_count += sum(1 for line in parsed.added if self._is_meaningful_line(line))
+                    meaningful_count += sum(1 for line in parsed.deleted if self._is_meaningful_line(line))
                 else:
                     # Fallback: use a portion of raw changes as meaningful
                     file_changes = (modified_file.added_lines or 0) + (modified_file.deleted_lines or 0)
@@ -219,22 +231,17 @@ class DeveloperHoursMetric(BaseMetric):
                 'dist/' in filename or
                 'build/' in filename)
     
-    def _is_meaningful_line(self, line_content):
-        """Determine if a line represents meaningful code change."""
-        line = line_content.strip()
+    def _is_meaningful_line(self, diff_line):
+        """Determine if a DiffLine represents meaningful code change."""
+        line = diff_line.stripped
         
-        # Skip empty lines, comments, and trivial changes
-        if (not line or 
-            line.startswith('//') or 
-            line.startswith('#') or 
-            line.startswith('/*') or 
-            line.startswith('*') or
-            line in ['{', '}', '(', ')', '[', ']', ';'] or
-            len(line) < 3):
+        # Skip empty lines, comments, and trivial changes; HTML comments count as code here
+        if (len(line) < 3 or
+            (diff_line.comment and not line.startswith('<!--'))):
             return False
             
         # Skip import/include statements (often auto-generated)
-        if any(line.startswith(keyword) for keyword in ['import ', 'from ', '#include', 'using ', 'require']):
+        if line.startswith(('import ', 'from ', '#include', 'using ', 'require')):
             return False
             
         return True
@@ -1,12 +1,61 @@
 # source/metrics/velocity/diff_delta.py
 from ...logger import get_logger
-from ..base import BaseMetric
+from ...diff_parser import get_parsed_diff
+from ..base import BaseMetric, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF
 from collections import defaultdict
+from functools import partial
 from datetime import datetime, timedelta
 import re
 
 logger = get_logger(__name__)
 
+# Comment patterns beyond the markers flagged by DiffLine.comment (#, //, /*, *, <!--)
+EXTRA_COMMENT_PATTERNS = [
+    r'--',       # SQL comments
+    r'"""',      # Python docstring start/end
+    r"'''",      # Python docstring start/end
+    # Add more language-specific comment patterns if needed
+]
+
+# Import/include statements (lower value or skip)
+# TODO: Consider assigning these a very low weight instead of outright skipping,
+# as adding/removing imports can sometimes be part of a meaningful change.
+IMPORT_PATTERNS = [
+    r'import\s+',              # Python, Java, JavaScript (ES6 modules), etc.
+    r'from\s+.*\s+import',    # Python
+    r'#include\s*[<"]',       # C, C++
+    r'using\s+.*;',           # C#, C++ (namespaces)
+    r'require\s*\(',         # Node.js (CommonJS)
+    r'include\s+',            # Ruby, PHP
+    r'use\s+',                # PHP (namespaces), Rust
+    r'package\s+',            # Java, Go
+    r'extern crate\s+',       # Rust
+    # Add more language-specific import/dependency patterns if needed
+]
+
+# One pass over the stripped line instead of a match per pattern
+LOW_VALUE_LINE = re.compile('|'.join(f'(?:{pattern})' for pattern in EXTRA_COMMENT_PATTERNS + IMPORT_PATTERNS))
+
+# Module-level factories keep the calculator state picklable
+def _new_week_velocity():
+    return {
+        'diff_delta': 0,
+        'lines_added': 0,
+        'lines_updated': 0,
+        'lines_deleted': 0,
+        'lines_moved': 0,
+        'commits': 0,
+        'files_changed': set(),
+        'active_days': set()
+    }
+
+def _new_developer_velocity():
+    return {
+        'weekly_velocity': defaultdict(_new_week_velocity),
+        'total_diff_delta': 0,
+        'total_commits': 0
+    }
+
 class DiffDeltaMetric(BaseMetric):
     """
     Implements GitClear's Diff Delta metric for measuring meaningful code contributions.
@@ -16,23 +65,12 @@ class DiffDeltaMetric(BaseMetric):
     - Filtering out low-value changes (whitespace, generated code, etc.)
     - Accounting for code complexity and context
     """
+
+    requires = frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF})
     
     def __init__(self):
         super().__init__()
-        self.developer_stats = defaultdict(lambda: {
-            'weekly_velocity': defaultdict(lambda: {
-                'diff_delta': 0,
-                'lines_added': 0,
-                'lines_updated': 0,
-                'lines_deleted': 0,
-                'lines_moved': 0,
-                'commits': 0,
-                'files_changed': set(),
-                'active_days': set()
-            }),
-            'total_diff_delta': 0,
-            'total_commits': 0
-        })
+        self.developer_stats = defaultdict(_new_developer_velocity)
         
         # Weights for different operations (inspired by GitClear)
         self.weights = {
@@ -43,7 +81,13 @@ class DiffDeltaMetric(BaseMetric):
         }
         
         # Track code changes for provenance analysis
-        self.file_history = defaultdict(lambda: defaultdict(dict))
+        self.file_history = defaultdict(partial(defaultdict, dict))
+    
+    def detach(self):
+        super().detach()
+        # (developer, week, diff delta) of every commit, re-added in order on merge
+        self.commit_deltas = []
+        return self
         
     def process_commit(self, commit):
         """Process a commit and calculate Diff Delta for the developer."""
@@ -77,7 +121,30 @@ class DiffDeltaMetric(BaseMetric):
         # Add commit-level diff delta
         self.developer_stats[developer_email]['weekly_velocity'][week_key]['diff_delta'] += commit_diff_delta
         self.developer_stats[developer_email]['total_diff_delta'] += commit_diff_delta
+        if self.detached:
+            self.commit_deltas.append((developer_email, week_key, commit_diff_delta))
+        
+        return self
+    
+    def merge_state(self, later):
+        for developer, stats in later.developer_stats.items():
+            merged_stats = self.developer_stats[developer]
+            merged_stats['total_commits'] += stats['total_commits']
+            for week, week_stats in stats['weekly_velocity'].items():
+                merged_week = merged_stats['weekly_velocity'][week]
+                for key, value in week_stats.items():
+                    if isinstance(value, set):
+                        merged_week[key] |= value
+                    elif key != 'diff_delta':
+                        merged_week[key] += value
         
+        # Float sums are rebuilt in commit order, so they round as in one pass
+        for developer, week_key, commit_diff_delta in later.commit_deltas:
+            self.developer_stats[developer]['weekly_velocity'][week_key]['diff_delta'] += commit_diff_delta
+            self.developer_stats[developer]['total_diff_delta'] += commit_diff_delta
+
+        for filename, changes in later.file_history.items():
+            self.file_history[filename].update(changes)
         return self
     
     def process_modified_file(self, filename, modified_file, developer_email, commit_date, commit_hash):
@@ -91,24 +158,25 @@ class DiffDeltaMetric(BaseMetric):
         diff_delta = 0
         
         # Analyze the diff to categorize changes
-        if hasattr(modified_file, 'diff_parsed') and modified_file.diff_parsed:
-            added_lines = modified_file.diff_parsed.get('added', [])
-            deleted_lines = modified_file.diff_parsed.get('deleted', [])
+        parsed = get_parsed_diff(modified_file)
+        if parsed is not None:
+            added_lines = parsed.added
+            deleted_lines = parsed.deleted
             
             # Detect moved lines (lines that appear in both added and deleted)
             moved_lines = self._detect_moved_lines(added_lines, deleted_lines)
             
             # Calculate meaningful additions
             meaningful_adds = 0
-            for line_num, line_content in added_lines:
-                if line_content not in moved_lines and self._is_meaningful_line(line_content):
+            for line in added_lines:
+                if line.content not in moved_lines and self._is_meaningful_line(line):
                     meaningful_adds += 1
                     diff_delta += self.weights['add']
             
             # Calculate meaningful deletions
             meaningful_deletes = 0
-            for line_num, line_content in deleted_lines:
-                if line_content not in moved_lines and self._is_meaningful_line(line_content):
+            for line in deleted_lines:
+                if line.content not in moved_lines and self._is_meaningful_line(line):
                     meaningful_deletes += 1
                     diff_delta += self.weights['delete']
             
@@ -148,66 +216,24 @@ class DiffDeltaMetric(BaseMetric):
         # Detects moved lines by comparing stripped content. This may not perfectly 
         # distinguish content moves from lines that are deleted and re-added with 
         # only whitespace/indentation changes, but provides a reasonable approximation.
-        moved = set()
-        deleted_content = {line[1].strip() for line in deleted_lines if line[1].strip()}
-        
-        for line_num, line_content in added_lines:
-            stripped = line_content.strip()
-            if stripped and stripped in deleted_content:
-                moved.add(line_content)
-        
-        return moved
+        deleted_hashes = {line.hash for line in deleted_lines if not line.blank}
+        return {line.content for line in added_lines if not line.blank and line.hash in deleted_hashes}
     
     def _is_meaningful_line(self, line):
-        """Determine if a line is meaningful (not whitespace, comments, etc.)."""
-        stripped = line.strip()
-        
+        """Determine if a DiffLine is meaningful (not whitespace, comments, etc.)."""
         # Empty or whitespace-only
-        if not stripped:
+        if line.blank:
             return False
         
         # Single character lines (often just braces)
         # TODO: Consider expanding this to exclude very short lines (e.g., 2-3 chars) 
         # or assign them lower weight if they are often less meaningful (e.g., '});', 'fi').
-        if len(stripped) <= 1:
+        if len(line.stripped) <= 1:
             return False
         
-        # Common comment patterns
-        comment_patterns = [
-            r'^\s*#',        # Python, Ruby, Shell, etc.
-            r'^\s*//',       # C++, Java, JavaScript, C#, etc.
-            r'^\s*/\*',      # C-style block comment start (Java, C++, C#, JavaScript, etc.)
-            r'^\s*\*',       # C-style block comment continuation or Javadoc/Doxygen
-            r'^\s*<!--',     # HTML, XML
-            r'^\s*--',       # SQL comments
-            r'^\s*"""',      # Python docstring start/end
-            r"^\s*'''",      # Python docstring start/end
-            # Add more language-specific comment patterns if needed
-        ]
-        
-        for pattern in comment_patterns:
-            if re.match(pattern, line):
-                return False
-        
-        # Import/include statements (lower value or skip)
-        # TODO: Consider assigning these a very low weight instead of outright skipping,
-        # as adding/removing imports can sometimes be part of a meaningful change.
-        import_patterns = [
-            r'^\s*import\s+',              # Python, Java, JavaScript (ES6 modules), etc.
-            r'^\s*from\s+.*\s+import',    # Python
-            r'^\s*#include\s*[<"]',       # C, C++
-            r'^\s*using\s+.*;',           # C#, C++ (namespaces)
-            r'^\s*require\s*\(',         # Node.js (CommonJS)
-            r'^\s*include\s+',            # Ruby, PHP
-            r'^\s*use\s+',                # PHP (namespaces), Rust
-            r'^\s*package\s+',            # Java, Go
-            r'^\s*extern crate\s+',       # Rust
-            # Add more language-specific import/dependency patterns if needed
-        ]
-        
-        for pattern in import_patterns:
-            if re.match(pattern, line):
-                return False
+        # Common comment patterns and import/include statements
+        if line.comment or LOW_VALUE_LINE.match(line.stripped):
+            return False
         
         return True
     
@@ -3,12 +3,15 @@ import csv
 import json
 import glob
 
-from .utils import LEGACY_PROJECTS_PATH
+from .utils import LEGACY_PROJECTS_PATH, get_repo_name
 from .logger import get_logger
 logger = get_logger(__name__)
 
 
-def find_all_projects(folder_filter=None, csv_path='github_repos.csv'):
+def find_all_projects(folder_filter=None, csv_path='github_repos.csv', local_root=None):
+
+    if local_root:
+        return find_local_projects(local_root, folder_filter)
 
     if not os.path.exists(csv_path):
         logger.error(f"CSV file not found at {csv_path}")
@@ -179,4 +182,63 @@ def find_projects_from_directory(folder_filter=None):
             else:
                 logger.debug(f"No category file found for {project_name}")
     
-    return projects_by_org
\ No newline at end of file
+    return projects_by_org
+
+def is_git_repository(path):
+    """Whether a directory is a git work tree or a bare repository."""
+    if os.path.isdir(os.path.join(path, '.git')):
+        return True
+    return (os.path.isfile(os.path.join(path, 'HEAD'))
+            and os.path.isdir(os.path.join(path, 'objects'))
+            and os.path.isdir(os.path.join(path, 'refs')))
+
+def find_local_projects(root, folder_filter=None):
+    """
+    Find repositories already on disk, laid out as <root>/<username>/.../<repo>.
+
+    Work trees and bare mirrors are both accepted and analysed in place; the
+    first directory under ``root`` is the username. Repositories are not
+    searched for inside other repositories.
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        logger.error(f"Local repository root not found at {root}")
+        return {}
+
+    projects_by_username = {}
+
+    for username in sorted(os.listdir(root)):
+        user_dir = os.path.join(root, username)
+        if not os.path.isdir(user_dir) or username.startswith('.'):
+            continue
+        if is_git_repository(user_dir):
+            logger.warning(f"Skipping repository without a username directory: {user_dir}")
+            continue
+        if folder_filter and not username.lower().startswith(folder_filter.lower()):
+            continue
+
+        repositories = []
+        for dirpath, dirnames, _ in os.walk(user_dir):
+            dirnames.sort()
+            if not is_git_repository(dirpath):
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                continue
+            dirnames[:] = []
+
+            repositories.append({
+                'repo_url': dirpath,
+                'ecosystem': 'local',
+                'repo_category': 'user',
+                'repo_name': get_repo_name(dirpath),
+                'username': username
+            })
+
+        if repositories:
+            projects_by_username[username] = {
+                'ecosystem': 'local',
+                'repositories': repositories
+            }
+
+    total_repos = sum(len(project['repositories']) for project in projects_by_username.values())
+    logger.info(f"Found {len(projects_by_username)} usernames with a total of {total_repos} local repositories under {root}")
+    return projects_by_username
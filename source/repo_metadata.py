@@ -0,0 +1,262 @@
+import os
+import time
+import sqlite3
+import threading
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from .logger import get_logger
+from .utils import CACHE_DIR
+
+logger = get_logger(__name__)
+
+METADATA_DB = os.path.join(CACHE_DIR, "metadata.sqlite")
+
+# Repositories with at least this many commits are processed in chunks
+SPLIT_THRESHOLD = 500
+
+@dataclass
+class RepoMetadata:
+    """Cheap facts about a repository at a given HEAD."""
+    repo_url: str
+    head_sha: Optional[str]
+    commit_count: int = 0
+    first_commit_date: Optional[str] = None  # ISO 8601 author date, with offset
+    last_commit_date: Optional[str] = None
+    pack_size_bytes: int = 0
+    probed_at: float = 0.0
+    root_commits: Optional[str] = None  # Space-separated SHAs of the commits without parents
+
+    @property
+    def roots(self):
+        return frozenset(self.root_commits.split()) if self.root_commits else frozenset()
+
+    @property
+    def should_split(self):
+        return self.commit_count >= SPLIT_THRESHOLD
+
+    def get_date_range(self):
+        """Return the min and max author dates as timezone-aware datetimes."""
+        if self.first_commit_date is None or self.last_commit_date is None:
+            return None, None
+        return datetime.fromisoformat(self.first_commit_date), datetime.fromisoformat(self.last_commit_date)
+
+def _git(path, *args):
+    return subprocess.run(
+        ["git", "-C", str(path)] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    ).stdout.decode('utf-8', 'replace')
+
+def get_head_sha(path):
+    """Return the commit HEAD points to, or None for an empty repository."""
+    try:
+        return _git(path, "rev-parse", "--verify", "--quiet", "HEAD^{commit}").strip() or None
+    except subprocess.CalledProcessError:
+        return None
+
+def is_ancestor(path, ancestor, rev='HEAD'):
+    """Whether commit ``ancestor`` exists and is reachable from ``rev``."""
+    result = subprocess.run(
+        ["git", "-C", str(path), "merge-base", "--is-ancestor", ancestor, rev],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    return result.returncode == 0
+
+def count_commits(path, since=None, until=None, rev='HEAD'):
+    """Count commits with ``git rev-list --count``, optionally within a committer-date window."""
+    args = ["rev-list", "--count"]
+    if since is not None:
+        args.append(f"--since={since}")
+    if until is not None:
+        args.append(f"--until={until}")
+    args.append(rev)
+    try:
+        return int(_git(path, *args).strip() or 0)
+    except subprocess.CalledProcessError:
+        return 0
+
+def get_pack_size(path):
+    """Size on disk of the object database in bytes, from ``git count-objects -v``."""
+    try:
+        values = {}
+        for line in _git(path, "count-objects", "-v").splitlines():
+            key, _, value = line.partition(':')
+            values[key.strip()] = value.strip()
+        return (int(values.get('size-pack', 0)) + int(values.get('size', 0))) * 1024
+    except (subprocess.CalledProcessError, ValueError):
+        return 0
+
+def probe_repository(repo_url, path):
+    """
+    Collect repository metadata without computing any diff.
+
+    The date range is the min and max author date over the history of HEAD,
+    the same range the traversal derives from its commit list; first and last
+    commit in topological order are not enough because author dates are not
+    monotonic. Only one header-only ``git log`` is run for it, which also
+    finds the root commits.
+    """
+    head_sha = get_head_sha(path)
+    metadata = RepoMetadata(repo_url=repo_url, head_sha=head_sha, probed_at=time.time())
+    if head_sha is None:
+        return metadata
+
+    metadata.commit_count = count_commits(path, rev=head_sha)
+    metadata.pack_size_bytes = get_pack_size(path)
+
+    min_ts = max_ts = None
+    roots = []
+    output = _git(path, "log", "--reverse", "--format=%at %aI %H %P", head_sha)
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        timestamp, iso_date, commit_hash = fields[:3]
+        if len(fields) == 3:
+            roots.append(commit_hash)
+        timestamp = int(timestamp)
+        if min_ts is None or timestamp < min_ts:
+            min_ts = timestamp
+            metadata.first_commit_date = iso_date
+        if max_ts is None or timestamp > max_ts:
+            max_ts = timestamp
+            metadata.last_commit_date = iso_date
+    metadata.root_commits = ' '.join(sorted(roots)) or None
+
+    return metadata
+
+class MetadataCache:
+    """
+    SQLite store of repository metadata keyed by repository URL and HEAD SHA.
+
+    An entry stays valid for as long as HEAD does not move, so a repository
+    is only probed again after new commits were fetched. Connections are
+    opened per call so the cache can be shared by threads and processes.
+    """
+
+    def __init__(self, path=METADATA_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS repo_metadata (
+                    repo_url TEXT NOT NULL,
+                    head_sha TEXT NOT NULL,
+                    commit_count INTEGER NOT NULL,
+                    first_commit_date TEXT,
+                    last_commit_date TEXT,
+                    pack_size_bytes INTEGER NOT NULL,
+                    probed_at REAL NOT NULL,
+                    root_commits TEXT,
+                    PRIMARY KEY (repo_url, head_sha)
+                )
+            """)
+            # Caches written before root commits were recorded
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(repo_metadata)")}
+            if 'root_commits' not in columns:
+                conn.execute("ALTER TABLE repo_metadata ADD COLUMN root_commits TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _from_row(row):
+        return RepoMetadata(*row) if row else None
+
+    def get(self, repo_url, head_sha):
+        """Metadata of a repository at a given HEAD, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT repo_url, head_sha, commit_count, first_commit_date, last_commit_date, pack_size_bytes, probed_at, root_commits "
+                "FROM repo_metadata WHERE repo_url = ? AND head_sha = ?",
+                (repo_url, head_sha)
+            ).fetchone()
+        return self._from_row(row)
+
+    def latest(self, repo_url):
+        """Most recently probed metadata of a repository, whatever its HEAD."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT repo_url, head_sha, commit_count, first_commit_date, last_commit_date, pack_size_bytes, probed_at, root_commits "
+                "FROM repo_metadata WHERE repo_url = ? ORDER BY probed_at DESC LIMIT 1",
+                (repo_url,)
+            ).fetchone()
+        return self._from_row(row)
+
+    def put(self, metadata):
+        if metadata.head_sha is None:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO repo_metadata "
+                "(repo_url, head_sha, commit_count, first_commit_date, last_commit_date, pack_size_bytes, probed_at, root_commits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (metadata.repo_url, metadata.head_sha, metadata.commit_count, metadata.first_commit_date,
+                 metadata.last_commit_date, metadata.pack_size_bytes, metadata.probed_at, metadata.root_commits)
+            )
+
+# Global metadata cache instance
+metadata_cache = None
+
+def get_metadata_cache():
+    """Get or create the global metadata cache."""
+    global metadata_cache
+
+    if metadata_cache is None:
+        metadata_cache = MetadataCache()
+
+    return metadata_cache
+
+def _cache_key(repo_url):
+    # Local repositories are keyed by absolute path so relative paths share entries
+    if os.path.isdir(repo_url):
+        return os.path.abspath(repo_url)
+    return repo_url
+
+def get_repo_metadata(repo_url, path):
+    """
+    Return metadata for the repository checked out or mirrored at ``path``.
+
+    Only ``git rev-parse HEAD`` runs when the cache already knows this HEAD.
+    """
+    key = _cache_key(repo_url)
+    head_sha = get_head_sha(path)
+
+    if head_sha is not None:
+        try:
+            cached = get_metadata_cache().get(key, head_sha)
+            if cached is not None:
+                return cached
+        except sqlite3.Error as e:
+            logger.warning(f"Error reading metadata cache: {str(e)}")
+
+    metadata = probe_repository(key, path)
+    logger.debug(f"Probed {repo_url}: {metadata.commit_count} commits, {metadata.pack_size_bytes / 1024 ** 2:.1f} MB packed")
+
+    try:
+        get_metadata_cache().put(metadata)
+    except sqlite3.Error as e:
+        logger.warning(f"Error writing metadata cache: {str(e)}")
+
+    return metadata
+
+def get_cached_metadata(repo_url):
+    """Last known metadata of a repository without opening it, or None."""
+    try:
+        return get_metadata_cache().latest(_cache_key(repo_url))
+    except sqlite3.Error as e:
+        logger.debug(f"Error reading metadata cache: {str(e)}")
+        return None
+
+def estimate_memory_mb(repo_url, base_mb=250):
+    """Scheduler memory estimate for a repository from its cached metadata."""
+    metadata = get_cached_metadata(repo_url)
+    if metadata is None:
+        return base_mb
+    # Diff and blob working sets grow roughly with the packed repository size
+    return int(base_mb + min(4000, metadata.pack_size_bytes / 1024 ** 2 * 2))
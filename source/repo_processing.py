@@ -1,21 +1,45 @@
 import os
+import sys
 import shutil
 import traceback
 import gc
+import threading
+import multiprocessing
 import psutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from pydriller import Repository
+from dataclasses import dataclass
 import time
-from tqdm import tqdm
 import hashlib
 import json
 
 # Fix relative imports
 from .logger import get_logger
-from .utils import ensure_dir, extract_commit_info, get_repo_date_range
+from .utils import ensure_dir, extract_commit_info, get_repo_name, DEFAULT_EXTRACT_PROFILE
+from .traversal import RepositoryTraversal, DEFAULT_BACKEND
+from .repo_metadata import SPLIT_THRESHOLD, count_commits, is_ancestor
+from .analysis_state import (
+    AnalysisState, AnalysisCheckpoint, analysis_settings, load_analysis_state, save_analysis_state, remove_analysis_state,
+    get_work_dir, has_analysis_checkpoint, load_analysis_checkpoint, save_analysis_checkpoint, remove_analysis_checkpoint,
+    get_chunk_checkpoint_path, load_chunk_checkpoint, save_chunk_checkpoint
+)
+from .metrics.aggregator import MetricsCollector, metric_requirements
+from .metrics.base import DATA_REQUIREMENTS, REQUIRES_HEADER, REQUIRES_NUMSTAT, BLOBLESS_REQUIREMENTS
+from .lizard_pool import get_lizard_pool
+from .commit_cache import get_commit_cache
 
 logger = get_logger(__name__)
 
+# An interrupted repository loses at most this many commits or seconds of work
+CHECKPOINT_COMMITS = 5000
+CHECKPOINT_SECONDS = 300
+# Large repositories are split into chunks of about this many commits (see get_chunk_count)
+CHUNK_TARGET_COMMITS = 2000
+CHUNK_MIN_COMMITS = 250
+MAX_CHUNKS_PER_WORKER = 4
+
 def get_memory_usage():
     """Get current memory usage as percentage."""
     return psutil.virtual_memory().percent
@@ -32,64 +56,76 @@ def check_memory_pressure(threshold=85):
 
 def estimate_repo_size(repo_url, temp_dir, since=None, to=None, sample_size=100):
     """
-    Estimate repository size by sampling commits.
-    Returns estimated number of commits and a flag if the repo should be split.
+    Estimate repository size from the cached repository metadata.
+    Returns the number of commits and a flag if the repo should be split.
     """
     try:
         logger.debug(f"Estimating repository size for {repo_url}...")
-        repo_args = {'path_to_repo': repo_url, 'clone_repo_to': temp_dir}
-        
-        if since is not None:
-            repo_args['since'] = since
-        if to is not None:
-            repo_args['to'] = to
-            
-        repository = Repository(**repo_args)
-        
-        # Count commits up to sample_size to estimate
-        commit_count = 0
-        for _ in repository.traverse_commits():
-            commit_count += 1
-            if commit_count >= sample_size:
-                break
-                
-        should_split = commit_count >= 500  # Threshold for splitting
-        
-        logger.debug(f"Repository size estimate: {commit_count}+ commits. Split recommendation: {should_split}")
+        with RepositoryTraversal(repo_url, temp_dir, since, to) as traversal:
+            if traversal.is_full_history:
+                commit_count = traversal.commit_count
+            else:
+                commit_count = count_commits(traversal.local_path, since, to)
+
+        should_split = commit_count >= SPLIT_THRESHOLD
+
+        logger.debug(f"Repository size estimate: {commit_count} commits. Split recommendation: {should_split}")
         return commit_count, should_split
     except Exception as e:
         logger.error(f"Error estimating repository size: {str(e)}")
         return 0, False
 
-def split_date_range(start_date, end_date, chunks):
+@dataclass(frozen=True)
+class CommitChunk:
     """
-    Split a date range into roughly equal chunks.
-    Returns a list of (chunk_start, chunk_end) tuples.
+    A run of consecutive commits of a traversal's listing, ``first`` to ``last`` inclusive.
+
+    Chunks of one listing cover every commit exactly once, whatever their
+    dates.
     """
-    if start_date is None or end_date is None:
-        return [(None, None)]
-    
-    total_days = (end_date - start_date).days + 1
-    days_per_chunk = max(1, total_days // chunks)
-    
-    ranges = []
-    chunk_start = start_date
-    
-    for i in range(chunks):
-        if i == chunks - 1:
-            chunk_end = end_date
-        else:
-            chunk_end = chunk_start + timedelta(days=days_per_chunk - 1)
-            if chunk_end > end_date:
-                chunk_end = end_date
-        
-        ranges.append((chunk_start, chunk_end))
-        chunk_start = chunk_end + timedelta(days=1)
-        
-        if chunk_start > end_date:
-            break
-    
-    return ranges
+    index: int
+    first: str
+    last: str
+    size: int
+
+    @property
+    def chunk_id(self):
+        return f"{self.index:03d}_{self.first[:10]}_{self.last[:10]}"
+
+    @property
+    def commit_range(self):
+        return (self.first, self.last)
+
+def get_chunk_count(commit_count, workers=None):
+    """
+    Number of chunks to split ``commit_count`` commits into.
+
+    Aims at CHUNK_TARGET_COMMITS commits per chunk, but gives every worker
+    a chunk as long as chunks keep at least CHUNK_MIN_COMMITS, and no more
+    than MAX_CHUNKS_PER_WORKER chunks per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    by_size = -(-commit_count // CHUNK_TARGET_COMMITS)
+    by_workers = min(workers, commit_count // CHUNK_MIN_COMMITS)
+    return max(2, min(max(by_size, by_workers), workers * MAX_CHUNKS_PER_WORKER))
+
+def plan_commit_chunks(commits, chunk_count):
+    """
+    Split a commit listing into ``chunk_count`` consecutive chunks of near-equal size.
+
+    Sizes differ by at most one commit; bursts of activity no longer end up
+    in a single chunk as with calendar spans.
+    """
+    chunk_count = max(1, min(chunk_count, len(commits)))
+    size, extra = divmod(len(commits), chunk_count)
+
+    chunks = []
+    start = 0
+    for index in range(chunk_count):
+        end = start + size + (1 if index < extra else 0)
+        chunks.append(CommitChunk(index, commits[start].hash, commits[end - 1].hash, end - start))
+        start = end
+    return chunks
 
 def merge_commit_results(all_chunk_results):
     """
@@ -103,100 +139,327 @@ def merge_commit_results(all_chunk_results):
     
     return merged_commits
 
-def process_repo_chunk(repo_url, chunk_start, chunk_end, temp_dir_prefix, output_dir=None, batch_size=1000, memory_limit=85):
+def extraction_requirements(extract_profile):
+    """Commit data read when extracting records with the given profile."""
+    if extract_profile == 'minimal':
+        return frozenset({REQUIRES_HEADER, REQUIRES_NUMSTAT})
+    return frozenset(DATA_REQUIREMENTS)
+
+def needs_blob_contents(extract_profile=DEFAULT_EXTRACT_PROFILE, metrics=None):
+    """
+    Whether an extraction and metrics run makes git read blobs.
+
+    Only runs that read nothing but commit headers can work from a blobless
+    partial clone; numstat and diffs would make git fetch every blob they
+    compare from the origin, one commit at a time.
+    """
+    return not (extraction_requirements(extract_profile) | metric_requirements(metrics)) <= BLOBLESS_REQUIREMENTS
+
+class CommitRecordWriter:
+    """
+    Extracts commit records and streams them to disk in batches.
+
+    Writes either the indented entries of an analysis file's "commits" array
+    or one JSON object per line, and keeps the totals for the processing
+    summary. Used as a RepositoryTraversal consumer. The extraction profile
+    selects which expensive per-file fields are computed. With the commit
+    cache enabled, records extracted before are reused.
+    """
+
+    def __init__(self, path, batch_size=1000, jsonl=False, extract_profile=DEFAULT_EXTRACT_PROFILE):
+        self.path = path
+        self.batch_size = batch_size
+        self.jsonl = jsonl
+        self.extract_profile = extract_profile
+        self.batch = []
+        self.first_record = True
+        self.total_commits = 0
+        self.total_lines_added = 0
+        self.total_lines_removed = 0
+
+    @property
+    def requires(self):
+        """Commit data read by the extraction profile (see metrics.base)."""
+        return extraction_requirements(self.extract_profile)
+
+    def needs_lizard(self, commit):
+        """Whether extracting the commit runs lizard, i.e. it is not served from the cache."""
+        if self.extract_profile != 'full':
+            return False
+        cache = get_commit_cache()
+        return cache is None or not cache.contains(commit.hash, self.extract_profile)
+
+    def process_commit(self, commit):
+        # Looked up on each call; the writer itself is pickled into checkpoints
+        cache = get_commit_cache()
+        commit_info = cache.get(commit, self.extract_profile) if cache is not None else None
+        if commit_info is None:
+            commit_info = extract_commit_info(commit, self.extract_profile)
+            if cache is not None:
+                cache.put(commit_info, self.extract_profile)
+        self.batch.append(commit_info)
+
+        self.total_commits += 1
+        self.total_lines_added += commit.insertions
+        self.total_lines_removed += commit.deletions
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+        return self
+
+    def flush(self):
+        """Append the pending batch to the output file."""
+        if not self.batch:
+            return
+
+        with open(self.path, 'a') as f:
+            for c_info in self.batch:
+                if self.jsonl:
+                    f.write(json.dumps(c_info, default=str) + '\n')
+                else:
+                    if not self.first_record:
+                        f.write(',\n')
+                    f.write('    ' + json.dumps(c_info, default=str))
+                    self.first_record = False
+
+        self.batch = []
+        gc.collect()
+
+class CheckpointTrigger:
+    """
+    Traversal consumer calling ``save(cursor)`` every few thousand commits or minutes.
+
+    Listed after the consumers whose progress is saved, so the cursor only
+    counts commits they have fully handled. ``cursor`` starts at the
+    commits skipped when resuming.
+    """
+
+    requires = frozenset()
+
+    def __init__(self, save, cursor=0, every_commits=CHECKPOINT_COMMITS, every_seconds=CHECKPOINT_SECONDS):
+        self.save = save
+        self.cursor = cursor
+        self.every_commits = every_commits
+        self.every_seconds = every_seconds
+        self._pending = 0
+        self._last_save = time.monotonic()
+
+    def process_commit(self, commit):
+        self.cursor += 1
+        self._pending += 1
+        if self._pending >= self.every_commits or time.monotonic() - self._last_save >= self.every_seconds:
+            self.save(self.cursor)
+            self._pending = 0
+            self._last_save = time.monotonic()
+        return self
+
+def write_analysis_tail(f, process_metrics, total_commits, total_lines_added, total_lines_removed):
+    """Close the commits array of an analysis file and write its metrics and totals."""
+    f.write('\n  ],\n')
+    f.write('  "process_metrics": ' + json.dumps(process_metrics, default=str, indent=2) + ',\n')
+    f.write('  "metrics_type": "weekly",\n')
+    f.write('  "processing": {\n')
+    f.write(f'    "total_commits": {total_commits},\n')
+    f.write(f'    "total_lines_added": {total_lines_added},\n')
+    f.write(f'    "total_lines_removed": {total_lines_removed}\n')
+    f.write('  }\n')
+    f.write('}\n')
+
+def append_to_analysis_file(output_path, commit_file_path, process_metrics, total_commits, total_lines_added, total_lines_removed, end_date=None):
+    """
+    Append the JSONL commit records at commit_file_path to an analysis file.
+
+    The stored records are copied line by line, without loading the file;
+    the metrics, totals and, when given, the end of the analysis period are
+    replaced. The file is swapped in atomically.
+    """
+    tmp_path = output_path + '.tmp'
+    with open(output_path, 'r') as src, open(tmp_path, 'w') as dst:
+        for line in src:
+            if end_date is not None and line.startswith('    "end_date": '):
+                line = f'    "end_date": "{end_date.strftime("%Y-%m-%d")}",\n'
+            dst.write(line)
+            if line.startswith('  "commits": ['):
+                break
+
+        # Records are separated by ",\n"; hold one back to join the new ones to it
+        last_record = None
+        for line in src:
+            if line.startswith('  ]'):
+                break
+            if not line.strip():
+                continue
+            if last_record is not None:
+                dst.write(last_record)
+            last_record = line
+
+        has_records = last_record is not None
+        if has_records:
+            dst.write(last_record.rstrip('\n').rstrip(','))
+
+        with open(commit_file_path, 'r') as new_records:
+            for line in new_records:
+                if not line.strip():
+                    continue
+                if has_records:
+                    dst.write(',\n')
+                dst.write('    ' + line.strip())
+                has_records = True
+
+        write_analysis_tail(dst, process_metrics, total_commits, total_lines_added, total_lines_removed)
+    os.replace(tmp_path, output_path)
+
+def update_repo_analysis(traversal, state, output_path, repo_name, end_date=None, batch_size=1000, memory_limit=85,
+                         extract_profile=DEFAULT_EXTRACT_PROFILE):
     """
-    Process a specific chunk of repository history.
-    Modified for cleaner console output and memory efficiency.
+    Continue an analysis from its saved state with the commits added since.
+
+    Only ``last_sha..HEAD`` is traversed: the saved collector consumes the
+    new commits, their records are appended to the analysis file and its
+    metrics, totals and period are rewritten. Without an ``end_date`` the
+    weekly range grows with the new commits. Returns False when the saved
+    commit is no longer in the history (e.g. after a force push), so the
+    repository has to be analysed from scratch.
+    """
+    head_sha = traversal.head_sha
+    if head_sha is not None and head_sha == state.head_sha:
+        logger.debug(f"No new commits in {repo_name} since its last analysis")
+        return True
+    if head_sha is None or not is_ancestor(traversal.local_path, state.head_sha, head_sha):
+        logger.info(f"History of {repo_name} changed since its last analysis, analysing it again")
+        return False
+
+    traversal.after_commit = state.head_sha
+    collector = state.collector
+    if end_date is None:
+        _, last_date = traversal.get_date_range()
+        collector.extend_to(last_date)
+
+    commit_file_path = output_path + '.new.jsonl'
+    if os.path.exists(commit_file_path):
+        os.remove(commit_file_path)
+
+    try:
+        writer = CommitRecordWriter(commit_file_path, batch_size=batch_size, jsonl=True, extract_profile=extract_profile)
+        traversal.stream(
+            [writer, collector],
+            desc=f"Updating {repo_name} commits",
+            memory_limit=memory_limit,
+            lizard_pool=get_lizard_pool() if extract_profile == 'full' else None
+        )
+        writer.flush()
+
+        state.head_sha = head_sha
+        state.total_commits += writer.total_commits
+        state.total_lines_added += writer.total_lines_added
+        state.total_lines_removed += writer.total_lines_removed
+        state_data = state.dumps()
+
+        if os.path.exists(commit_file_path):
+            append_to_analysis_file(
+                output_path, commit_file_path, collector.get_results(),
+                state.total_commits, state.total_lines_added, state.total_lines_removed,
+                end_date=collector.to if end_date is None else None
+            )
+        save_analysis_state(output_path, state_data)
+    finally:
+        if os.path.exists(commit_file_path):
+            os.remove(commit_file_path)
+
+    logger.debug(f"Added {writer.total_commits} new commits to the analysis of {repo_name}")
+    return True
+
+def process_repo_chunk(repo_url, chunk, temp_dir_prefix, output_dir=None, batch_size=1000, memory_limit=85, traversal=None, backend=DEFAULT_BACKEND, extract_profile=DEFAULT_EXTRACT_PROFILE, metrics=None,
+                       checkpoint=None, save_progress=None, start_date=None, end_date=None, head_sha=None, since=None, to=None,
+                       calculate_weekly=True, use_lizard_pool=True, local_path=None):
     """
-    repo_name = repo_url.split('/')[-1] if '/' in repo_url else 'unnamed_repo'
-    chunk_id = f"{chunk_start.strftime('%Y%m%d') if chunk_start else 'start'}_to_{chunk_end.strftime('%Y%m%d') if chunk_end else 'end'}"
+    Process one CommitChunk of repository history.
+
+    When an open RepositoryTraversal is passed the chunk is read from it;
+    otherwise the chunk opens the repository itself, in place from
+    ``local_path`` when given (e.g. the mirror the chunks were planned on)
+    or from its own clone under temp_dir_prefix, listing the commits of
+    ``since`` to ``to`` up to ``head_sha`` as the planning traversal did. Metrics are collected for the period of
+    ``start_date`` to ``end_date``, so the weeks of all chunks line up, by a
+    detached MetricsCollector returned as ``collector``; merging the
+    collectors of all chunks in order gives the metrics of the whole
+    history. Without ``use_lizard_pool`` full extraction runs lizard in
+    process, e.g. in a worker of the chunk pool.
+    With ``save_progress`` the chunk calls ``save_progress(writer, collector,
+    cursor)`` periodically and once done; an AnalysisCheckpoint taken that
+    way continues the chunk where it stopped.
+    """
+    repo_name = get_repo_name(repo_url)
+    chunk_id = chunk.chunk_id
     
     repo_hash = hashlib.md5(repo_name.encode()).hexdigest()[:8]
     temp_dir = os.path.join(temp_dir_prefix, f"{repo_hash}_{chunk_id}")
-    ensure_dir(temp_dir)
+    owns_traversal = traversal is None
     
     try:
         chunk_result = {
             'chunk_id': chunk_id,
             'summary': {
-                'start_date': chunk_start.strftime('%Y-%m-%d') if chunk_start else None,
-                'end_date': chunk_end.strftime('%Y-%m-%d') if chunk_end else None,
+                'first_commit': chunk.first,
+                'last_commit': chunk.last,
                 'commit_count': 0,
                 'lines_added': 0,
                 'lines_removed': 0
             }
         }
         
-        output_commit_file = os.path.join(temp_dir, f"commits_{chunk_id}.jsonl")
+        # Keep the commit file outside the chunk clone so it survives cleanup
+        ensure_dir(temp_dir_prefix)
+        output_commit_file = os.path.join(temp_dir_prefix, f"{repo_hash}_commits_{chunk_id}.jsonl")
         chunk_result['commit_file_path'] = output_commit_file
         
-        repo_args = {
-            'path_to_repo': repo_url,
-            'clone_repo_to': temp_dir
-        }
+        if owns_traversal:
+            ensure_dir(temp_dir)
+            traversal = RepositoryTraversal(local_path or repo_url, temp_dir, since, to, backend=backend,
+                                            needs_blobs=needs_blob_contents(extract_profile, metrics)).open()
+            if head_sha is not None:
+                traversal.head_sha = head_sha
         
-        if chunk_start:
-            repo_args['since'] = chunk_start
-        if chunk_end:
-            repo_args['to'] = chunk_end
-            
-        repository = Repository(**repo_args)
+        skip = 0
+        if checkpoint is not None and checkpoint.writer is not None:
+            writer = checkpoint.writer
+            collector = checkpoint.collector
+            skip = checkpoint.cursor
+            chunk_result['commit_file_path'] = writer.path
+            logger.debug(f"Resuming chunk {chunk_id} after {skip} commits")
+        else:
+            # Records left by an interrupted run before its first checkpoint
+            if os.path.exists(output_commit_file):
+                os.remove(output_commit_file)
+            writer = CommitRecordWriter(output_commit_file, batch_size=batch_size, jsonl=True, extract_profile=extract_profile)
+            collector = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly, metrics=metrics, detached=True)
         
-        commit_count = 0
-        for _ in repository.traverse_commits():
-            commit_count += 1
+        consumers = [writer, collector]
+        if save_progress is not None:
+            consumers.append(CheckpointTrigger(lambda cursor: save_progress(writer, collector, cursor), cursor=skip))
         
-        if commit_count == 0:
+        traversal.stream(
+            consumers,
+            commit_range=chunk.commit_range,
+            desc=f"Chunk {chunk.index + 1}",
+            memory_limit=memory_limit,
+            lizard_pool=get_lizard_pool() if extract_profile == 'full' and use_lizard_pool else None,
+            skip=skip
+        )
+        writer.flush()
+        if save_progress is not None:
+            save_progress(writer, collector, chunk.size)
+        
+        # Returned unmerged: get_results would consume the state the merge needs
+        chunk_result['collector'] = collector
+        if writer.total_commits == 0:
             logger.debug(f"No commits found in chunk {chunk_id}")
             return chunk_result
-            
-        repository = Repository(**repo_args)
         
-        logger.debug(f"Processing {commit_count} commits in chunk {chunk_id}")
-        
-        commits_batch = []
-        processed_commits = 0
-        
-        with tqdm(total=commit_count, desc=f"Chunk {chunk_id}", unit="commit", leave=False) as pbar:
-            for commit in repository.traverse_commits():
-                if processed_commits % 100 == 0 and check_memory_pressure(memory_limit):
-                    logger.warning(f"Memory pressure during chunk processing at {processed_commits}/{commit_count}, waiting...")
-                    while get_memory_usage() > memory_limit - 5:
-                        time.sleep(2)
-                        gc.collect()
-                
-                commit_info = extract_commit_info(commit)
-                commits_batch.append(commit_info)
-                
-                chunk_result['summary']['commit_count'] += 1
-                chunk_result['summary']['lines_added'] += commit.insertions
-                chunk_result['summary']['lines_removed'] += commit.deletions
-                
-                processed_commits += 1
-                
-                if len(commits_batch) >= batch_size or processed_commits == commit_count:
-                    with open(output_commit_file, 'a') as f:
-                        for c_info in commits_batch:
-                            f.write(json.dumps(c_info, default=str) + '\n')
-                    
-                    commits_batch = []
-                    gc.collect()
-                
-                pbar.update(1)
-        
-        try:
-            logger.debug(f"Calculating metrics for chunk {chunk_id}")
-            # Fix import statement
-            from .metrics import calculate_metrics
-            chunk_result['metrics'] = calculate_metrics(
-                repo_url, temp_dir, 
-                chunk_start, chunk_end, 
-                calculate_weekly=True,
-                memory_limit=memory_limit
-            )
-        except Exception as e:
-            logger.error(f"Could not calculate metrics for chunk {chunk_id}: {str(e)}")
-            chunk_result['metrics'] = {"error": str(e)}
+        chunk_result['summary']['commit_count'] = writer.total_commits
+        chunk_result['summary']['lines_added'] = writer.total_lines_added
+        chunk_result['summary']['lines_removed'] = writer.total_lines_removed
         
         logger.debug(f"Chunk {chunk_id} processing complete with {chunk_result['summary']['commit_count']} commits")
         return chunk_result
@@ -206,18 +469,158 @@ def process_repo_chunk(repo_url, chunk_start, chunk_end, temp_dir_prefix, output
         logger.debug(traceback.format_exc())
         return {'chunk_id': chunk_id, 'error': str(e)}
     finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        if owns_traversal:
+            if traversal is not None:
+                traversal.close()
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+def process_chunk_wrapper(chunk, repo_url, temp_dir_prefix, output_dir, output_path=None, settings=None, **kwargs):
+    """
+    Run process_repo_chunk for one chunk, e.g. in a worker of the chunk pool.
+
+    With the ``output_path`` of the analysis the chunk belongs to, the chunk
+    keeps its own checkpoint in the work directory of that analysis and
+    continues from the one an interrupted run left.
+    """
+    checkpoint = None
+    save_progress = None
+    if output_path is not None:
+        checkpoint = load_chunk_checkpoint(output_path, chunk.chunk_id, settings)
+        if checkpoint is not None and not checkpoint.restore_files():
+            checkpoint = None
+        if checkpoint is None:
+            checkpoint = AnalysisCheckpoint(kwargs.get('head_sha'), settings, kwargs.get('start_date'), kwargs.get('end_date'))
+            checkpoint.chunk_index = chunk.index
+
+        def save_progress(writer, collector, cursor):
+            # Flushed first, so the pickled writer holds no records the file lacks
+            writer.flush()
+            checkpoint.writer = writer
+            checkpoint.collector = collector
+            checkpoint.cursor = cursor
+            checkpoint.file_sizes = {writer.path: os.path.getsize(writer.path)} if os.path.exists(writer.path) else {}
+            save_chunk_checkpoint(output_path, chunk.chunk_id, checkpoint.dumps())
+
+    return process_repo_chunk(repo_url, chunk, temp_dir_prefix, output_dir, checkpoint=checkpoint, save_progress=save_progress, **kwargs)
+
+def init_chunk_worker(recursion_limit, commit_cache_enabled):
+    """Give a spawned chunk worker the settings of the main process."""
+    sys.setrecursionlimit(recursion_limit)
+    get_commit_cache(enabled=commit_cache_enabled)
+
+# Global pool of chunk workers, shared by the repositories processed concurrently
+chunk_pool = None
+chunk_pool_lock = threading.Lock()
+
+def get_chunk_pool(max_workers=None):
+    """
+    Get or create the global pool of processes running chunks of split repositories.
+
+    Workers are spawned, like those of the lizard pool, and start with the
+    recursion limit and commit cache setting of the main process.
+    """
+    global chunk_pool
+
+    with chunk_pool_lock:
+        if chunk_pool is None:
+            chunk_pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_chunk_worker,
+                initargs=(sys.getrecursionlimit(), get_commit_cache() is not None)
+            )
+        return chunk_pool
+
+def reset_chunk_pool(pool):
+    """Drop a pool whose workers died, so the next chunk starts a new one."""
+    global chunk_pool
+
+    with chunk_pool_lock:
+        if chunk_pool is pool:
+            chunk_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_chunk_results(traversal, repo_url, chunks, temp_dir_prefix, output_dir=None, workers=None, memory_limit=85, **kwargs):
+    """
+    Process chunks of the history listed by ``traversal`` and yield their results in chunk order.
+
+    With more than one worker the chunks run concurrently in the chunk pool,
+    each worker reading the repository at ``traversal.local_path`` in place
+    with the same listing, while ``repo_url`` still names it; otherwise they run one after another on
+    ``traversal``. A result is yielded once its chunk and all before it are
+    done, so the caller can merge and checkpoint them in order. Other
+    arguments go to process_chunk_wrapper.
+
+    A chunk that failed in the pool is run again on ``traversal``, as are
+    all chunks left when the pool breaks. Merging the chunks after a
+    missing one would give wrong metrics, so a chunk that fails there too
+    raises a RuntimeError; the chunks yielded before it stay valid.
+    """
+    def process_in_process(chunk):
+        if check_memory_pressure(memory_limit):
+            logger.warning(f"Memory pressure before chunk {chunk.index + 1}, waiting...")
+            while get_memory_usage() > memory_limit - 5:
+                time.sleep(2)
+                gc.collect()
+        result = process_chunk_wrapper(chunk, repo_url, temp_dir_prefix, output_dir, traversal=traversal,
+                                       memory_limit=memory_limit, **kwargs)
+        if 'error' in result:
+            raise RuntimeError(f"Chunk {chunk.index + 1} failed: {result['error']}")
+        return result
+
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(chunks) < 2:
+        for chunk in chunks:
+            yield process_in_process(chunk)
+        return
+
+    pool = get_chunk_pool(workers)
+    futures = deque(
+        (chunk, pool.submit(process_chunk_wrapper, chunk, repo_url, temp_dir_prefix, output_dir,
+                            local_path=traversal.local_path, since=traversal.since, to=traversal.to,
+                            head_sha=traversal.head_sha, use_lizard_pool=False, memory_limit=memory_limit, **kwargs))
+        for chunk in chunks
+    )
+    broken = False
+    try:
+        while futures:
+            # Popped, so a merged chunk's state is not kept alive by its future
+            chunk, future = futures.popleft()
+            if not broken:
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    logger.warning(f"Chunk pool broke at chunk {chunk.index + 1}, processing the remaining chunks in process")
+                    reset_chunk_pool(pool)
+                    broken = True
+            if broken:
+                result = process_in_process(chunk)
+            elif 'error' in result:
+                logger.warning(f"Chunk {chunk.index + 1} failed in the chunk pool ({result['error']}), retrying it in process")
+                result = process_in_process(chunk)
+            yield result
+    finally:
+        for chunk, future in futures:
+            future.cancel()
 
-def process_chunk_wrapper(chunk_data, repo_url, temp_dir_prefix, output_dir):
-    """Wrapper function to correctly pass parameters to process_repo_chunk."""
-    chunk_start, chunk_end = chunk_data
-    return process_repo_chunk(repo_url, chunk_start, chunk_end, temp_dir_prefix, output_dir)
+def get_analysis_path(output_dir, project_name, repo_name, start_date=None, end_date=None):
+    """Path of the analysis file of a repository for the given period."""
+    if start_date and end_date:
+        timeframe = f"{start_date.year}_{start_date.month}_to_{end_date.year}_{end_date.month}"
+    else:
+        timeframe = "full_history"
+    return os.path.join(output_dir, f"{project_name}_{repo_name}_{timeframe}_analysis.json")
 
-def process_single_repo(repo_index, repo, project_name, ecosystem, category, start_date, end_date, temp_dir, output_dir, use_chronological=False, batch_size=1000, memory_limit=85):
-    """Process a single repository. Module-level function for multiprocessing compatibility."""
+def process_single_repo(repo_index, repo, project_name, ecosystem, category, start_date, end_date, temp_dir, output_dir, use_chronological=False, batch_size=1000, memory_limit=85, backend=DEFAULT_BACKEND, extract_profile=DEFAULT_EXTRACT_PROFILE, metrics=None, remote_head=None):
+    """
+    Process a single repository. Module-level function for multiprocessing compatibility.
+
+    ``remote_head`` is the commit the repository's HEAD was last seen at;
+    an analysis already continued up to it is kept without fetching.
+    """
     repo_url = repo['repo_url']
-    repo_name = repo_url.split('/')[-1] if '/' in repo_url else f"repo_{repo_index}"
+    repo_name = get_repo_name(repo_url, f"repo_{repo_index}")
     
     logger.debug(f"Processing {repo_name} from {project_name}")
     
@@ -235,8 +638,26 @@ def process_single_repo(repo_index, repo, project_name, ecosystem, category, sta
     output_pattern_7z = os.path.join(output_dir, f"{project_name}_{repo_name}_{timeframe}_analysis.7z")
 
     output_path = output_pattern
+    settings = analysis_settings(start_date, end_date, extract_profile, metrics)
+    state = None
+    checkpoint = None
+    interrupted = has_analysis_checkpoint(output_path)
+
+    if interrupted:
+        checkpoint = load_analysis_checkpoint(output_path, settings)
+        if checkpoint is not None:
+            logger.info(f"Resuming interrupted analysis of {repo_name}")
+        else:
+            logger.info(f"Analysis of {repo_name} was interrupted, analysing it again")
+    elif os.path.exists(output_pattern):
+        state = load_analysis_state(output_path, settings)
+        if state is not None and remote_head is not None and state.head_sha == remote_head:
+            logger.info(f"No new commits in {repo_name} since its last analysis")
+            state = None
+        elif state is not None:
+            logger.info(f"Updating existing analysis of {repo_name} with new commits")
 
-    if os.path.exists(output_pattern) or os.path.exists(output_pattern_7z):
+    if state is None and not interrupted and (os.path.exists(output_pattern) or os.path.exists(output_pattern_7z)):
         logger.info(f"Output file already exists for {repo_name}, skipping processing")
         try:
             with open(output_path, 'r') as f:
@@ -266,7 +687,12 @@ def process_single_repo(repo_index, repo, project_name, ecosystem, category, sta
             ecosystem, category, repo_temp_dir, output_dir,
             use_chronological=use_chronological,
             batch_size=batch_size,
-            memory_limit=memory_limit
+            memory_limit=memory_limit,
+            backend=backend,
+            extract_profile=extract_profile,
+            metrics=metrics,
+            state=state,
+            checkpoint=checkpoint
         )
     except Exception as e:
         logger.error(f"Error in process_repo_directly: {str(e)}")
@@ -299,12 +725,31 @@ def process_single_repo(repo_index, repo, project_name, ecosystem, category, sta
         'repo_url': repo_url
     }
 
-def process_repo_directly(project_name, repo_url, start_date, end_date, ecosystem, category, temp_dir, output_dir, use_chronological=False, batch_size=1000, memory_limit=85):
+def process_repo_directly(project_name, repo_url, start_date, end_date, ecosystem, category, temp_dir, output_dir, use_chronological=False, batch_size=1000, memory_limit=85, backend=DEFAULT_BACKEND, extract_profile=DEFAULT_EXTRACT_PROFILE, metrics=None, state=None,
+                          checkpoint=None, head_sha=None, workers=None):
     """
     Direct implementation of repo processing logic to avoid circular imports.
     This is a memory-efficient implementation that streams data to files.
+
+    With the AnalysisState of an earlier run (see load_analysis_state) only
+    the commits added since are processed and the existing analysis file is
+    updated. The state is saved next to the analysis file for the next run.
+
+    While the analysis file is written a checkpoint is kept next to it and
+    refreshed every CHECKPOINT_COMMITS commits or CHECKPOINT_SECONDS seconds.
+    With the AnalysisCheckpoint of an interrupted run (see
+    load_analysis_checkpoint) processing continues from there.
+
+    Large repositories are split into chunks processed by up to ``workers``
+    processes of the chunk pool (see iter_chunk_results); their metric
+    states are merged in chunk order, giving the results of processing the
+    history as one unit. A chunk that fails even when retried stops the
+    analysis with its checkpoint kept, so neither an analysis nor a state
+    is written from incomplete metrics and a resume starts at that chunk.
+    ``head_sha`` analyses the history up to an earlier commit instead of
+    HEAD.
     """
-    repo_name = repo_url.split('/')[-1] if '/' in repo_url else 'unnamed_repo'
+    repo_name = get_repo_name(repo_url)
     
     logger.debug(f"Using direct implementation for {repo_name}")
     
@@ -321,189 +766,203 @@ def process_repo_directly(project_name, repo_url, start_date, end_date, ecosyste
     output_filename = f"{project_name}_{repo_name}_{timeframe}_analysis.json"
     output_path = os.path.join(output_dir, output_filename)
     
+    settings = analysis_settings(start_date, end_date, extract_profile, metrics)
+    state_data = None
+    
+    def save_progress(writer, collector, cursor):
+        # Flushed first, so the pickled writer holds no records the file lacks
+        writer.flush()
+        checkpoint.writer = writer
+        checkpoint.collector = collector
+        checkpoint.cursor = cursor
+        checkpoint.file_sizes = {
+            path: os.path.getsize(path) for path in (output_path, writer.path) if os.path.exists(path)
+        }
+        save_analysis_checkpoint(output_path, checkpoint.dumps())
+        logger.debug(f"Checkpointed {repo_name} after {cursor} commits")
+    
     try:
-        # Get repo date range if doing full history analysis
-        if start_date is None or end_date is None:
-            logger.debug(f"Determining date range for full history analysis of {repo_name}")
-            try:
-                # Fix import statement
-                from .utils import get_repo_date_range
-                extracted_start_date, extracted_end_date = get_repo_date_range(repo_url, repo_temp_dir)
-                if start_date is None:
-                    start_date = extracted_start_date
-                if end_date is None:
-                    end_date = extracted_end_date
-                logger.debug(f"Extracted date range: {start_date} to {end_date}")
-            except Exception as e:
-                logger.error(f"Failed to extract date range for {repo_name}: {str(e)}")
-        
-        estimated_commits, should_split = estimate_repo_size(repo_url, repo_temp_dir, start_date, end_date)
-        
-        with open(output_path, 'w') as f:
-            f.write('{\n')
-            f.write(f'  "project_name": "{project_name}",\n')
-            f.write(f'  "repository_url": "{repo_url}",\n')
-            f.write(f'  "repository_name": "{repo_name}",\n')
-            f.write(f'  "ecosystem": "{ecosystem}",\n')
-            f.write(f'  "repo_category": "{category}",\n')
-            f.write('  "analysis_period": {\n')
-            f.write(f'    "start_date": "{start_date.strftime("%Y-%m-%d") if start_date else None}",\n')
-            f.write(f'    "end_date": "{end_date.strftime("%Y-%m-%d") if end_date else None}",\n')
-            f.write(f'    "full_history": {str(start_date is None and end_date is None).lower()}\n')
-            f.write('  },\n')
-            f.write('  "commits": [\n')
-        
-        if should_split and estimated_commits > 500:
-            logger.debug(f"Repository {repo_name} is large. Processing in chunks...")
-            
-            chunk_count = min(4, max(2, estimated_commits // 200))
+        needs_blobs = needs_blob_contents(extract_profile, metrics)
+        with RepositoryTraversal(repo_url, repo_temp_dir, start_date, end_date, backend=backend, needs_blobs=needs_blobs) as traversal:
+            if state is not None:
+                if update_repo_analysis(traversal, state, output_path, repo_name, end_date=end_date,
+                                        batch_size=batch_size, memory_limit=memory_limit, extract_profile=extract_profile):
+                    return
+                traversal.after_commit = None
             
-            date_chunks = split_date_range(start_date, end_date, chunk_count)
-            logger.debug(f"Processing {repo_name} in {len(date_chunks)} chunks")
+            if checkpoint is not None:
+                current_head = traversal.head_sha
+                if current_head is None or checkpoint.head_sha is None or not is_ancestor(traversal.local_path, checkpoint.head_sha, current_head):
+                    logger.info(f"History of {repo_name} changed since it was interrupted, analysing it again")
+                    checkpoint = None
+                elif not checkpoint.restore_files():
+                    logger.info(f"Files of the interrupted analysis of {repo_name} are missing, analysing it again")
+                    checkpoint = None
             
-            all_chunk_results = []
-            all_chunk_metrics = []
-            total_commits = 0
-            total_lines_added = 0
-            total_lines_removed = 0
-            
-            for i, (chunk_start, chunk_end) in enumerate(date_chunks):
-                if check_memory_pressure(memory_limit):
-                    logger.warning(f"Memory pressure before chunk {i+1}/{len(date_chunks)}, waiting...")
-                    while get_memory_usage() > memory_limit - 5:
-                        time.sleep(2)
-                        gc.collect()
+            if checkpoint is not None:
+                # The commit list must be the one the checkpoint's cursor counts
+                traversal.head_sha = checkpoint.head_sha
+                start_date = checkpoint.start_date
+                end_date = checkpoint.end_date
+                logger.debug(f"Resuming {repo_name} at chunk {checkpoint.chunk_index} after {checkpoint.cursor} commits")
+            else:
+                if head_sha is not None:
+                    traversal.head_sha = head_sha
                 
-                chunk_result = process_repo_chunk(
-                    repo_url, chunk_start, chunk_end, repo_temp_dir, output_dir,
-                    batch_size=batch_size,
-                    memory_limit=memory_limit
-                )
+                # Get repo date range if doing full history analysis
+                if start_date is None or end_date is None:
+                    logger.debug(f"Determining date range for full history analysis of {repo_name}")
+                    extracted_start_date, extracted_end_date = traversal.get_date_range()
+                    if start_date is None:
+                        start_date = extracted_start_date
+                    if end_date is None:
+                        end_date = extracted_end_date
+                    logger.debug(f"Extracted date range: {start_date} to {end_date}")
                 
-                if 'commit_file_path' in chunk_result and os.path.exists(chunk_result['commit_file_path']):
-                    with open(chunk_result['commit_file_path'], 'r') as chunk_file, open(output_path, 'a') as out_file:
-                        if i > 0 or total_commits > 0:
-                            out_file.write(',\n')
-                        
-                        first_line = True
-                        for line in chunk_file:
-                            if not first_line:
-                                out_file.write(',\n')
-                            out_file.write('    ' + line.strip())
-                            first_line = False
-                            total_commits += 1
+                # Served from the metadata cache for full-history runs
+                commit_count = traversal.commit_count
+                should_split = commit_count >= SPLIT_THRESHOLD
                 
-                if 'metrics' in chunk_result and chunk_result['metrics']:
-                    all_chunk_metrics.append(chunk_result['metrics'])
+                # A state or checkpoint left from an earlier run no longer matches the file
+                remove_analysis_state(output_path)
+                remove_analysis_checkpoint(output_path)
+                with open(output_path, 'w') as f:
+                    f.write('{\n')
+                    f.write(f'  "project_name": "{project_name}",\n')
+                    f.write(f'  "repository_url": "{repo_url}",\n')
+                    f.write(f'  "repository_name": "{repo_name}",\n')
+                    f.write(f'  "ecosystem": "{ecosystem}",\n')
+                    f.write(f'  "repo_category": "{category}",\n')
+                    f.write('  "analysis_period": {\n')
+                    f.write(f'    "start_date": "{start_date.strftime("%Y-%m-%d") if start_date else None}",\n')
+                    f.write(f'    "end_date": "{end_date.strftime("%Y-%m-%d") if end_date else None}",\n')
+                    f.write(f'    "full_history": {str(start_date is None and end_date is None).lower()}\n')
+                    f.write('  },\n')
+                    f.write('  "commits": [\n')
                 
-                if 'summary' in chunk_result:
-                    total_commits = max(total_commits, chunk_result['summary'].get('commit_count', 0))
-                    total_lines_added += chunk_result['summary'].get('lines_added', 0)
-                    total_lines_removed += chunk_result['summary'].get('lines_removed', 0)
+                if not should_split and commit_count == 0:
+                    logger.debug(f"No commits found for {repo_name}")
+                    with open(output_path, 'a') as f:
+                        f.write('\n  ],\n')
+                        f.write('  "process_metrics": {},\n')
+                        f.write('  "metrics_type": "weekly",\n')
+                        f.write('  "processing": {\n')
+                        f.write('    "total_commits": 0,\n')
+                        f.write('    "total_lines_added": 0,\n')
+                        f.write('    "total_lines_removed": 0\n')
+                        f.write('  }\n')
+                        f.write('}\n')
+                    return
                 
-                all_chunk_results.append(chunk_result)
+                chunks = None
+                if should_split:
+                    # Exact, non-overlapping runs of the commit listing the chunks stream from
+                    chunks = plan_commit_chunks(traversal.commits, get_chunk_count(commit_count, workers))
                 
-                gc.collect()
-            
-            # Fix import statement
-            from .metrics import merge_metrics_results
-            merged_metrics = merge_metrics_results(all_chunk_results)
-        else:
-            logger.debug(f"Processing {repo_name} as a single unit...")
-            
-            repo_args = {
-                'path_to_repo': repo_url,
-                'clone_repo_to': repo_temp_dir
-            }
+                # From here on an interrupted run leaves a checkpoint, so its
+                # incomplete file is never taken for a finished analysis
+                checkpoint = AnalysisCheckpoint(traversal.head_sha, settings, start_date, end_date, chunks)
+                checkpoint.file_sizes = {output_path: os.path.getsize(output_path)}
+                save_analysis_checkpoint(output_path, checkpoint.dumps())
             
-            if start_date:
-                repo_args['since'] = start_date
-            if end_date:
-                repo_args['to'] = end_date
-            
-            repository = Repository(**repo_args)
-            commit_count = 0
-            for _ in repository.traverse_commits():
-                commit_count += 1
-            
-            if commit_count == 0:
-                logger.debug(f"No commits found for {repo_name}")
-                with open(output_path, 'a') as f:
-                    f.write('\n  ],\n')
-                    f.write('  "process_metrics": {},\n')
-                    f.write('  "metrics_type": "weekly",\n')
-                    f.write('  "processing": {\n')
-                    f.write('    "total_commits": 0,\n')
-                    f.write('    "total_lines_added": 0,\n')
-                    f.write('    "total_lines_removed": 0\n')
-                    f.write('  }\n')
-                    f.write('}\n')
-                return
-            
-            repository = Repository(**repo_args)
-            total_commits = 0
-            total_lines_added = 0
-            total_lines_removed = 0
-            
-            commits_batch = []
-            processed_commits = 0
-            
-            with tqdm(total=commit_count, desc=f"Processing {repo_name} commits", unit="commit", leave=False) as pbar:
-                first_commit = True
+            if checkpoint.split:
+                logger.debug(f"Repository {repo_name} is large. Processing in chunks...")
+                
+                chunks = checkpoint.chunks
+                logger.debug(f"Processing {repo_name} in {len(chunks)} chunks of about {chunks[0].size} commits")
                 
-                for commit in repository.traverse_commits():
-                    try:
-                        if processed_commits % 100 == 0 and check_memory_pressure(memory_limit):
-                            logger.warning(f"Memory pressure during commit processing at {processed_commits}/{commit_count}, waiting...")
-                            while get_memory_usage() > memory_limit - 5:
-                                time.sleep(2)
-                                gc.collect()
-                        
-                        commit_info = extract_commit_info(commit)
-                        commits_batch.append(commit_info)
-                        
-                        total_commits += 1
-                        total_lines_added += commit.insertions
-                        total_lines_removed += commit.deletions
-                        
-                        processed_commits += 1
-                        
-                        if len(commits_batch) >= batch_size or processed_commits == commit_count:
-                            with open(output_path, 'a') as f:
-                                for i, c_info in enumerate(commits_batch):
-                                    if not first_commit or i > 0:
-                                        f.write(',\n')
-                                    f.write('    ' + json.dumps(c_info, default=str))
-                                    first_commit = False
-                            
-                            commits_batch = []
-                            gc.collect()
-                        
-                    except Exception as e:
-                        logger.error(f"Error extracting commit info: {str(e)}")
-                        logger.debug(traceback.format_exc())
+                # Chunk records and checkpoints outlive the temporary directory until merged
+                work_dir = get_work_dir(output_path)
+                ensure_dir(work_dir)
+                
+                collector = checkpoint.collector or MetricsCollector(start_date, end_date, calculate_weekly=True, metrics=metrics)
+                remaining = chunks[checkpoint.chunk_index:]
+                chunk_results = iter_chunk_results(
+                    traversal, repo_url, remaining, work_dir, output_dir,
+                    workers=workers,
+                    memory_limit=memory_limit,
+                    output_path=output_path,
+                    settings=settings,
+                    batch_size=batch_size,
+                    backend=backend,
+                    extract_profile=extract_profile,
+                    metrics=metrics,
+                    start_date=start_date,
+                    end_date=end_date
+                )
+                for chunk, chunk_result in zip(remaining, chunk_results):
+                    chunk_file_path = chunk_result.get('commit_file_path')
+                    if chunk_file_path and os.path.exists(chunk_file_path):
+                        with open(chunk_file_path, 'r') as chunk_file, open(output_path, 'a') as out_file:
+                            for line in chunk_file:
+                                if checkpoint.total_commits > 0:
+                                    out_file.write(',\n')
+                                out_file.write('    ' + line.strip())
+                                checkpoint.total_commits += 1
+                    
+                    collector.merge(chunk_result['collector'])
+                    
+                    if 'summary' in chunk_result:
+                        checkpoint.total_lines_added += chunk_result['summary'].get('lines_added', 0)
+                        checkpoint.total_lines_removed += chunk_result['summary'].get('lines_removed', 0)
                     
-                    pbar.update(1)
+                    checkpoint.chunk_index = chunk.index + 1
+                    checkpoint.collector = collector
+                    checkpoint.file_sizes = {output_path: os.path.getsize(output_path)}
+                    save_analysis_checkpoint(output_path, checkpoint.dumps())
+                    
+                    # Removed only once the checkpoint no longer points into them
+                    if chunk_file_path and os.path.exists(chunk_file_path):
+                        os.remove(chunk_file_path)
+                    chunk_checkpoint_path = get_chunk_checkpoint_path(output_path, chunk.chunk_id)
+                    if os.path.exists(chunk_checkpoint_path):
+                        os.remove(chunk_checkpoint_path)
+                    
+                    del chunk_result
+                    gc.collect()
+                
+                total_commits = checkpoint.total_commits
+                total_lines_added = checkpoint.total_lines_added
+                total_lines_removed = checkpoint.total_lines_removed
+            else:
+                logger.debug(f"Processing {repo_name} as a single unit...")
+                
+                # Extraction, totals and metrics share the same traversal
+                skip = 0
+                if checkpoint.writer is not None:
+                    writer = checkpoint.writer
+                    collector = checkpoint.collector
+                    skip = checkpoint.cursor
+                else:
+                    writer = CommitRecordWriter(output_path, batch_size=batch_size, extract_profile=extract_profile)
+                    collector = MetricsCollector(start_date, end_date, calculate_weekly=True, metrics=metrics)
+                
+                traversal.stream(
+                    [writer, collector, CheckpointTrigger(lambda cursor: save_progress(writer, collector, cursor), cursor=skip)],
+                    desc=f"Processing {repo_name} commits",
+                    memory_limit=memory_limit,
+                    lizard_pool=get_lizard_pool() if extract_profile == 'full' else None,
+                    skip=skip
+                )
+                writer.flush()
+                
+                total_commits = writer.total_commits
+                total_lines_added = writer.total_lines_added
+                total_lines_removed = writer.total_lines_removed
             
-            # Import and calculate metrics properly
-            from .metrics.aggregator import calculate_metrics
-            merged_metrics = calculate_metrics(
-                repo_url, repo_temp_dir, 
-                start_date, end_date, 
-                calculate_weekly=True,
-                memory_limit=memory_limit
-            )
+            # Serialized before get_results, which some calculators can only run once
+            state_data = AnalysisState(
+                traversal.head_sha, collector, total_commits, total_lines_added, total_lines_removed, settings
+            ).dumps()
+            merged_metrics = collector.get_results()
         
         with open(output_path, 'a') as f:
-            f.write('\n  ],\n')
-            f.write('  "process_metrics": ' + json.dumps(merged_metrics, default=str, indent=2) + ',\n')
-            f.write('  "metrics_type": "weekly",\n')
-            f.write('  "processing": {\n')
-            f.write(f'    "total_commits": {total_commits},\n')
-            f.write(f'    "total_lines_added": {total_lines_added},\n')
-            f.write(f'    "total_lines_removed": {total_lines_removed}\n')
-            f.write('  }\n')
-            f.write('}\n')
+            write_analysis_tail(f, merged_metrics, total_commits, total_lines_added, total_lines_removed)
+        
+        if state_data is not None:
+            save_analysis_state(output_path, state_data)
+        # The analysis file is complete
+        remove_analysis_checkpoint(output_path)
         
         logger.debug(f"Direct processing complete for {repo_name}!")
     
@@ -512,4 +971,4 @@ def process_repo_directly(project_name, repo_url, start_date, end_date, ecosyste
         logger.debug(traceback.format_exc())
     finally:
         if os.path.exists(repo_temp_dir):
-            shutil.rmtree(repo_temp_dir, ignore_errors=True)
\ No newline at end of file
+            shutil.rmtree(repo_temp_dir, ignore_errors=True)
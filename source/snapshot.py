@@ -0,0 +1,124 @@
+from functools import cached_property
+from pydriller.domain.commit import Commit as PydrillerCommit, ModifiedFile
+
+from .logger import get_logger
+from .diff_parser import parse_diff
+
+logger = get_logger(__name__)
+
+class _CachedView:
+    """
+    Read-through cache over a pydriller object.
+
+    Attributes are fetched from the wrapped object on first access and stored
+    on the view, so later reads never go back to git. pydriller recomputes
+    most of its properties (diffs, stats, blob contents) on every access.
+    """
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = getattr(self._wrapped, name)
+        setattr(self, name, value)
+        return value
+
+class FileSnapshot(_CachedView):
+    """
+    Materialized view of a modified file: diff, parsed hunks and, on demand,
+    blob contents.
+
+    The diff is parsed once into ``parsed_diff``, which the line-level
+    metrics read and ``diff_parsed`` is derived from. The lizard-based
+    fields are computed from the cached ``methods`` and ``methods_before``,
+    so each version of the file is analysed at most once however many of
+    ``changed_methods`` and the DMM properties are read.
+    """
+
+    changed_methods = cached_property(ModifiedFile.changed_methods.fget)
+    _risk_profile = ModifiedFile.__dict__['_risk_profile']
+    _delta_risk_profile = ModifiedFile._delta_risk_profile
+
+    @cached_property
+    def parsed_diff(self):
+        return parse_diff(self.diff)
+
+    @cached_property
+    def diff_parsed(self):
+        return self.parsed_diff.as_diff_parsed()
+
+class CommitSnapshot(_CachedView):
+    """
+    Materialized view of a commit shared by every consumer of that commit.
+
+    The diff index is computed once, the stats come from a single
+    ``git diff --numstat`` and blob contents are only read when first asked
+    for. All metric calculators and the commit extractor read from the same
+    snapshot instead of the pydriller Commit. With a ``blob_server`` the blob
+    contents are served from its cat-file process and cache; with a
+    ``branch_index`` branch membership is looked up instead of asking git.
+    A ``file_filter`` called with each file's path drops the modified files
+    it returns False for before any consumer sees them; a ``classifier``
+    (FileClassifier) then drops binary, oversized and generated files.
+    """
+
+    def __init__(self, wrapped, blob_server=None, branch_index=None, file_filter=None, classifier=None):
+        super().__init__(wrapped)
+        self._blob_server = blob_server
+        self._branch_index = branch_index
+        self._file_filter = file_filter
+        self._classifier = classifier
+
+    @classmethod
+    def from_commit(cls, commit, blob_server=None, branch_index=None, file_filter=None, classifier=None):
+        """Wrap a commit, returning it unchanged if it is already a snapshot."""
+        if isinstance(commit, cls):
+            return commit
+        return cls(commit, blob_server=blob_server, branch_index=branch_index,
+                   file_filter=file_filter, classifier=classifier)
+
+    @property
+    def commit(self):
+        """The wrapped commit object."""
+        return self._wrapped
+
+    # DMM over the snapshot's files, sharing their lizard results with the extractor
+    dmm_unit_size = cached_property(PydrillerCommit.dmm_unit_size.fget)
+    dmm_unit_complexity = cached_property(PydrillerCommit.dmm_unit_complexity.fget)
+    dmm_unit_interfacing = cached_property(PydrillerCommit.dmm_unit_interfacing.fget)
+    _delta_maintainability = PydrillerCommit._delta_maintainability
+    _delta_risk_profile = PydrillerCommit._delta_risk_profile
+    _good_change_proportion = PydrillerCommit.__dict__['_good_change_proportion']
+
+    @cached_property
+    def branches(self):
+        if self._branch_index is not None:
+            return self._branch_index.branches(self._wrapped.hash)
+        return self._wrapped.branches
+
+    @cached_property
+    def in_main_branch(self):
+        if self._branch_index is not None:
+            return self._branch_index.in_main_branch(self._wrapped.hash)
+        return self._wrapped.in_main_branch
+
+    def _snapshot_files(self, modified_files):
+        if self._file_filter is not None:
+            modified_files = [modified_file for modified_file in modified_files
+                              if self._file_filter(modified_file.new_path or modified_file.old_path)]
+        if self._blob_server is not None:
+            modified_files = [self._blob_server.bind(modified_file) for modified_file in modified_files]
+        if self._classifier is not None:
+            modified_files = [modified_file for modified_file in modified_files
+                              if self._classifier.should_analyze(modified_file)]
+        return [FileSnapshot(modified_file) for modified_file in modified_files]
+
+    @cached_property
+    def modified_files(self):
+        return self._snapshot_files(self._wrapped.modified_files)
+
+    def attach_modified_files(self, modified_files):
+        """Use modified files listed elsewhere instead of asking the wrapped commit."""
+        self.modified_files = self._snapshot_files(modified_files)
@@ -0,0 +1,401 @@
+import os
+import gc
+import subprocess
+import traceback
+from collections import deque
+from tqdm import tqdm
+from git import Repo
+from pydriller import Git
+
+from .logger import get_logger
+from .utils import ensure_dir
+from .snapshot import CommitSnapshot
+from .file_filters import should_analyze_path
+from .file_classifier import FileClassifier
+from .clone_cache import get_mirror_cache
+from .blob_server import BlobServer
+from .repo_metadata import get_repo_metadata, get_head_sha
+from .branch_index import BranchIndex
+from .git_log_backend import GitLogRepository
+
+logger = get_logger(__name__)
+
+REMOTE_PREFIXES = ("git@", "https://", "http://", "git://", "ssh://", "file://")
+
+# Ingestion backends: pydriller/GitPython objects, or a streamed native git log
+BACKENDS = ('pydriller', 'gitlog')
+DEFAULT_BACKEND = 'pydriller'
+
+def is_remote_url(path_or_url):
+    """Check whether a repository location has to be cloned before it can be opened."""
+    return path_or_url.startswith(REMOTE_PREFIXES)
+
+def _as_aware(date):
+    """Return a timezone-aware datetime; naive values are read as local time like git does."""
+    if date is None or date.tzinfo is not None:
+        return date
+    return date.astimezone()
+
+class ReadOnlyGit(Git):
+    """
+    pydriller Git that never writes to the repository.
+
+    pydriller sets ``blame.markUnblamableLines`` in the repository config each
+    time it opens a repository; on a mirror shared by several workers those
+    concurrent config writes fail on the config lock.
+    """
+
+    def _open_repository(self):
+        self._repo = Repo(str(self.path))
+        if self._conf.get("main_branch") is None:
+            self._discover_main_branch(self._repo)
+
+class RepositoryTraversal:
+    """
+    Opens a repository once and streams its history to any number of consumers.
+
+    Remote repositories are read from the shared mirror cache, local paths are
+    opened in place. The commit
+    list comes from one rev-list walk, made only when commits are needed.
+    Over the full history, commit count and date range come from the cached
+    repository metadata; within a date window they are derived from the
+    commit headers of the walk. No diff is computed until a consumer asks
+    for it. Every consumer exposes ``process_commit(commit)``,
+    the same interface as the metric classes.
+
+    With the ``gitlog`` backend commits come from GitLogRepository instead of
+    pydriller and all diffs of a stream are read from one git subprocess.
+    With either backend, blob contents come from one BlobServer per open
+    repository and branch membership from one BranchIndex. Modified files
+    whose path ``file_filter`` rejects (vendored, minified and binary
+    assets by default) never reach the consumers; pass None to keep all.
+    With ``classify_files`` a FileClassifier also skips binary, oversized
+    and generated files, deciding before their blobs are loaded.
+    ``needs_blobs=False`` declares that nothing beyond commit headers is
+    read, which lets the mirror cache use a blobless partial clone.
+    With ``after_commit`` only the commits HEAD added since that commit are
+    listed, to continue an earlier analysis.
+    """
+
+    def __init__(self, repo_url, clone_dir=None, since=None, to=None, use_mirror_cache=True, backend=DEFAULT_BACKEND,
+                 file_filter=should_analyze_path, classify_files=True, needs_blobs=True, after_commit=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+        self.repo_url = repo_url
+        self.clone_dir = clone_dir
+        self.since = since
+        self.to = to
+        self.use_mirror_cache = use_mirror_cache
+        self.backend = backend
+        self.file_filter = file_filter
+        self.classify_files = classify_files
+        self.needs_blobs = needs_blobs
+        self.after_commit = after_commit
+        self.file_classifier = None
+        self._mirror_cache = None
+        self.local_path = None
+        self.git = None
+        self.blob_server = None
+        self.branch_index = None
+        self._commits = None
+        self._metadata = None
+        self._head_sha = None
+        self._head_pinned = False
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def open(self):
+        """Prepare the local repository; commits are listed on first use."""
+        if self.git is not None:
+            return self
+
+        try:
+            self.local_path = self._prepare_local_repo()
+            self.blob_server = BlobServer(self.local_path)
+            # Built on first lookup, so traversals that never stream pay nothing.
+            # Mirrors have all remote branches; a clone only had the default one
+            self.branch_index = BranchIndex(self.local_path, default_branch_only=self._mirror_cache is not None)
+            if self.classify_files:
+                self.file_classifier = FileClassifier(self.blob_server)
+            if self.backend == 'gitlog':
+                self.git = GitLogRepository(self.local_path, blob_server=self.blob_server)
+            else:
+                self.git = ReadOnlyGit(self.local_path)
+        except Exception:
+            self.close()
+            raise
+
+        logger.debug(f"Opened {self.repo_url} at {self.local_path}")
+        return self
+
+    def _list_commits(self):
+        rev_args = {}
+        if self.since is not None:
+            rev_args['since'] = self.since
+        if self.to is not None:
+            rev_args['until'] = self.to
+
+        rev = self.head_sha or 'HEAD'
+        if self.after_commit is not None:
+            rev = f"{self.after_commit}..{rev}"
+
+        if self.backend == 'gitlog':
+            commits = self.git.list_commits(rev, **rev_args)
+        else:
+            commits = list(self.git.get_list_commits(rev, **rev_args))
+
+        logger.debug(f"Listed {len(commits)} commits of {self.repo_url}")
+        return commits
+
+    def close(self):
+        """Release the git resources and blob server held by the traversal."""
+        if isinstance(self.git, ReadOnlyGit):
+            try:
+                self.git.clear()
+            except Exception as e:
+                logger.debug(f"Error clearing git resources for {self.repo_url}: {str(e)}")
+        self.git = None
+        self._commits = None
+        self._metadata = None
+        self._head_sha = None
+        self._head_pinned = False
+
+        if self.file_classifier is not None:
+            if any(self.file_classifier.skipped.values()):
+                logger.debug(f"Skipped files in {self.repo_url}: {self.file_classifier.skipped}")
+            self.file_classifier = None
+
+        if self.blob_server is not None:
+            self.blob_server.close()
+            self.blob_server = None
+        self.branch_index = None
+
+        if self._mirror_cache is not None:
+            self._mirror_cache.release(self.repo_url)
+            self._mirror_cache = None
+
+    def _prepare_local_repo(self):
+        """Return a local path for the repository, from the mirror cache or a private clone."""
+        if not is_remote_url(self.repo_url):
+            return self.repo_url
+
+        if self.use_mirror_cache:
+            mirror_cache = get_mirror_cache()
+            local_path = mirror_cache.acquire(self.repo_url, blobless=not self.needs_blobs)
+            self._mirror_cache = mirror_cache
+            return local_path
+
+        if self.clone_dir is None:
+            raise ValueError(f"A clone directory is required for remote repository {self.repo_url}")
+
+        ensure_dir(self.clone_dir)
+        repo_name = self.repo_url.rstrip('/').split('/')[-1]
+        if repo_name.endswith('.git'):
+            repo_name = repo_name[:-4]
+        local_path = os.path.join(self.clone_dir, repo_name or 'repo')
+
+        if os.path.isdir(os.path.join(local_path, '.git')):
+            logger.debug(f"Reusing existing clone of {self.repo_url} at {local_path}")
+            return local_path
+
+        logger.debug(f"Cloning {self.repo_url} into {local_path}")
+        subprocess.run(
+            ["git", "clone", "--quiet", self.repo_url, local_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        return local_path
+
+    @property
+    def is_full_history(self):
+        return self.since is None and self.to is None and self.after_commit is None and not self._head_pinned
+
+    @property
+    def head_sha(self):
+        """The commit HEAD pointed to when the traversal first looked, fixed for its lifetime."""
+        if self._head_sha is None:
+            self.open()
+            self._head_sha = get_head_sha(self.local_path)
+        return self._head_sha
+
+    @head_sha.setter
+    def head_sha(self, sha):
+        """Pin the traversal to an earlier commit, e.g. the HEAD an interrupted run listed."""
+        self._head_sha = sha
+        self._head_pinned = True
+        self._commits = None
+
+    @property
+    def metadata(self):
+        """Cached RepoMetadata of the repository at its current HEAD."""
+        if self._metadata is None:
+            self.open()
+            self._metadata = get_repo_metadata(self.repo_url, self.local_path)
+        return self._metadata
+
+    @property
+    def commits(self):
+        """Commits in range, oldest first. Only headers are loaded."""
+        if self._commits is None:
+            self.open()
+            self._commits = self._list_commits()
+        return self._commits
+
+    @property
+    def commit_count(self):
+        if self._commits is None and self.is_full_history:
+            return self.metadata.commit_count
+        return len(self.commits)
+
+    def get_date_range(self):
+        """Return the min and max author dates of the commits in range."""
+        if self._commits is None and self.is_full_history:
+            return self.metadata.get_date_range()
+
+        min_date = None
+        max_date = None
+
+        for commit in self.commits:
+            author_date = commit.author_date
+            if min_date is None or author_date < min_date:
+                min_date = author_date
+            if max_date is None or author_date > max_date:
+                max_date = author_date
+
+        return min_date, max_date
+
+    def iter_commits(self, since=None, to=None, commit_range=None):
+        """
+        Yield commits in range, optionally narrowed to a committer-date window.
+
+        ``commit_range`` is a ``(first, last)`` pair of SHAs and narrows the
+        commits to the run from ``first`` to ``last`` inclusive, in listing
+        order; consecutive runs of the listing never overlap.
+        """
+        since = _as_aware(since)
+        to = _as_aware(to)
+
+        commits = self.commits
+        if commit_range is not None:
+            first, last = commit_range
+            hashes = [commit.hash for commit in commits]
+            try:
+                commits = commits[hashes.index(first):hashes.index(last) + 1]
+            except ValueError:
+                raise ValueError(f"Commit range {first[:10]}..{last[:10]} is not in the commits of {self.repo_url}")
+
+        for commit in commits:
+            if since is not None or to is not None:
+                committer_date = commit.committer_date
+                if since is not None and committer_date < since:
+                    continue
+                if to is not None and committer_date > to:
+                    continue
+            yield commit
+
+    def stream(self, consumers, since=None, to=None, desc="Processing commits", memory_limit=85, lizard_pool=None, skip=0,
+               commit_range=None):
+        """
+        Feed each commit once to every consumer, in order.
+
+        Consumers receive a CommitSnapshot, so diffs, stats and blob contents
+        are computed once per commit however many consumers read them.
+        A consumer failing on a commit is logged and does not stop the others.
+        With a LizardPool, the lizard analyses of a window of upcoming commits
+        run in its worker processes while the consumers handle the current
+        one; commits are still delivered in order. Only commits a consumer
+        reports ``needs_lizard`` for are submitted.
+        When no consumer declares a need for diffs (their ``requires``, see
+        metrics.base), modified files are listed from ``--numstat`` without
+        computing any patch.
+        ``skip`` leaves out the first commits of the range, which consumers
+        restored from a checkpoint have already seen. ``commit_range``
+        streams one run of the listing (see iter_commits).
+        Returns the number of commits streamed.
+        """
+        from .memory_scheduler import check_memory_pressure, wait_for_memory_availability
+        from .metrics.base import REQUIRES_DIFF, union_requirements
+
+        commits = list(self.iter_commits(since, to, commit_range))
+        total = len(commits)
+        commits = commits[skip:]
+        processed = 0
+        requires = union_requirements(consumers)
+        patches = REQUIRES_DIFF in requires
+        file_lists = None
+
+        if self.backend == 'gitlog':
+            commits = self.git.iter_changes(commits, patches=patches)
+        elif not patches:
+            # pydriller always computes patches; list the files with git log instead
+            lister = GitLogRepository(self.local_path, blob_server=self.blob_server)
+            file_lists = lister.stream_changes([commit.hash for commit in commits], patches=False)
+
+        def deliver(raw_commit, commit, pending):
+            nonlocal processed
+
+            if pending:
+                lizard_pool.resolve(pending)
+
+            for consumer in consumers:
+                try:
+                    consumer.process_commit(commit)
+                except Exception as e:
+                    logger.error(f"Error in {type(consumer).__name__} for commit {commit.hash}: {str(e)}")
+                    logger.debug(traceback.format_exc())
+
+            if self.backend == 'gitlog':
+                raw_commit.release_changes()
+
+            processed += 1
+            pbar.update(1)
+
+            if processed % 1000 == 0:
+                gc.collect()
+
+        def needs_lizard(consumer, commit):
+            check = getattr(consumer, 'needs_lizard', None)
+            return check is not None and check(commit)
+
+        window = deque()
+        with tqdm(total=total, initial=min(skip, total), desc=desc, unit="commit", leave=False) as pbar:
+            for read, raw_commit in enumerate(commits):
+                commit = CommitSnapshot.from_commit(
+                    raw_commit,
+                    blob_server=self.blob_server,
+                    branch_index=self.branch_index,
+                    file_filter=self.file_filter,
+                    classifier=self.file_classifier
+                )
+                if file_lists is not None:
+                    commit_hash, files, _ = next(file_lists)
+                    if commit_hash != commit.hash:
+                        raise RuntimeError(f"File list of {commit_hash} streamed for commit {commit.hash}")
+                    # Merge commits have no modified files, as in pydriller
+                    commit.attach_modified_files([] if commit.merge else files)
+                if read % 100 == 0 and check_memory_pressure(memory_limit):
+                    logger.warning(f"Memory pressure during traversal at {processed}/{total}, waiting...")
+                    wait_for_memory_availability(memory_limit)
+
+                pending = None
+                if lizard_pool is not None and any(needs_lizard(consumer, commit) for consumer in consumers):
+                    pending = lizard_pool.submit(commit)
+                if pending is None and not window:
+                    deliver(raw_commit, commit, None)
+                    continue
+
+                window.append((raw_commit, commit, pending))
+                if len(window) >= lizard_pool.window:
+                    deliver(*window.popleft())
+
+            while window:
+                deliver(*window.popleft())
+
+        return processed
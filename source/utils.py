@@ -6,7 +6,6 @@ from datetime import datetime, timedelta
 import logging
 from functools import lru_cache
 from tqdm import tqdm
-from pydriller import Repository
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +13,12 @@ OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file
 MASTER_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "data")
 LOGS_DIR = os.path.join(OUTPUT_DIR, "logs")
 MASTER_TEMP_DIR = os.path.join(OUTPUT_DIR, "temp")
+# Bare mirror clones live outside MASTER_TEMP_DIR so they survive cleanup_temp_dirs
+MIRROR_DIR = os.path.join(OUTPUT_DIR, "mirrors")
+# Persistent caches (repository metadata) that also survive cleanup
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
 
-for directory in [OUTPUT_DIR, MASTER_OUTPUT_DIR, LOGS_DIR, MASTER_TEMP_DIR]:
+for directory in [OUTPUT_DIR, MASTER_OUTPUT_DIR, LOGS_DIR, MASTER_TEMP_DIR, MIRROR_DIR, CACHE_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 # Legacy path for backward compatibility
@@ -38,6 +41,16 @@ def get_repo_path(repo):
         return repo.get('url', repo.get('repo_url', repo.get('path', str(repo))))
     return str(repo)
 
+def get_repo_name(repo_url, default='unnamed_repo'):
+    """Name of a repository's outputs: the last part of its URL or path, without ``.git``."""
+    if '/' not in repo_url:
+        return default
+    repo_name = repo_url.split('/')[-1]
+    # Bare repositories and clone URLs, e.g. foo.git
+    if repo_name.endswith('.git'):
+        repo_name = repo_name[:-4]
+    return repo_name
+
 @lru_cache(maxsize=1000)
 def get_path_hash(path_str):
     """Cache-enabled hash calculation for string paths only."""
@@ -86,64 +99,80 @@ def cleanup_temp_dirs():
         except Exception as e:
             logger.debug(f"Warning: Error during PyDriller temp cleanup: {str(e)}")
 
+# Extraction profiles, from cheapest to most complete:
+#   minimal  - paths, change type and line counts
+#   standard - adds the diff, parsed diff and source code of both versions
+#   full     - adds the lizard-based fields (methods, nloc, complexity, token count) and DMM
+EXTRACT_PROFILES = ('minimal', 'standard', 'full')
+DEFAULT_EXTRACT_PROFILE = 'standard'
+
 # Define a function to extract modified file information
-def extract_file_info(modified_file):
+def extract_file_info(modified_file, profile=DEFAULT_EXTRACT_PROFILE):
+    include_content = profile != 'minimal'
+    include_analysis = profile == 'full'
+
     file_info = {
         'old_path': modified_file.old_path,
         'new_path': modified_file.new_path,
         'filename': modified_file.filename,
         'change_type': str(modified_file.change_type),
         'change_type_name': modified_file.change_type.name if modified_file.change_type else None,
-        'diff': modified_file.diff,
-        'diff_parsed': {
+    }
+    if include_content:
+        file_info['diff'] = modified_file.diff
+        file_info['diff_parsed'] = {
             'added': [(line[0], line[1]) for line in modified_file.diff_parsed['added']],
             'deleted': [(line[0], line[1]) for line in modified_file.diff_parsed['deleted']]
-        },
-        'added_lines': modified_file.added_lines,
-        'deleted_lines': modified_file.deleted_lines,
-        'source_code': None,  # Will be set later if safe
-        'source_code_before': None,  # Will be set later if safe
-        'methods': [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
-                   for method in modified_file.methods] if modified_file.methods else [],
-        'methods_before': [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
-                          for method in modified_file.methods_before] if modified_file.methods_before else [],
-        'changed_methods': [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
-                           for method in modified_file.changed_methods] if modified_file.changed_methods else [],
-    }
-    
-    # Check source code size before setting
-    try:
-        if modified_file.source_code and len(modified_file.source_code) < 1024 * 1024:  # 1MB limit
-            file_info['source_code'] = modified_file.source_code
-        elif modified_file.source_code:
-            logger.debug(f"Source code too large for {modified_file.filename}, skipping")
-    except Exception as e:
-        logger.debug(f"Error accessing source_code for {modified_file.filename}: {str(e)}")
-    
-    # Check source code before size
-    try:
-        if modified_file.source_code_before and len(modified_file.source_code_before) < 1024 * 1024:  # 1MB limit
-            file_info['source_code_before'] = modified_file.source_code_before
-        elif modified_file.source_code_before:
-            logger.debug(f"Source code before too large for {modified_file.filename}, skipping")
-    except Exception as e:
-        logger.debug(f"Error accessing source_code_before for {modified_file.filename}: {str(e)}")
+        }
+    file_info['added_lines'] = modified_file.added_lines
+    file_info['deleted_lines'] = modified_file.deleted_lines
+    if include_content:
+        file_info['source_code'] = None  # Will be set later if safe
+        file_info['source_code_before'] = None  # Will be set later if safe
+    if include_analysis:
+        # Computed lazily by the snapshot, lizard runs once per file version
+        file_info['methods'] = [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
+                                for method in modified_file.methods] if modified_file.methods else []
+        file_info['methods_before'] = [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
+                                       for method in modified_file.methods_before] if modified_file.methods_before else []
+        file_info['changed_methods'] = [{'name': method.name, 'start_line': method.start_line, 'end_line': method.end_line} 
+                                        for method in modified_file.changed_methods] if modified_file.changed_methods else []
     
-    # Add metrics that might not be available for all files
-    try:
-        file_info['nloc'] = modified_file.nloc
-    except:
-        file_info['nloc'] = None
-        
-    try:
-        file_info['complexity'] = modified_file.complexity
-    except:
-        file_info['complexity'] = None
+    if include_content:
+        # Check source code size before setting
+        try:
+            if modified_file.source_code and len(modified_file.source_code) < 1024 * 1024:  # 1MB limit
+                file_info['source_code'] = modified_file.source_code
+            elif modified_file.source_code:
+                logger.debug(f"Source code too large for {modified_file.filename}, skipping")
+        except Exception as e:
+            logger.debug(f"Error accessing source_code for {modified_file.filename}: {str(e)}")
         
-    try:
-        file_info['token_count'] = modified_file.token_count
-    except:
-        file_info['token_count'] = None
+        # Check source code before size
+        try:
+            if modified_file.source_code_before and len(modified_file.source_code_before) < 1024 * 1024:  # 1MB limit
+                file_info['source_code_before'] = modified_file.source_code_before
+            elif modified_file.source_code_before:
+                logger.debug(f"Source code before too large for {modified_file.filename}, skipping")
+        except Exception as e:
+            logger.debug(f"Error accessing source_code_before for {modified_file.filename}: {str(e)}")
+    
+    if include_analysis:
+        # Add metrics that might not be available for all files
+        try:
+            file_info['nloc'] = modified_file.nloc
+        except:
+            file_info['nloc'] = None
+            
+        try:
+            file_info['complexity'] = modified_file.complexity
+        except:
+            file_info['complexity'] = None
+            
+        try:
+            file_info['token_count'] = modified_file.token_count
+        except:
+            file_info['token_count'] = None
         
     return file_info
 
@@ -170,11 +199,14 @@ def generate_weekly_ranges(start_date, end_date):
     return weekly_ranges
 
 # Define a function to extract all commit information
-def extract_commit_info(commit):
+def extract_commit_info(commit, profile=DEFAULT_EXTRACT_PROFILE):
     """
     Extract comprehensive information from a commit, with progress bar for large commits.
     Added safety checks for large files to prevent recursion errors.
+    The profile (see EXTRACT_PROFILES) selects which expensive fields are computed.
     """
+    # The minimal profile stores no content, so it never reads a blob
+    include_content = profile != 'minimal'
     try:
         # Basic commit info extraction
         commit_info = {
@@ -224,13 +256,13 @@ def extract_commit_info(commit):
                             file_pbar.update(1)
                             continue
                             
-                        # Check file size if source_code is available
-                        if mod_file.source_code and len(mod_file.source_code) > 5 * 1024 * 1024:  # > 5MB
+                        # Check file size if source_code is extracted
+                        if include_content and mod_file.source_code and len(mod_file.source_code) > 5 * 1024 * 1024:  # > 5MB
                             logger.debug(f"File too large (source_code > 5MB): {filename}")
                             file_pbar.update(1)
                             continue
                             
-                        modified_files_info.append(extract_file_info(mod_file))
+                        modified_files_info.append(extract_file_info(mod_file, profile))
                     except RecursionError:
                         logger.debug(f"Failed to process '{mod_file.filename}' with RecursionError")
                     except Exception as e:
@@ -250,12 +282,12 @@ def extract_commit_info(commit):
                         logger.debug(f"Skipping potentially problematic file: {filename}")
                         continue
                         
-                    # Check file size if source_code is available
-                    if mod_file.source_code and len(mod_file.source_code) > 5 * 1024 * 1024:  # > 5MB
+                    # Check file size if source_code is extracted
+                    if include_content and mod_file.source_code and len(mod_file.source_code) > 5 * 1024 * 1024:  # > 5MB
                         logger.debug(f"File too large (source_code > 5MB): {filename}")
                         continue
                         
-                    modified_files_info.append(extract_file_info(mod_file))
+                    modified_files_info.append(extract_file_info(mod_file, profile))
                 except RecursionError:
                     logger.debug(f"Failed to process '{mod_file.filename}' with RecursionError")
                 except Exception as e:
@@ -264,14 +296,15 @@ def extract_commit_info(commit):
             commit_info['modified_files'] = modified_files_info
         
         # Add DMM metrics if available
-        try:
-            commit_info['dmm_unit_size'] = commit.dmm_unit_size
-            commit_info['dmm_unit_complexity'] = commit.dmm_unit_complexity 
-            commit_info['dmm_unit_interfacing'] = commit.dmm_unit_interfacing
-        except:
-            commit_info['dmm_unit_size'] = None
-            commit_info['dmm_unit_complexity'] = None
-            commit_info['dmm_unit_interfacing'] = None
+        if profile == 'full':
+            try:
+                commit_info['dmm_unit_size'] = commit.dmm_unit_size
+                commit_info['dmm_unit_complexity'] = commit.dmm_unit_complexity 
+                commit_info['dmm_unit_interfacing'] = commit.dmm_unit_interfacing
+            except:
+                commit_info['dmm_unit_size'] = None
+                commit_info['dmm_unit_complexity'] = None
+                commit_info['dmm_unit_interfacing'] = None
         
         return commit_info
     except RecursionError:
@@ -313,18 +346,10 @@ def safe_basename(file_path):
 # Helper function to get repository date range
 def get_repo_date_range(repo_url, temp_dir):
     """Get the min and max dates from a repository's commits."""
+    from .traversal import RepositoryTraversal
     try:
-        repository = Repository(path_to_repo=repo_url, clone_repo_to=temp_dir)
-        min_date = None
-        max_date = None
-        
-        for commit in repository.traverse_commits():
-            if min_date is None or commit.author_date < min_date:
-                min_date = commit.author_date
-            if max_date is None or commit.author_date > max_date:
-                max_date = commit.author_date
-        
-        return min_date, max_date
+        with RepositoryTraversal(repo_url, temp_dir) as traversal:
+            return traversal.get_date_range()
     except Exception as e:
         logger.debug(f"Error getting repository date range: {str(e)}")
         # Default to 1 year ago if we can't determine the range
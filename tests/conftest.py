@@ -0,0 +1,231 @@
+import os
+import sys
+import copy
+import json
+import random
+import logging
+import datetime
+import functools
+import subprocess
+
+import pytest
+
+# The tests import the package the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AUTHORS = [("Ann", "ann@example.org"), ("Bob", "bob@example.org"), ("Cy", "cy@example.org")]
+WORDS = ["alpha", "beta", "gamma", "delta", "value", "result", "count", "items", "index", "total"]
+MESSAGES = ["fix bug in parser", "add feature", "refactor", "fix #12", "update docs"]
+
+def git(repo, *args, env=None):
+    return subprocess.run(
+        ["git", "-C", str(repo), *args],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env
+    ).stdout.decode().strip()
+
+class SyntheticHistory:
+    """
+    Deterministic random history exercising the history-dependent metrics.
+
+    Commits by several authors create, edit, rename, delete and move lines
+    between files, with occasional commits of over a thousand lines and
+    bursts of commits minutes apart, over a few months.
+    """
+
+    def __init__(self, repo, seed=1):
+        self.repo = str(repo)
+        self.random = random.Random(seed)
+        self.files = {}
+        self.created = 0
+        self.time = datetime.datetime(2022, 1, 3, 9, 0, tzinfo=datetime.timezone.utc)
+        os.makedirs(self.repo)
+        git(self.repo, "init", "-q", "-b", "main")
+
+    def _line(self):
+        r = self.random.random()
+        if r < 0.08:
+            return ""
+        if r < 0.14:
+            return "# " + " ".join(self.random.choices(WORDS, k=3))
+        return f"    {self.random.choice(WORDS)}_{self.random.randint(0, 40)} = {self.random.choice(WORDS)}({self.random.randint(0, 99)})"
+
+    def _write(self, path):
+        full_path = os.path.join(self.repo, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write("\n".join(self.files[path]) + "\n")
+
+    def _change(self):
+        rnd = self.random
+        op = rnd.random()
+        if not self.files or op < 0.08:
+            path = f"{rnd.choice(['src', 'lib', 'tests', 'docs'])}/f{self.created}{rnd.choice(['.py', '.py', '.js', '.md'])}"
+            self.created += 1
+            self.files[path] = [self._line() for _ in range(rnd.randint(5, 60))]
+            self._write(path)
+        elif op < 0.13 and len(self.files) > 2:
+            old_path = rnd.choice(sorted(self.files))
+            new_path = f"{os.path.dirname(old_path)}/r{self.created}{os.path.splitext(old_path)[1]}"
+            self.created += 1
+            git(self.repo, "mv", old_path, new_path)
+            self.files[new_path] = self.files.pop(old_path)
+            if rnd.random() < 0.5:
+                self.files[new_path][rnd.randrange(len(self.files[new_path]))] = self._line()
+                self._write(new_path)
+        elif op < 0.16 and len(self.files) > 3:
+            path = rnd.choice(sorted(self.files))
+            git(self.repo, "rm", "-q", path)
+            self.files.pop(path)
+        elif op < 0.22 and len(self.files) > 1:
+            source, target = rnd.sample(sorted(self.files), 2)
+            size = rnd.randint(1, min(8, len(self.files[source])))
+            start = rnd.randrange(len(self.files[source]) - size + 1)
+            block = self.files[source][start:start + size]
+            del self.files[source][start:start + size]
+            self.files[target][rnd.randrange(len(self.files[target]) + 1):0] = block
+            self._write(source)
+            self._write(target)
+        elif op < 0.25:
+            path = rnd.choice(sorted(self.files))
+            self.files[path].extend(self._line() for _ in range(rnd.randint(1100, 1500)))
+            self._write(path)
+        else:
+            for path in rnd.sample(sorted(self.files), rnd.randint(1, min(3, len(self.files)))):
+                lines = self.files[path]
+                for _ in range(rnd.randint(1, 6)):
+                    r = rnd.random()
+                    if r < 0.4 and lines:
+                        del lines[rnd.randrange(len(lines))]
+                    elif r < 0.7 and lines:
+                        lines[rnd.randrange(len(lines))] = self._line()
+                    else:
+                        lines.insert(rnd.randrange(len(lines) + 1), self._line())
+                self._write(path)
+
+    def fork(self, repo, seed):
+        """Clone the history to ``repo``; the returned history adds commits of its own there."""
+        git(os.path.dirname(str(repo)), "clone", "-q", self.repo, str(repo))
+        other = copy.copy(self)
+        other.repo = str(repo)
+        other.random = random.Random(seed)
+        other.files = copy.deepcopy(self.files)
+        return other
+
+    def commit(self, count=1):
+        """Add ``count`` random commits; returns the new HEAD."""
+        rnd = self.random
+        for _ in range(count):
+            self._change()
+            git(self.repo, "add", "-A")
+            r = rnd.random()
+            if r < 0.3:
+                self.time += datetime.timedelta(minutes=rnd.randint(1, 9))
+            elif r < 0.8:
+                self.time += datetime.timedelta(minutes=rnd.randint(10, 300))
+            else:
+                self.time += datetime.timedelta(days=rnd.randint(1, 10))
+            name, email = rnd.choice(AUTHORS)
+            env = dict(os.environ, GIT_AUTHOR_NAME=name, GIT_AUTHOR_EMAIL=email,
+                       GIT_COMMITTER_NAME=name, GIT_COMMITTER_EMAIL=email,
+                       GIT_AUTHOR_DATE=self.time.isoformat(), GIT_COMMITTER_DATE=self.time.isoformat())
+            git(self.repo, "commit", "-q", "--allow-empty", "-m", rnd.choice(MESSAGES), env=env)
+        return git(self.repo, "rev-parse", "HEAD")
+
+def use_caches_in(cache_dir, mirror_dir):
+    """Point the global on-disk caches of this process at the given directories."""
+    import source.repo_metadata as repo_metadata
+    import source.clone_cache as clone_cache
+    import source.commit_cache as commit_cache
+    import source.access_checker as access_checker
+
+    repo_metadata.metadata_cache = repo_metadata.MetadataCache(os.path.join(cache_dir, 'metadata.sqlite'))
+    commit_cache.commit_cache = commit_cache.CommitCache(os.path.join(cache_dir, 'commits.sqlite'))
+    access_checker.access_cache = access_checker.AccessCache(os.path.join(cache_dir, 'access.sqlite'))
+    clone_cache.mirror_cache = clone_cache.MirrorCache(root=mirror_dir)
+
+def init_isolated_chunk_worker(cache_dir, mirror_dir, *args):
+    """Chunk worker initializer of the tests: the usual one, then the caches of the test."""
+    from source.repo_processing import init_chunk_worker
+
+    init_chunk_worker(*args)
+    use_caches_in(cache_dir, mirror_dir)
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """
+    Point the on-disk caches and the log files at ``tmp_path``, also in chunk workers.
+
+    Entries left by tests, e.g. metadata keyed by a temporary repository's
+    URL and HEAD, would otherwise be read by later real runs.
+    """
+    import source.repo_metadata as repo_metadata
+    import source.clone_cache as clone_cache
+    import source.commit_cache as commit_cache
+    import source.access_checker as access_checker
+    import source.repo_processing as repo_processing
+    import source.logger
+
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    mirror_dir = str(tmp_path / 'mirrors')
+    for module, name in [(repo_metadata, 'metadata_cache'), (commit_cache, 'commit_cache'),
+                         (access_checker, 'access_cache'), (clone_cache, 'mirror_cache')]:
+        monkeypatch.setattr(module, name, None)
+    use_caches_in(str(cache_dir), mirror_dir)
+
+    # A pool of its own, whose workers use the caches of this test
+    monkeypatch.setattr(repo_processing, 'chunk_pool', None)
+    monkeypatch.setattr(repo_processing, 'init_chunk_worker',
+                        functools.partial(init_isolated_chunk_worker, str(cache_dir), mirror_dir))
+
+    def file_handlers():
+        return {
+            handler
+            for logger in logging.Logger.manager.loggerDict.values() if isinstance(logger, logging.Logger)
+            for handler in logger.handlers if isinstance(handler, logging.FileHandler)
+        }
+
+    # Loggers of modules first imported during the test log here too
+    monkeypatch.setattr(source.logger, 'LOGS_DIR', str(tmp_path))
+    for handler in file_handlers():
+        handler.close()
+        monkeypatch.setattr(handler, 'baseFilename', str(tmp_path / 'gitin.log'))
+    yield
+    if repo_processing.chunk_pool is not None:
+        repo_processing.chunk_pool.shutdown()
+    if commit_cache.commit_cache is not None:
+        commit_cache.commit_cache.close()
+    for handler in file_handlers():
+        # Reopened at their restored file on the next record
+        handler.close()
+
+@pytest.fixture(scope="session")
+def synthetic_repo(tmp_path_factory):
+    """Path of a repository with a 200-commit synthetic history, shared by the session."""
+    history = SyntheticHistory(tmp_path_factory.mktemp("repos") / "synthetic")
+    history.commit(200)
+    return history.repo
+
+@pytest.fixture
+def analyse(tmp_path):
+    """
+    Run process_repo_directly with the gitlog backend and return the parsed analysis file.
+
+    Outputs go to ``<tmp_path>/<name>`` so one test can compare several runs.
+    """
+    from source.repo_processing import process_repo_directly, get_analysis_path
+    from source.utils import get_repo_name
+
+    def run(repo, name, **kwargs):
+        output_dir = tmp_path / name
+        output_dir.mkdir(exist_ok=True)
+        kwargs.setdefault('backend', 'gitlog')
+        process_repo_directly('project', repo, None, None, 'ecosystem', 'category',
+                              str(tmp_path / 'temp'), str(output_dir), **kwargs)
+        with open(get_analysis_path(str(output_dir), 'project', get_repo_name(repo))) as f:
+            return json.load(f)
+
+    return run
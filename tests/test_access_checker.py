@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import source.access_checker as access_checker
+from conftest import SyntheticHistory
+from source.access_checker import (
+    AccessCache, AccessResult, check_repositories,
+    HEAD_TTL_SECONDS, REACHABLE_TTL_SECONDS, UNREACHABLE_TTL_SECONDS
+)
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = AccessCache(str(tmp_path / 'access.sqlite'))
+    monkeypatch.setattr(access_checker, 'access_cache', cache)
+    return cache
+
+@pytest.fixture
+def remote(tmp_path):
+    """A ``file://`` URL, checked with git ls-remote like any remote, and its HEAD."""
+    history = SyntheticHistory(tmp_path / 'remote')
+    head_sha = history.commit(3)
+    return 'file://' + history.repo, head_sha
+
+def check(repo_url):
+    return check_repositories([repo_url], desc="Test")[repo_url]
+
+def test_remote_head_is_checked_and_cached(cache, remote):
+    repo_url, head_sha = remote
+    result = check(repo_url)
+
+    assert result.reachable
+    assert result.head_sha == head_sha
+    assert cache.get_many([repo_url])[repo_url] == result
+
+def test_missing_remote_is_unreachable(cache, tmp_path):
+    result = check('file://' + str(tmp_path / 'missing'))
+
+    assert not result.reachable
+    assert result.head_sha is None
+
+def test_cached_head_is_only_trusted_briefly(cache, tmp_path):
+    # Nothing answers at these URLs, so the results can only come from the cache
+    recent_url = 'file://' + str(tmp_path / 'recent')
+    older_url = 'file://' + str(tmp_path / 'older')
+    now = time.time()
+    cache.put_many([
+        AccessResult(recent_url, True, 'a' * 40, now - HEAD_TTL_SECONDS / 2),
+        AccessResult(older_url, True, 'b' * 40, now - HEAD_TTL_SECONDS - 60),
+    ])
+
+    recent = check(recent_url)
+    older = check(older_url)
+
+    assert recent.reachable and recent.head_sha == 'a' * 40
+    assert older.reachable and older.head_sha is None
+
+def test_expired_results_are_checked_again(cache, remote, tmp_path):
+    repo_url, head_sha = remote
+    missing_url = 'file://' + str(tmp_path / 'missing')
+    now = time.time()
+    cache.put_many([
+        AccessResult(repo_url, False, checked_at=now - UNREACHABLE_TTL_SECONDS - 60),
+        AccessResult(missing_url, True, 'a' * 40, now - REACHABLE_TTL_SECONDS - 60),
+    ])
+
+    assert check(repo_url).head_sha == head_sha
+    assert not check(missing_url).reachable
+    assert cache.get_many([missing_url])[missing_url].checked_at > now
+
+def test_local_repositories_are_not_cached(cache, remote):
+    repo_url, head_sha = remote
+    local_path = repo_url[len('file://'):]
+    result = check(local_path)
+
+    assert result.reachable
+    assert result.head_sha == head_sha
+    assert cache.get_many([local_path]) == {}
@@ -0,0 +1,62 @@
+import os
+
+from conftest import SyntheticHistory, git
+from source.repo_processing import get_analysis_path
+from source.utils import DEFAULT_EXTRACT_PROFILE
+from source.analysis_state import load_analysis_state, analysis_settings
+
+SETTINGS = analysis_settings(None, None, DEFAULT_EXTRACT_PROFILE, None)
+
+def test_updated_analysis_matches_fresh_analysis(analyse, tmp_path):
+    history = SyntheticHistory(tmp_path / 'repo', seed=2)
+    first_head = history.commit(120)
+    analyse(history.repo, 'updated')
+
+    output_path = get_analysis_path(str(tmp_path / 'updated'), 'project', 'repo')
+    state = load_analysis_state(output_path, SETTINGS)
+    assert state.head_sha == first_head
+    assert state.total_commits == 120
+
+    history.commit(50)
+    updated = analyse(history.repo, 'updated', state=load_analysis_state(output_path, SETTINGS))
+    fresh = analyse(history.repo, 'fresh')
+
+    assert updated == fresh
+    assert load_analysis_state(output_path, SETTINGS).total_commits == 170
+
+def test_unchanged_history_keeps_analysis(analyse, tmp_path):
+    history = SyntheticHistory(tmp_path / 'repo', seed=3)
+    history.commit(40)
+    first = analyse(history.repo, 'updated')
+
+    output_path = get_analysis_path(str(tmp_path / 'updated'), 'project', 'repo')
+    modified = os.path.getmtime(output_path)
+    again = analyse(history.repo, 'updated', state=load_analysis_state(output_path, SETTINGS))
+
+    assert again == first
+    assert os.path.getmtime(output_path) == modified
+
+def test_rewritten_history_is_analysed_again(analyse, tmp_path):
+    history = SyntheticHistory(tmp_path / 'repo', seed=4)
+    history.commit(60)
+    analyse(history.repo, 'updated')
+    output_path = get_analysis_path(str(tmp_path / 'updated'), 'project', 'repo')
+    state = load_analysis_state(output_path, SETTINGS)
+
+    # The analysed HEAD is no longer part of the history
+    git(history.repo, 'reset', '-q', '--hard', 'HEAD~5')
+    history.commit(10)
+    updated = analyse(history.repo, 'updated', state=state)
+    fresh = analyse(history.repo, 'fresh')
+
+    assert updated == fresh
+    assert len(updated['commits']) == 65
+
+def test_state_with_other_settings_is_ignored(analyse, tmp_path):
+    history = SyntheticHistory(tmp_path / 'repo', seed=5)
+    history.commit(20)
+    analyse(history.repo, 'updated')
+
+    output_path = get_analysis_path(str(tmp_path / 'updated'), 'project', 'repo')
+    assert load_analysis_state(output_path, SETTINGS) is not None
+    assert load_analysis_state(output_path, analysis_settings(None, None, 'full', None)) is None
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import source.repo_processing as repo_processing
+from source.repo_processing import CheckpointTrigger, get_analysis_path
+from source.utils import DEFAULT_EXTRACT_PROFILE
+from source.analysis_state import has_analysis_checkpoint, has_analysis_state, load_analysis_checkpoint, analysis_settings
+
+SETTINGS = analysis_settings(None, None, DEFAULT_EXTRACT_PROFILE, None)
+
+def interrupt_after_first_save(monkeypatch, every_commits):
+    """Checkpoint every ``every_commits`` commits and stop the run right after the first save."""
+    def interrupting_trigger(save, **kwargs):
+        def save_and_stop(cursor):
+            save(cursor)
+            raise KeyboardInterrupt
+        return CheckpointTrigger(save_and_stop, every_commits=every_commits, **kwargs)
+    monkeypatch.setattr(repo_processing, 'CheckpointTrigger', interrupting_trigger)
+
+def interrupted(analyse, monkeypatch, *args, every_commits, **kwargs):
+    """Run an analysis interrupted after its first checkpoint."""
+    with monkeypatch.context() as patch:
+        interrupt_after_first_save(patch, every_commits)
+        with pytest.raises(KeyboardInterrupt):
+            analyse(*args, **kwargs)
+
+def test_interrupted_analysis_resumes_from_checkpoint(synthetic_repo, analyse, tmp_path, monkeypatch):
+    single = analyse(synthetic_repo, 'single')
+
+    interrupted(analyse, monkeypatch, synthetic_repo, 'resumed', every_commits=70, batch_size=25)
+
+    output_path = get_analysis_path(str(tmp_path / 'resumed'), 'project', os.path.basename(synthetic_repo))
+    assert has_analysis_checkpoint(output_path)
+    assert not has_analysis_state(output_path)
+    checkpoint = load_analysis_checkpoint(output_path, SETTINGS)
+    assert checkpoint.cursor == 70
+
+    # Records written after the checkpoint are cut off on resume
+    with open(output_path, 'a') as f:
+        f.write(',\n    {"hash": "written after the checkpoint"')
+    resumed = analyse(synthetic_repo, 'resumed', batch_size=25, checkpoint=checkpoint)
+
+    assert resumed['commits'] == single['commits']
+    assert resumed['processing'] == single['processing']
+    assert resumed['process_metrics'] == single['process_metrics']
+    assert has_analysis_state(output_path)
+    assert not has_analysis_checkpoint(output_path)
+
+def test_checkpoint_with_other_settings_is_ignored(synthetic_repo, analyse, tmp_path, monkeypatch):
+    interrupted(analyse, monkeypatch, synthetic_repo, 'interrupted', every_commits=20)
+
+    output_path = get_analysis_path(str(tmp_path / 'interrupted'), 'project', os.path.basename(synthetic_repo))
+    assert load_analysis_checkpoint(output_path, SETTINGS) is not None
+    assert load_analysis_checkpoint(output_path, analysis_settings(None, None, 'full', None)) is None
+    assert load_analysis_checkpoint(output_path, analysis_settings(None, None, DEFAULT_EXTRACT_PROFILE, ['commits_count'])) is None
+
+def test_checkpoint_with_missing_file_starts_over(synthetic_repo, analyse, tmp_path, monkeypatch):
+    single = analyse(synthetic_repo, 'single')
+
+    interrupted(analyse, monkeypatch, synthetic_repo, 'restarted', every_commits=20)
+
+    output_path = get_analysis_path(str(tmp_path / 'restarted'), 'project', os.path.basename(synthetic_repo))
+    checkpoint = load_analysis_checkpoint(output_path, SETTINGS)
+    os.remove(output_path)
+    restarted = analyse(synthetic_repo, 'restarted', checkpoint=checkpoint)
+
+    assert restarted['commits'] == single['commits']
+    assert restarted['process_metrics'] == single['process_metrics']
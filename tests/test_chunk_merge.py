@@ -0,0 +1,81 @@
+import os
+import json
+
+import pytest
+
+import source.repo_processing as repo_processing
+from source.traversal import RepositoryTraversal
+from source.metrics.aggregator import MetricsCollector
+from source.repo_processing import plan_commit_chunks, get_analysis_path
+from source.utils import DEFAULT_EXTRACT_PROFILE
+from source.analysis_state import has_analysis_checkpoint, has_analysis_state, load_analysis_checkpoint, analysis_settings
+
+def as_json(results):
+    return json.dumps(results, default=str)
+
+@pytest.mark.parametrize("chunk_count, calculate_weekly", [(2, True), (7, True), (3, False)])
+def test_merged_chunk_collectors_match_sequential_run(synthetic_repo, tmp_path, chunk_count, calculate_weekly):
+    with RepositoryTraversal(synthetic_repo, str(tmp_path), backend='gitlog') as traversal:
+        start_date, end_date = traversal.get_date_range()
+        sequential = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly)
+        traversal.stream([sequential], desc="Sequential")
+
+        merged = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly)
+        for chunk in plan_commit_chunks(traversal.commits, chunk_count):
+            part = MetricsCollector(start_date, end_date, calculate_weekly=calculate_weekly, detached=True)
+            traversal.stream([part], commit_range=chunk.commit_range, desc=f"Chunk {chunk.index + 1}")
+            merged.merge(part)
+
+    assert merged.processed_commits == sequential.processed_commits
+    assert as_json(merged.get_results()) == as_json(sequential.get_results())
+
+def test_merge_requires_detached_collector():
+    collector = MetricsCollector(None, None)
+    with pytest.raises(ValueError):
+        collector.merge(MetricsCollector(None, None))
+
+@pytest.fixture
+def split(monkeypatch):
+    """Split every repository into ``chunk_count`` chunks."""
+    def configure(chunk_count):
+        monkeypatch.setattr(repo_processing, 'SPLIT_THRESHOLD', 2)
+        monkeypatch.setattr(repo_processing, 'get_chunk_count', lambda commit_count, workers=None: chunk_count)
+    return configure
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_split_analysis_matches_single_unit(synthetic_repo, analyse, split, workers):
+    single = analyse(synthetic_repo, 'single')
+    split(5)
+    chunked = analyse(synthetic_repo, 'split', workers=workers)
+
+    assert chunked['commits'] == single['commits']
+    assert chunked['processing'] == single['processing']
+    assert chunked['process_metrics'] == single['process_metrics']
+
+def test_failed_chunk_keeps_checkpoint_and_resumes(synthetic_repo, analyse, split, tmp_path, monkeypatch):
+    single = analyse(synthetic_repo, 'single')
+    split(4)
+
+    process_repo_chunk = repo_processing.process_repo_chunk
+    def failing_chunk(repo_url, chunk, *args, **kwargs):
+        if chunk.index == 2:
+            return {'chunk_id': chunk.chunk_id, 'error': 'injected failure'}
+        return process_repo_chunk(repo_url, chunk, *args, **kwargs)
+    monkeypatch.setattr(repo_processing, 'process_repo_chunk', failing_chunk)
+
+    output_path = get_analysis_path(str(tmp_path / 'split'), 'project', os.path.basename(synthetic_repo))
+    with pytest.raises(json.JSONDecodeError):
+        analyse(synthetic_repo, 'split', workers=1)
+    # No metrics or state are written from a history with a chunk missing
+    assert not has_analysis_state(output_path)
+    assert has_analysis_checkpoint(output_path)
+
+    monkeypatch.setattr(repo_processing, 'process_repo_chunk', process_repo_chunk)
+    checkpoint = load_analysis_checkpoint(output_path, analysis_settings(None, None, DEFAULT_EXTRACT_PROFILE, None))
+    assert checkpoint.chunk_index == 2
+    resumed = analyse(synthetic_repo, 'split', workers=1, checkpoint=checkpoint)
+
+    assert resumed['commits'] == single['commits']
+    assert resumed['process_metrics'] == single['process_metrics']
+    assert has_analysis_state(output_path)
+    assert not has_analysis_checkpoint(output_path)
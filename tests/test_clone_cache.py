@@ -0,0 +1,174 @@
+import os
+import sys
+import glob
+import subprocess
+
+import pytest
+from pydriller import Repository
+
+import source.clone_cache as clone_cache
+from conftest import SyntheticHistory, git
+from source.clone_cache import MirrorCache, pack_fingerprint
+from source.traversal import RepositoryTraversal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def remotes(tmp_path):
+    """Three small repositories with the ``file://`` URLs the cache clones them from."""
+    histories = {}
+    for seed, name in enumerate(['first', 'second', 'third']):
+        history = SyntheticHistory(tmp_path / 'remotes' / name, seed=seed)
+        history.commit(5)
+        histories['file://' + history.repo] = history
+    return histories
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """URLs of the mirrors fetched, in order."""
+    fetched = []
+    refresh = MirrorCache._refresh
+    def counting_refresh(self, repo_url, mirror_path):
+        fetched.append(repo_url)
+        return refresh(self, repo_url, mirror_path)
+    monkeypatch.setattr(MirrorCache, '_refresh', counting_refresh)
+    return fetched
+
+def head_of(path):
+    return git(path, 'rev-parse', 'HEAD')
+
+def test_mirror_is_cloned_once_and_refreshed_after_interval(remotes, fetches, tmp_path):
+    repo_url, history = next(iter(remotes.items()))
+    cache = MirrorCache(root=str(tmp_path / 'mirrors'))
+
+    with cache.mirror(repo_url) as mirror_path:
+        assert head_of(mirror_path) == head_of(history.repo)
+    new_head = history.commit(2)
+    with cache.mirror(repo_url) as mirror_path:
+        # Refreshed moments ago
+        assert head_of(mirror_path) != new_head
+    assert fetches == []
+
+    cache._update_index(cache.get_key(repo_url), refreshed_at=0)
+    with cache.mirror(repo_url) as mirror_path:
+        assert head_of(mirror_path) == new_head
+    assert fetches == [repo_url]
+
+def test_refresh_time_is_shared_by_caches(remotes, fetches, tmp_path):
+    repo_url = next(iter(remotes))
+    with MirrorCache(root=str(tmp_path / 'mirrors')).mirror(repo_url):
+        pass
+    # E.g. another worker process
+    with MirrorCache(root=str(tmp_path / 'mirrors')).mirror(repo_url):
+        pass
+    assert fetches == []
+
+def test_least_recently_used_mirrors_are_evicted(remotes, tmp_path):
+    first, second, third = remotes
+    cache = MirrorCache(root=str(tmp_path / 'mirrors'), max_size_gb=1)
+    for repo_url in (first, second, third):
+        with cache.mirror(repo_url):
+            pass
+    index = cache._load_index()
+    sizes = {key: entry['size_bytes'] for key, entry in index.items()}
+
+    # Room for the two mirrors used last
+    cache.max_size_bytes = sizes[cache.get_key(second)] + sizes[cache.get_key(third)]
+    cache.evict()
+
+    assert not os.path.exists(cache.get_mirror_path(first))
+    assert os.path.isdir(cache.get_mirror_path(second))
+    assert os.path.isdir(cache.get_mirror_path(third))
+    assert set(cache._load_index()) == {cache.get_key(second), cache.get_key(third)}
+
+def test_leased_mirrors_are_not_evicted(remotes, tmp_path):
+    first, second, _ = remotes
+    cache = MirrorCache(root=str(tmp_path / 'mirrors'), max_size_gb=0)
+
+    first_path = cache.acquire(first)
+    with cache.mirror(second) as second_path:
+        # The acquire of the second mirror evicted everything it could
+        assert os.path.isdir(first_path)
+        assert os.path.isdir(second_path)
+    cache.release(first)
+    cache.evict()
+
+    assert not os.path.exists(first_path)
+    assert not os.path.exists(second_path)
+
+@pytest.mark.skipif(clone_cache.fcntl is None, reason="leases only cover their own process without fcntl")
+def test_mirror_leased_by_another_process_is_not_evicted(remotes, tmp_path):
+    repo_url = next(iter(remotes))
+    root = str(tmp_path / 'mirrors')
+    holder = subprocess.Popen(
+        [sys.executable, '-c',
+         # Logging off, so the holder writes no log file of its own
+         'import sys, logging; logging.disable(logging.CRITICAL); from source.clone_cache import MirrorCache; '
+         'MirrorCache(root=sys.argv[1]).acquire(sys.argv[2]); print("leased", flush=True); sys.stdin.read()',
+         root, repo_url],
+        cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        assert holder.stdout.readline().strip() == b'leased'
+        cache = MirrorCache(root=root, max_size_gb=0)
+        mirror_path = cache.get_mirror_path(repo_url)
+        cache.evict()
+        assert os.path.isdir(mirror_path)
+    finally:
+        holder.communicate(b'')
+
+    # The lease ends with its process
+    cache.evict()
+    assert not os.path.exists(mirror_path)
+
+def test_mirrors_are_maintained_when_not_in_use(remotes, tmp_path):
+    repo_url, history = next(iter(remotes.items()))
+    cache = MirrorCache(root=str(tmp_path / 'mirrors'))
+    key = cache.get_key(repo_url)
+
+    mirror_path = cache.acquire(repo_url)
+    assert glob.glob(os.path.join(mirror_path, 'objects', 'pack', '*.bitmap'))
+    assert os.path.exists(os.path.join(mirror_path, 'objects', 'info', 'commit-graph'))
+    assert cache._load_index()[key]['pack_fingerprint'] == pack_fingerprint(mirror_path)
+
+    history.commit(3)
+    cache._update_index(key, refreshed_at=0)
+    # Still leased by the first acquire: fetched but not repacked
+    cache.acquire(repo_url)
+    assert cache._load_index()[key]['pack_fingerprint'] != pack_fingerprint(mirror_path)
+    cache.release(repo_url)
+    cache.release(repo_url)
+
+    with cache.mirror(repo_url):
+        assert cache._load_index()[key]['pack_fingerprint'] == pack_fingerprint(mirror_path)
+        assert len(glob.glob(os.path.join(mirror_path, 'objects', 'pack', '*.pack'))) == 1
+
+def test_partial_mirrors_are_upgraded_and_not_maintained(remotes, tmp_path):
+    repo_url = next(iter(remotes))
+    cache = MirrorCache(root=str(tmp_path / 'mirrors'), partial_clone=True)
+
+    mirror_path = cache.acquire(repo_url, blobless=True)
+    cache.release(repo_url)
+    assert MirrorCache.is_partial(mirror_path)
+    assert 'pack_fingerprint' not in cache._load_index()[cache.get_key(repo_url)]
+
+    # A run reading blobs refetches them all first
+    with cache.mirror(repo_url):
+        assert not MirrorCache.is_partial(mirror_path)
+        assert cache._load_index()[cache.get_key(repo_url)]['pack_fingerprint'] == pack_fingerprint(mirror_path)
+
+def test_mirrored_commits_keep_the_branches_of_a_clone(remotes, tmp_path):
+    repo_url, history = next(iter(remotes.items()))
+    # Contains every commit, but a clone of the remote has no local branch for it
+    git(history.repo, 'branch', 'feature')
+    # What pydriller analysed remotes from
+    clone_path = str(tmp_path / 'clone')
+    subprocess.run(['git', 'clone', '-q', repo_url, clone_path], check=True)
+    expected = {commit.hash: (commit.branches, commit.in_main_branch)
+                for commit in Repository(clone_path).traverse_commits()}
+
+    with RepositoryTraversal(repo_url) as traversal:
+        branches = {commit.hash: (traversal.branch_index.branches(commit.hash), traversal.branch_index.in_main_branch(commit.hash))
+                    for commit in traversal.iter_commits()}
+
+    assert branches == expected
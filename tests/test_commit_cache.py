@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+from source.commit_cache import CommitCache
+
+def commit(sha):
+    """The repository-dependent fields a cached record is completed with."""
+    return SimpleNamespace(hash=sha, branches={'main'}, in_main_branch=True, project_name='project', project_path='/repo')
+
+def test_records_are_stored_for_their_file_selection(tmp_path):
+    path = str(tmp_path / 'commits.sqlite')
+    cache = CommitCache(path)
+    cache.put({'hash': 'a' * 40, 'msg': 'Add file', 'branches': {'feature'}}, 'standard')
+
+    record = cache.get(commit('a' * 40), 'standard')
+    assert record['msg'] == 'Add file'
+    assert record['branches'] == {'main'}
+    assert cache.get(commit('a' * 40), 'full') is None
+
+    # E.g. a later run with other ignore patterns or classifier limits
+    other = CommitCache(path)
+    other.file_selection = 'other settings'
+    assert not other.contains('a' * 40, 'standard')
+    assert other.get(commit('a' * 40), 'standard') is None
+
+def test_one_connection_is_shared_by_threads(tmp_path):
+    cache = CommitCache(str(tmp_path / 'commits.sqlite'))
+    connection = cache._connection()
+
+    def put_records(start):
+        for i in range(start, start + 50):
+            cache.put({'hash': f'{i:040x}'}, 'standard')
+    threads = [threading.Thread(target=put_records, args=(start,)) for start in (0, 50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache._connection() is connection
+    assert all(cache.contains(f'{i:040x}', 'standard') for i in range(100))
+
+def test_records_of_unknown_file_selection_are_dropped(tmp_path):
+    path = str(tmp_path / 'commits.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE commit_records (sha TEXT NOT NULL, profile TEXT NOT NULL, version INTEGER NOT NULL, "
+                     "record BLOB NOT NULL, PRIMARY KEY (sha, profile, version))")
+        conn.execute("INSERT INTO commit_records VALUES ('a', 'standard', 3, x'00')")
+    conn.close()
+
+    cache = CommitCache(path)
+    assert not cache.contains('a', 'standard')
+    cache.put({'hash': 'a' * 40}, 'standard')
+    assert cache.contains('a' * 40, 'standard')
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from conftest import git
+from source.blob_server import BlobServer
+from source.file_classifier import FileClassifier, GENERATED, OVERSIZED, SNIFF_BYTES
+from source.git_log_backend import GitLogRepository
+
+@pytest.fixture(scope="module")
+def classified_repo(tmp_path_factory):
+    repo = str(tmp_path_factory.mktemp("repos") / "classified")
+    os.makedirs(repo)
+    git(repo, 'init', '-q', '-b', 'main')
+    files = {
+        'src/main.py': 'value = 1\n',
+        'src/large.py': 'value = 1\n' * 1000,
+        'src/models_pb2.py': '# Generated by the protocol buffer compiler.  DO NOT EDIT!\nvalue = 1\n',
+        # A marker past the sniffed bytes does not count
+        'src/late.py': 'value = 1\n' * (SNIFF_BYTES // 10 + 1) + '# @generated\n',
+        'package-lock.json': '{}\n',
+    }
+    for path, content in files.items():
+        os.makedirs(os.path.join(repo, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(repo, path), 'w') as f:
+            f.write(content)
+    git(repo, 'add', '-A')
+    env = dict(os.environ, GIT_AUTHOR_NAME='Ann', GIT_AUTHOR_EMAIL='ann@example.org',
+               GIT_COMMITTER_NAME='Ann', GIT_COMMITTER_EMAIL='ann@example.org')
+    git(repo, 'commit', '-q', '-m', 'Add files', env=env)
+    return repo
+
+@pytest.mark.parametrize("patches", [True, False])
+def test_files_are_classified_whatever_is_streamed(classified_repo, patches):
+    with BlobServer(classified_repo) as blob_server:
+        classifier = FileClassifier(blob_server, max_bytes=5000)
+        repository = GitLogRepository(classified_repo, blob_server=blob_server)
+        commit = next(iter(repository.iter_changes(repository.list_commits(), patches=patches)))
+        classes = {modified_file.new_path: classifier.classify(modified_file) for modified_file in commit.modified_files}
+
+    assert classes == {
+        'src/main.py': None,
+        'src/large.py': OVERSIZED,
+        'src/models_pb2.py': GENERATED,
+        'src/late.py': None,
+        'package-lock.json': GENERATED,
+    }
+
+def test_prefix_reads_leave_the_cache_alone(classified_repo):
+    sha = git(classified_repo, 'rev-parse', 'HEAD:src/large.py')
+    with BlobServer(classified_repo) as blob_server:
+        assert blob_server.read_prefix(sha, 20) == b'value = 1\nvalue = 1\n'
+        assert blob_server._cache == {}
+        # The pipe is left at the next blob
+        assert blob_server.read(sha) == b'value = 1\n' * 1000
+        assert blob_server.read_prefix(sha, 10) == b'value = 1\n'
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from conftest import git
+from source.file_filters import should_analyze_path, should_analyze_file
+
+@pytest.mark.parametrize("path", [
+    'node_modules/left-pad/index.js',
+    'web/node_modules/react/index.js',
+    'node_modules',
+    'pkg/__pycache__/mod.cpython-311.pyc',
+    'vendor/lib.go',
+    'third_party/vendor/lib.go',
+    'dist/app.js',
+    'build/output.txt',
+    'src/build/gen.c',
+    '.git/config',
+    'static/app.min.js',
+    'assets/logo.png',
+    'js/soljson-v0.8.19+commit.7dd6d404.js',
+    'release/archive.tar',
+])
+def test_ignored_paths(path):
+    assert not should_analyze_path(path)
+
+@pytest.mark.parametrize("path", [
+    'rebuild/run.py',
+    'src/rebuild.py',
+    'redist/notes.md',
+    'distutils/core.py',
+    'src/buildtools/make.py',
+    'my_node_modules_helper.js',
+    'docs/vendoring.md',
+    'builder/main.py',
+    'src/app.js',
+    '',
+])
+def test_analysed_paths(path):
+    assert should_analyze_path(path)
+
+def test_file_names_are_checked_on_their_own(tmp_path):
+    # Only the name of an existing file is matched, so its directory does not count
+    build_dir = tmp_path / 'build'
+    build_dir.mkdir()
+    (build_dir / 'main.py').write_text('x = 1\n')
+    (build_dir / 'app.min.js').write_text('x=1')
+
+    assert should_analyze_file(str(build_dir / 'main.py'))
+    assert not should_analyze_file(str(build_dir / 'app.min.js'))
+
+def test_ignored_files_are_left_out_of_metrics(tmp_path, analyse):
+    repo = str(tmp_path / 'filtered')
+    os.makedirs(repo)
+    git(repo, 'init', '-q', '-b', 'main')
+    paths = ['src/main.py', 'rebuild/run.py', 'node_modules/dep/index.js', 'build/out.py']
+    for day, value in [(2, 1), (4, 2)]:
+        for path in paths:
+            os.makedirs(os.path.join(repo, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(repo, path), 'w') as f:
+                f.write(f'value = {value}\n')
+        git(repo, 'add', '-A')
+        date = f'2024-01-0{day}T12:00:00+00:00'
+        env = dict(os.environ, GIT_AUTHOR_NAME='Ann', GIT_AUTHOR_EMAIL='ann@example.org', GIT_AUTHOR_DATE=date,
+                   GIT_COMMITTER_NAME='Ann', GIT_COMMITTER_EMAIL='ann@example.org', GIT_COMMITTER_DATE=date)
+        git(repo, 'commit', '-q', '-m', 'Change files', env=env)
+
+    analysis = analyse(repo, 'filtered')
+    counted = set()
+    for name, week in analysis['process_metrics'].items():
+        if name.startswith('Week_'):
+            counted.update(week['productivity']['commits_count'])
+    assert counted == {'src/main.py', 'rebuild/run.py'}
@@ -0,0 +1,98 @@
+import os
+
+import source.clone_cache as clone_cache
+from conftest import SyntheticHistory
+from source.fork_families import seed_fork_families, find_shared_base, group_by_roots, get_root_commits, known_root_commits
+from source.repo_metadata import get_repo_metadata
+from source.repo_processing import get_analysis_path
+from source.utils import DEFAULT_EXTRACT_PROFILE
+from source.analysis_state import load_analysis_state, analysis_settings
+
+SETTINGS = analysis_settings(None, None, DEFAULT_EXTRACT_PROFILE, None)
+
+def make_family(tmp_path):
+    """An upstream and a fork that both moved on after a shared history of 80 commits."""
+    upstream = SyntheticHistory(tmp_path / 'repos' / 'upstream', seed=6)
+    base_sha = upstream.commit(80)
+    fork = upstream.fork(tmp_path / 'repos' / 'fork', seed=7)
+    upstream.commit(30)
+    fork.commit(20)
+    unrelated = SyntheticHistory(tmp_path / 'repos' / 'unrelated', seed=8)
+    unrelated.commit(10)
+    return upstream, fork, unrelated, base_sha
+
+def test_family_shares_history_up_to_fork_point(tmp_path):
+    upstream, fork, unrelated, base_sha = make_family(tmp_path)
+
+    repos = [{'repo_url': upstream.repo}, {'repo_url': unrelated.repo}, {'repo_url': fork.repo}]
+    families = group_by_roots(repos, [get_root_commits(path) for path in (upstream.repo, unrelated.repo, fork.repo)])
+    assert len(families) == 1
+    assert families[0].members == [repos[0], repos[2]]
+    assert find_shared_base(upstream.repo, [fork.repo]) == base_sha
+
+def test_seeded_forks_match_separate_analyses(analyse, tmp_path):
+    upstream, fork, unrelated, base_sha = make_family(tmp_path)
+    output_dir = tmp_path / 'seeded'
+    output_dir.mkdir()
+
+    repos = [{'repo_url': upstream.repo}, {'repo_url': fork.repo}, {'repo_url': unrelated.repo}]
+    seeded = seed_fork_families('project', 'ecosystem', 'category', repos, None, None,
+                                str(tmp_path / 'temp'), str(output_dir), backend='gitlog')
+    assert seeded == 2
+
+    for history in (upstream, fork):
+        output_path = get_analysis_path(str(output_dir), 'project', history.repo.split('/')[-1])
+        state = load_analysis_state(output_path, SETTINGS)
+        assert state.head_sha == base_sha
+        assert state.total_commits == 80
+
+        continued = analyse(history.repo, 'seeded', state=state)
+        fresh = analyse(history.repo, 'fresh')
+        assert continued == fresh
+
+def test_remote_roots_are_only_known_without_cloning(tmp_path):
+    upstream, fork, _, _ = make_family(tmp_path)
+    upstream_url = 'file://' + upstream.repo
+    fork_url = 'file://' + fork.repo
+    mirror_cache = clone_cache.get_mirror_cache()
+
+    assert known_root_commits(upstream.repo) == get_root_commits(upstream.repo)
+    assert known_root_commits(upstream_url) == frozenset()
+    assert not os.path.exists(mirror_cache.get_mirror_path(upstream_url))
+
+    # Probed by an earlier analysis: the roots are in the metadata cache
+    get_repo_metadata(fork_url, fork.repo)
+    assert known_root_commits(fork_url) == get_root_commits(fork.repo)
+    # Mirrored by an earlier analysis or a prefetch
+    with mirror_cache.mirror(upstream_url):
+        pass
+    assert known_root_commits(upstream_url) == get_root_commits(upstream.repo)
+
+def test_seeding_opens_only_known_families_and_releases_them(analyse, tmp_path):
+    upstream, fork, _, base_sha = make_family(tmp_path)
+    upstream_url = 'file://' + upstream.repo
+    fork_url = 'file://' + fork.repo
+    mirror_cache = clone_cache.get_mirror_cache()
+    output_dir = tmp_path / 'seeded'
+    output_dir.mkdir()
+    repos = [{'repo_url': upstream_url}, {'repo_url': fork_url}]
+
+    def seed():
+        return seed_fork_families('project', 'ecosystem', 'category', repos, None, None,
+                                  str(tmp_path / 'temp'), str(output_dir), backend='gitlog')
+
+    # Roots unknown: nothing is cloned ahead of the analyses
+    assert seed() == 0
+    assert not os.path.exists(mirror_cache.get_mirror_path(upstream_url))
+    assert not os.path.exists(mirror_cache.get_mirror_path(fork_url))
+
+    for repo_url in (upstream_url, fork_url):
+        with mirror_cache.mirror(repo_url):
+            pass
+    assert seed() == 2
+    assert mirror_cache._leases == {}
+
+    output_path = get_analysis_path(str(output_dir), 'project', 'fork')
+    state = load_analysis_state(output_path, SETTINGS)
+    assert state.head_sha == base_sha
+    assert analyse(fork_url, 'seeded', state=state) == analyse(fork_url, 'fresh')
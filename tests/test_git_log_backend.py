@@ -0,0 +1,143 @@
+import os
+import datetime
+
+import pytest
+from pydriller import Repository
+
+from conftest import git
+from source.git_log_backend import GitLogRepository, unquote_path
+
+@pytest.mark.parametrize("quoted, path", [
+    ('src/main.py', 'src/main.py'),
+    ('"with\\ttab.py"', 'with\ttab.py'),
+    ('"quote\\".py"', 'quote".py'),
+    ('"caf\\303\\251.py"', 'café.py'),
+])
+def test_unquote_path(quoted, path):
+    assert unquote_path(quoted) == path
+
+class AwkwardHistory:
+    """Commits whose git log output needs care: odd names, binary files, modes, merges and messages."""
+
+    def __init__(self, repo):
+        self.repo = str(repo)
+        self.time = datetime.datetime(2023, 5, 1, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+        os.makedirs(self.repo)
+        git(self.repo, 'init', '-q', '-b', 'main')
+
+    def write(self, path, content):
+        full_path = os.path.join(self.repo, path)
+        os.makedirs(os.path.dirname(full_path) or self.repo, exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(content.encode() if isinstance(content, str) else content)
+
+    def commit(self, message, author=("Zoë Ümlaut", "zoe@example.org")):
+        self.time += datetime.timedelta(hours=5)
+        name, email = author
+        env = dict(os.environ, GIT_AUTHOR_NAME=name, GIT_AUTHOR_EMAIL=email,
+                   GIT_COMMITTER_NAME="Committer", GIT_COMMITTER_EMAIL="committer@example.org",
+                   GIT_AUTHOR_DATE=self.time.isoformat(), GIT_COMMITTER_DATE=self.time.isoformat())
+        git(self.repo, 'add', '-A')
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', message, env=env)
+
+@pytest.fixture(scope="module")
+def awkward_repo(tmp_path_factory):
+    history = AwkwardHistory(tmp_path_factory.mktemp("repos") / "awkward")
+    history.write('README.md', 'first line\nsecond line\n')
+    history.write('src/app.py', ''.join(f'value_{i} = {i}\n' for i in range(30)))
+    history.commit('Initial commit\n\nWith a body\nover several lines')
+
+    history.write('dir with space/file name.py', 'x = 1\n')
+    history.write('src/café.py', 'print("unicode")\n')
+    history.write('with\ttab.py', 'tab = True\n')
+    history.write('image.bin', bytes(range(256)) * 4)
+    history.write('empty.txt', '')
+    history.commit('Add awkward files: \x1f separators \x1e and "quotes"')
+
+    history.write('image.bin', bytes(reversed(range(256))) * 4)
+    history.write('no_newline.py', 'last = 1')
+    history.commit('Change binary file')
+
+    git(history.repo, 'mv', 'src/app.py', 'src/application.py')
+    history.write('src/application.py', ''.join(f'value_{i} = {i}\n' for i in range(29)) + 'value_29 = 290\n')
+    history.commit('Rename with an edit')
+
+    os.chmod(os.path.join(history.repo, 'src/café.py'), 0o755)
+    history.commit('Make executable')
+
+    history.commit('Empty commit')
+
+    git(history.repo, 'checkout', '-q', '-b', 'feature')
+    history.write('feature.py', 'feature = 1\n')
+    history.commit('Add feature', author=("Bob", "bob@example.org"))
+    git(history.repo, 'checkout', '-q', 'main')
+    history.write('README.md', 'first line\nchanged line\n')
+    history.commit('Edit README on main')
+    env = dict(os.environ, GIT_AUTHOR_NAME="Ann", GIT_AUTHOR_EMAIL="ann@example.org",
+               GIT_COMMITTER_NAME="Ann", GIT_COMMITTER_EMAIL="ann@example.org")
+    git(history.repo, 'merge', '-q', '--no-ff', '-m', 'Merge feature', 'feature', env=env)
+
+    git(history.repo, 'rm', '-q', 'dir with space/file name.py', 'empty.txt')
+    history.commit('Delete files')
+    return history.repo
+
+def file_fields(modified_file):
+    return {
+        'filename': modified_file.filename,
+        'old_path': modified_file.old_path,
+        'new_path': modified_file.new_path,
+        'change_type': modified_file.change_type,
+        'added_lines': modified_file.added_lines,
+        'deleted_lines': modified_file.deleted_lines,
+        'diff': modified_file.diff,
+        'source_code': modified_file.source_code,
+        'source_code_before': modified_file.source_code_before,
+    }
+
+def commit_fields(commit):
+    return {
+        'hash': commit.hash,
+        'parents': commit.parents,
+        'merge': commit.merge,
+        'author': (commit.author.name, commit.author.email),
+        'committer': (commit.committer.name, commit.committer.email),
+        'author_date': commit.author_date,
+        'committer_date': commit.committer_date,
+        'author_timezone': commit.author_timezone,
+        'committer_timezone': commit.committer_timezone,
+        'msg': commit.msg,
+        'insertions': commit.insertions,
+        'deletions': commit.deletions,
+        'lines': commit.lines,
+        'files': commit.files,
+        'branches': commit.branches,
+        'in_main_branch': commit.in_main_branch,
+        'modified_files': sorted((file_fields(f) for f in commit.modified_files), key=repr),
+    }
+
+def test_git_log_commits_match_pydriller(awkward_repo):
+    expected = [commit_fields(commit) for commit in Repository(awkward_repo).traverse_commits()]
+
+    repository = GitLogRepository(awkward_repo)
+    commits = repository.list_commits()
+    streamed = [commit_fields(commit) for commit in repository.iter_changes(commits)]
+
+    assert [commit['hash'] for commit in streamed] == [commit['hash'] for commit in expected]
+    for actual, wanted in zip(streamed, expected):
+        assert actual == wanted
+
+def test_numstat_files_match_pydriller(awkward_repo):
+    def without_patches(fields):
+        return [{key: value for key, value in f.items() if key != 'diff'} for f in fields['modified_files']]
+    expected = [without_patches(commit_fields(commit)) for commit in Repository(awkward_repo).traverse_commits()]
+
+    repository = GitLogRepository(awkward_repo)
+    commits = repository.list_commits()
+    streamed = [without_patches(commit_fields(commit)) for commit in repository.iter_changes(commits, patches=False)]
+
+    assert streamed == expected
+
+@pytest.mark.parametrize("repo", ["awkward_repo", "synthetic_repo"])
+def test_gitlog_analysis_matches_pydriller(repo, analyse, request):
+    repo = request.getfixturevalue(repo)
+    assert analyse(repo, 'gitlog', backend='gitlog') == analyse(repo, 'pydriller', backend='pydriller')
@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+from source.metrics.aggregator import METRIC_NAMES, MetricsCollector, create_metric_calculators
+from source.metrics.base import DATA_REQUIREMENTS, REQUIRES_HEADER, REQUIRES_NUMSTAT, REQUIRES_DIFF, REQUIRES_BLOBS
+from source.traversal import RepositoryTraversal
+
+# Commit data each attribute a metric may read comes from
+COMMIT_ATTRIBUTES = {
+    **dict.fromkeys(['hash', 'msg', 'author', 'committer', 'author_date', 'committer_date', 'author_timezone',
+                     'committer_timezone', 'parents', 'merge', 'branches', 'in_main_branch', 'project_name',
+                     'project_path', 'issue_tracker_ticket'], REQUIRES_HEADER),
+    **dict.fromkeys(['modified_files', 'insertions', 'deletions', 'lines', 'files'], REQUIRES_NUMSTAT),
+    **dict.fromkeys(['dmm_unit_size', 'dmm_unit_complexity', 'dmm_unit_interfacing'], REQUIRES_BLOBS),
+}
+FILE_ATTRIBUTES = {
+    **dict.fromkeys(['filename', 'old_path', 'new_path', 'change_type', 'added_lines', 'deleted_lines'],
+                    REQUIRES_NUMSTAT),
+    **dict.fromkeys(['diff', 'diff_parsed', 'parsed_diff'], REQUIRES_DIFF),
+    **dict.fromkeys(['source_code', 'source_code_before', 'content', 'content_before', 'methods', 'methods_before',
+                     'changed_methods', 'nloc', 'complexity', 'token_count'], REQUIRES_BLOBS),
+}
+ATTRIBUTES = {'commit': COMMIT_ATTRIBUTES, 'file': FILE_ATTRIBUTES}
+
+class Recording:
+    """Proxy noting the names of the attributes read through it."""
+
+    def __init__(self, wrapped, kind, read):
+        self._wrapped = wrapped
+        self._kind = kind
+        self._read = read
+
+    def __getattr__(self, name):
+        self._read.add((self._kind, name))
+        value = getattr(self._wrapped, name)
+        if name == 'modified_files':
+            return [Recording(modified_file, 'file', self._read) for modified_file in value]
+        return value
+
+class RecordingConsumer:
+    """Feeds every commit to ``calculator`` through a Recording proxy."""
+
+    requires = frozenset(DATA_REQUIREMENTS)
+
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self.read = set()
+
+    def process_commit(self, commit):
+        self.calculator.process_commit(Recording(commit, 'commit', self.read))
+
+def required_data(read):
+    unknown = sorted(f"{kind}.{name}" for kind, name in read if name not in ATTRIBUTES[kind])
+    assert not unknown, f"No requirement known for {', '.join(unknown)}; add them to the tables above"
+    return {ATTRIBUTES[kind][name] for kind, name in read}
+
+@pytest.fixture(scope="module")
+def recorded(synthetic_repo):
+    calculators = {name: calculator for category in create_metric_calculators().values()
+                   for name, calculator in category.items()}
+    consumers = {name: RecordingConsumer(calculator) for name, calculator in calculators.items()}
+    # Weeks covering the synthetic history
+    collector = RecordingConsumer(MetricsCollector(datetime.datetime(2021, 12, 1), datetime.datetime(2024, 1, 1), metrics=[]))
+    with RepositoryTraversal(synthetic_repo, backend='gitlog') as traversal:
+        traversal.stream([*consumers.values(), collector], desc="Recording")
+    return calculators, consumers, collector
+
+@pytest.mark.parametrize("name", METRIC_NAMES)
+def test_metrics_declare_the_commit_data_they_read(recorded, name):
+    calculators, consumers, _ = recorded
+    assert consumers[name].read, "The metric read nothing"
+    assert required_data(consumers[name].read) <= calculators[name].requires
+
+def test_collector_declares_the_header_it_reads_for_weeks(recorded):
+    _, _, collector = recorded
+    assert required_data(collector.read) <= collector.calculator.requires
@@ -0,0 +1,24 @@
+import os
+
+from conftest import SyntheticHistory, git
+from source.project_finder import find_local_projects
+
+def test_local_repositories_are_found_and_named_without_git_suffix(tmp_path, analyse):
+    history = SyntheticHistory(tmp_path / 'local' / 'ann' / 'work' / 'app', seed=3)
+    history.commit(5)
+    bare_path = str(tmp_path / 'local' / 'bob' / 'lib.git')
+    git(tmp_path, 'clone', '-q', '--bare', history.repo, bare_path)
+    # Not searched for inside other repositories
+    os.makedirs(os.path.join(history.repo, 'nested'))
+    git(os.path.join(history.repo, 'nested'), 'init', '-q')
+
+    projects = find_local_projects(str(tmp_path / 'local'))
+
+    assert {username: [(repo['repo_url'], repo['repo_name']) for repo in project['repositories']]
+            for username, project in projects.items()} == {
+        'ann': [(history.repo, 'app')],
+        'bob': [(bare_path, 'lib')],
+    }
+    analysis = analyse(bare_path, 'bare')
+    assert os.path.exists(tmp_path / 'bare' / 'project_lib_full_history_analysis.json')
+    assert analysis['processing']['total_commits'] == 5
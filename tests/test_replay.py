@@ -0,0 +1,34 @@
+import os
+import json
+
+import pytest
+
+from source.repo_processing import get_analysis_path
+from source.metrics import ReplayedCommit
+from main import recompute_all_metrics
+
+def test_recomputed_metrics_match_the_analysis(synthetic_repo, analyse, tmp_path):
+    analysis = analyse(synthetic_repo, 'recomputed')
+    path = get_analysis_path(str(tmp_path / 'recomputed'), 'project', os.path.basename(synthetic_repo))
+
+    # Clear the metrics, so they can only come back from the stored commits
+    with open(path, 'w') as f:
+        json.dump(dict(analysis, process_metrics={}), f)
+    # As with --recompute-metrics
+    recompute_all_metrics(str(tmp_path / 'recomputed'))
+
+    with open(path) as f:
+        recomputed = json.load(f)
+    assert recomputed['process_metrics'] == analysis['process_metrics']
+    # Nothing else in the file changes
+    assert recomputed == analysis
+
+@pytest.mark.parametrize("stored, branches", [
+    ("{'main'}", {'main'}),
+    ("{'feature', 'main'}", {'feature', 'main'}),
+    ("set()", set()),
+    (['main'], {'main'}),
+    (None, set()),
+])
+def test_stored_branches_are_read_back(stored, branches):
+    assert ReplayedCommit({'hash': 'a' * 40, 'branches': stored}).branches == branches